@@ -1,13 +1,26 @@
+import time
+_T_ARRANQUE = time.perf_counter()
+
+import array
+import atexit
+import bisect
+import codecs
+import collections
+import contextlib
+import errno
+import functools
+import itertools
+import math
+import operator
 import os
 import platform
+import re
 import shlex
-import subprocess
-from datetime import datetime
-import socket
-import urllib.request
-import json
-import shutil
-import time
+import signal
+import sys
+import threading
+import stat
+import struct
 from typing import Dict, List, Optional
 
 # =========================
@@ -49,9 +62,21 @@ tema_actual = {
 # =========================
 HISTORIAL_ACTIVO = True
 HISTORIAL_ARCHIVO = "vsouver_historial.txt"
-_historial_cache: List[str] = []
+HISTORIAL_MAX_BYTES = 64 << 20      # al superarlo se compacta el archivo
+HISTORIAL_MAX_ENTRADAS = 500000     # entradas que sobreviven a una compactación
+HISTORIAL_BUFFER_ENTRADAS = 32      # entradas en memoria antes de escribir
+HISTORIAL_INTERVALO_VOLCADO = 2.0   # segundos máximos sin escribir el buffer
+HISTORIAL_INTERVALO_FSYNC = 10.0
+HISTORIAL_MOSTRAR = 100
+HISTORIAL_CACHE = 1000
+HISTORIAL_BLOQUE_BUSQUEDA = 4 << 20
+_historial_cache = collections.deque(maxlen=HISTORIAL_CACHE)
 variables_entorno: Dict[str, str] = {}
+# Errores impresos por cada hilo: el estado de un comando interno se deduce de los
+# de su propio hilo, así los trabajos paralelos no se contagian los fallos
+_errores_por_hilo = threading.local()
 plugins_cargados: Dict[str, callable] = {}
+MODO_SHELL = "efimero"  # "efimero" (un /bin/sh por comando) o "persistente" (coproceso)
 
 # =========================
 # Logo
@@ -71,16 +96,48 @@ logo = f"""{COLORES["verde"]}
 # Utilidades
 # =========================
 def limpiar():
-    os.system("cls" if platform.system() == "Windows" else "clear")
+    if platform.system() == "Windows":
+        os.system("cls")
+    else:
+        # Secuencia ANSI en vez de lanzar /usr/bin/clear (un fork menos en el arranque)
+        sys.stdout.write("\033[H\033[2J\033[3J")
+        sys.stdout.flush()
+
+@functools.lru_cache(maxsize=None)
+def usuario_actual() -> str:
+    """Usuario efectivo, sin os.getlogin() (falla sin TTY, p. ej. en contenedores)."""
+    for variable in ("USER", "LOGNAME", "USERNAME"):
+        if os.environ.get(variable):
+            return os.environ[variable]
+    try:
+        import pwd
+        return pwd.getpwuid(os.getuid()).pw_name
+    except (ImportError, KeyError):
+        return "desconocido"
+
+@functools.lru_cache(maxsize=None)
+def nombre_equipo() -> str:
+    return platform.node()
+
+def errores_impresos() -> int:
+    """Errores impresos hasta ahora por el hilo actual."""
+    return getattr(_errores_por_hilo, "total", 0)
 
 def imprimir_error(msg: str):
+    _errores_por_hilo.total = errores_impresos() + 1
     print(f"{tema_actual['error']}✖ {msg}{COLORES['reset']}")
 
 def imprimir_exito(msg: str):
     print(f"{tema_actual['exito']}✔ {msg}{COLORES['reset']}")
 
+def tamano_legible(n: float) -> str:
+    for unidad in ("B", "K", "M", "G", "T"):
+        if abs(n) < 1024 or unidad == "T":
+            return f"{n:.0f}{unidad}" if unidad == "B" else f"{n:.1f}{unidad}"
+        n /= 1024
+
 def mostrar_hora():
-    hora = datetime.now().strftime("%H:%M:%S")
+    hora = time.strftime("%H:%M:%S")
     print(f"{COLORES['amarillo']}🕒 Hora actual: {hora}{COLORES['reset']}")
 
 def mostrar_ayuda():
@@ -91,91 +148,769 @@ def mostrar_ayuda():
  vso-tema claro|oscuro→ Cambiar tema
  vso-limpiar          → Limpiar pantalla
  vso-hora             → Mostrar hora
- vso-historial        → Ver historial de comandos
+ vso-historial [-v] [--ultimos N|buscar <txt>|compactar] → Historial de comandos
  vso-python           → REPL de Python integrado
  vso-plugins          → Listar plugins cargados
+ vso-shell persistente|efimero → Backend para comandos externos
+ alias [n='cmd args'] / unalias n → Alias de comandos (se guardan en ~/.vsouver)
+ vso-stats [-r]       → Llamadas y latencia por comando interno
+ vso-perf [top N|reset|perfilar|memoria|flame] → Histogramas p50/p95/p99 y perfiladores
+ vso-prompt [segmentos a,b,..|restablecer] → Prompt: usuario, host, cwd, git, trabajos, estado, duracion, hora
 
 {COLORES["verde"]}Comandos de red:
- vso-ip-publica       → Mostrar IP pública
+ vso-ip-publica [--refrescar] → IP pública (varios servicios en carrera, se recuerda en la sesión)
  vso-ip-local         → Mostrar IPs locales
- vso-ip-dominio <dom> → Resolver IP de dominio
- ping <host>          → Hacer ping a un host
- escaneo-puertos <host> <rango> → Escanear puertos
+ vso-ip-dominio [-4|-6] <dom>... [-f lista] → Resolver dominios (A/AAAA, en paralelo)
+ vso-dns [estado|limpiar|persistir on|off] → Caché DNS compartida
+ ping <host|CIDR>... [-c N] [-i s] [-p puerto] [-o f.json] → Latencia de muchos hosts a la vez (ICMP o TCP)
+ escaneo-puertos <host|CIDR> <puertos> → Escanear puertos (22,80,8000-8100)
 
 {COLORES["amarillo"]}Comandos de archivos:
  cd <ruta>            → Cambiar directorio
- ls [ruta]            → Listar archivos
+ ls [-l -a -S|-t -r -h] [ruta] → Listar archivos
  pwd                  → Mostrar ruta actual
  mkdir <carpeta>      → Crear carpeta
- rm <archivo>         → Borrar archivo
- cp <origen> <dest>   → Copiar archivo
+ rm [-r] <ruta>       → Borrar archivo (o árbol en paralelo con -r)
+ du [ruta] [-d N] [-n top] → Tamaño por directorio y archivos más grandes
+ cp [-r] <origen> <dest> → Copiar archivos o árboles
  mv <origen> <dest>   → Mover/renombrar
  cat <archivo>        → Mostrar contenido
- grep <patrón> <archivo> → Buscar en archivos
- find <nombre>        → Buscar archivos
+ head|tail [-n N|-c B] <archivo> → Principio/final (tail -f para seguir)
+ grep [-E|--mayus|-r|-l|-c] <patrón> <ruta>... → Buscar en archivos
+ find [-g|-E] <nombre> → Buscar archivos (usa el índice si está fresco)
+ vso-index construir|actualizar|estado|borrar [ruta] → Índice de archivos
+ cmd1 | cmd2 [> archivo] → Tubería: cat/grep/head/tail/find/echo se encadenan sin salir del proceso
 
 {COLORES["morado"]}Variables y scripts:
  set <var>=<valor>    → Definir variable
  env                  → Mostrar variables
- script <archivo.vso> → Ejecutar script
+ script [-e] [-q] <archivo.vso> → Ejecutar script ($VAR; -e: parar al primer error)
+                        (bloques 'paralelo N {' ... '}' con líneas 'nombre: comando')
 
 {COLORES["blanco"]}Herramientas avanzadas:
- automatizar <archivo> → Ejecutar script de comandos
- analisis-seguridad <host> → Análisis básico de seguridad
- monitorizar          → Monitorización del sistema en tiempo real
- benchmark           → Pruebas de rendimiento del sistema
+ automatizar [-e] [-q] <archivo> → Ejecutar script de comandos
+ analisis-seguridad <host|URL>... [-o f.json] → HTTP, TLS, RTT y puertos comunes en paralelo
+ monitorizar [-i s] [--log f.csv] → Monitorización del sistema en tiempo real
+ benchmark [suite...] [-r N] [-o f.json] → Pruebas de rendimiento
+                        (cpu, memoria, disco, fork, red, terminal, shell)
+ benchmark comparar a.json b.json → Informe de regresiones
+
+{COLORES["cian"]}Trabajos en segundo plano:
+ <comando> &          → Lanzar en segundo plano
+ jobs [-a]            → Listar trabajos (estado, CPU, RSS)
+ wait [%n...]         → Esperar a que terminen
+ kill [-SEÑAL] <%n|pid> → Enviar señal
+ fg|bg [%n]           → Seguir la salida / reanudar un trabajo detenido
+ job-log <%n> [-n N] [-f] → Ver la salida capturada
 
 Usa 'salir' para cerrar la terminal.
 {COLORES["reset"]}"""
     print(ayuda)
 
 def mostrar_info():
-    try:
-        user = os.getlogin()
-    except Exception:
-        user = os.environ.get("USERNAME") or os.environ.get("USER") or "desconocido"
     print(f"""{COLORES["blanco"]}
 Sistema operativo : {platform.system()}
 Versión del sistema: {platform.version()}
-Nombre del equipo  : {platform.node()}
-Usuario actual     : {user}
+Nombre del equipo  : {nombre_equipo()}
+Usuario actual     : {usuario_actual()}
 Python versión     : {platform.python_version()}
-Hora actual        : {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+Hora actual        : {time.strftime("%Y-%m-%d %H:%M:%S")}
 Directorio actual  : {os.getcwd()}
 {COLORES["reset"]}""")
 
 # =========================
 # Historial
 # =========================
+_MAGIA_INDICE_HISTORIAL = b"VSOHIST1"
+_CABECERA_INDICE_HISTORIAL = struct.Struct("<8sQQ")  # magia, inodo, bytes indexados
+
+def _escapar_campo(texto: str) -> str:
+    return texto.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n")
+
+def _desescapar_campo(texto: str) -> str:
+    if "\\" not in texto:
+        return texto
+    return re.sub(r"\\(.)", lambda m: {"t": "\t", "n": "\n"}.get(m.group(1), m.group(1)), texto)
+
+def parsear_entrada_historial(linea: str) -> dict:
+    """Convierte 'epoch\tcwd\testado\tcomando' en un dict; las líneas antiguas solo traen el comando."""
+    linea = linea.rstrip("\r\n")
+    partes = linea.split("\t", 3)
+    if len(partes) == 4:
+        try:
+            return {"fecha": float(partes[0]), "cwd": _desescapar_campo(partes[1]),
+                    "estado": int(partes[2]) if partes[2] != "-" else None,
+                    "comando": _desescapar_campo(partes[3])}
+        except ValueError:
+            pass
+    return {"fecha": None, "cwd": None, "estado": None, "comando": linea}
+
+class AlmacenHistorial:
+    """Historial en disco con escrituras en buffer, compactación y un índice de offsets.
+
+    El índice (archivo .idx) guarda el offset de inicio de cada línea y se
+    extiende de forma incremental, así que `ultimas` y `buscar` no recorren
+    el archivo entero. Las escrituras de varias sesiones se serializan con un
+    cerrojo de archivo (flock) y cada volcado es un único write en O_APPEND."""
+
+    def __init__(self, ruta: str):
+        self.ruta = os.path.abspath(ruta)
+        self.ruta_indice = self.ruta + ".idx"
+        self.ruta_cerrojo = self.ruta + ".lock"
+        self.pendientes: List[bytes] = []
+        self.ultimo_volcado = time.monotonic()
+        self.ultimo_fsync = time.monotonic()
+        self.cerrojo_hilos = threading.Lock()
+        self.temporizador: Optional[threading.Timer] = None
+
+    @contextlib.contextmanager
+    def _bloqueo(self):
+        with self.cerrojo_hilos:
+            try:
+                import fcntl
+            except ImportError:
+                yield
+                return
+            fd = os.open(self.ruta_cerrojo, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                yield
+            finally:
+                os.close(fd)
+
+    def registrar(self, comando: str, estado: Optional[int] = None, cwd: Optional[str] = None):
+        campos = (f"{time.time():.3f}", _escapar_campo(cwd or ""),
+                  "-" if estado is None else str(estado), _escapar_campo(comando))
+        self.pendientes.append(("\t".join(campos) + "\n").encode("utf-8", "surrogateescape"))
+        if (len(self.pendientes) >= HISTORIAL_BUFFER_ENTRADAS
+                or time.monotonic() - self.ultimo_volcado >= HISTORIAL_INTERVALO_VOLCADO):
+            self.volcar()
+        elif self.temporizador is None:
+            # Sin más comandos, el buffer se escribe igualmente pasados unos segundos
+            self.temporizador = threading.Timer(HISTORIAL_INTERVALO_VOLCADO, self._volcar_programado)
+            self.temporizador.daemon = True
+            self.temporizador.start()
+
+    def _volcar_programado(self):
+        self.temporizador = None
+        try:
+            self.volcar()
+        except OSError:
+            pass  # se reintentará con el próximo comando o al salir
+
+    def volcar(self, forzar_fsync: bool = False):
+        """Escribe el buffer con un solo write; hace fsync como mucho cada HISTORIAL_INTERVALO_FSYNC."""
+        self.ultimo_volcado = time.monotonic()
+        if not self.pendientes:
+            return
+        # Intercambio antes de unir: lo que se añada mientras tanto va a la lista nueva o a esta
+        pendientes, self.pendientes = self.pendientes, []
+        datos = b"".join(pendientes)
+        with self._bloqueo():
+            fd = os.open(self.ruta, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o600)
+            try:
+                tam = os.fstat(fd).st_size
+                if tam and hasattr(os, "pread") and os.pread(fd, 1, tam - 1) != b"\n":
+                    datos = b"\n" + datos  # la última línea antigua no terminaba en salto
+                os.write(fd, datos)
+                if forzar_fsync or time.monotonic() - self.ultimo_fsync >= HISTORIAL_INTERVALO_FSYNC:
+                    os.fsync(fd)
+                    self.ultimo_fsync = time.monotonic()
+                tam += len(datos)
+            finally:
+                os.close(fd)
+            if tam > HISTORIAL_MAX_BYTES:
+                self._compactar()
+
+    def _compactar(self) -> int:
+        """Deja una sola entrada por comando (la más reciente) y como mucho HISTORIAL_MAX_ENTRADAS."""
+        vistos = {}
+        with open(self.ruta, "r", encoding="utf-8", errors="surrogateescape") as f:
+            for linea in f:
+                if linea.strip():
+                    comando = parsear_entrada_historial(linea)["comando"]
+                    vistos.pop(comando, None)
+                    vistos[comando] = linea if linea.endswith("\n") else linea + "\n"
+        lineas = list(vistos.values())[-HISTORIAL_MAX_ENTRADAS:]
+        temporal = f"{self.ruta}.{os.getpid()}.tmp"
+        with open(temporal, "w", encoding="utf-8", errors="surrogateescape") as f:
+            f.writelines(lineas)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporal, self.ruta)
+        try:
+            os.remove(self.ruta_indice)
+        except FileNotFoundError:
+            pass
+        return len(lineas)
+
+    def compactar(self) -> int:
+        self.volcar()
+        with self._bloqueo():
+            if not os.path.exists(self.ruta):
+                return 0
+            return self._compactar()
+
+    def _sincronizar_indice(self):
+        """Extiende el índice con las líneas añadidas desde la última vez.
+
+        Devuelve (número de entradas, bytes indexados)."""
+        try:
+            st = os.stat(self.ruta)
+        except FileNotFoundError:
+            return 0, 0
+        modo = "r+b" if os.path.exists(self.ruta_indice) else "w+b"
+        with open(self.ruta_indice, modo) as fi:
+            cabecera = fi.read(_CABECERA_INDICE_HISTORIAL.size)
+            cubierto = None
+            if len(cabecera) == _CABECERA_INDICE_HISTORIAL.size:
+                magia, inodo, cub = _CABECERA_INDICE_HISTORIAL.unpack(cabecera)
+                if magia == _MAGIA_INDICE_HISTORIAL and inodo == st.st_ino and cub <= st.st_size:
+                    cubierto = cub
+            if cubierto is None:
+                # Índice ausente o de otro archivo (p. ej. tras compactar): se rehace
+                fi.seek(0)
+                fi.truncate()
+                cubierto = 0
+            if cubierto < st.st_size:
+                nuevos = array.array("Q")
+                inicio_linea = cubierto
+                with open(self.ruta, "rb") as f:
+                    f.seek(cubierto)
+                    pos = cubierto
+                    while True:
+                        bloque = f.read(TAIL_TAM_BLOQUE * 16)
+                        if not bloque:
+                            break
+                        i = bloque.find(b"\n")
+                        while i >= 0:
+                            nuevos.append(inicio_linea)
+                            inicio_linea = pos + i + 1
+                            i = bloque.find(b"\n", i + 1)
+                        pos += len(bloque)
+                cubierto = inicio_linea  # una última línea sin salto aún no cuenta
+                fi.seek(0, os.SEEK_END)
+                if fi.tell() == 0:
+                    fi.write(b"\0" * _CABECERA_INDICE_HISTORIAL.size)
+                fi.write(nuevos.tobytes())
+            fi.seek(0)
+            fi.write(_CABECERA_INDICE_HISTORIAL.pack(_MAGIA_INDICE_HISTORIAL, st.st_ino, cubierto))
+            total = (fi.seek(0, os.SEEK_END) - _CABECERA_INDICE_HISTORIAL.size) // 8
+        return max(0, total), cubierto
+
+    def _leer_offsets(self, desde: int, hasta: int) -> array.array:
+        offsets = array.array("Q")
+        with open(self.ruta_indice, "rb") as fi:
+            fi.seek(_CABECERA_INDICE_HISTORIAL.size + desde * 8)
+            offsets.frombytes(fi.read((hasta - desde) * 8))
+        return offsets
+
+    def ultimas(self, n: int) -> List[tuple]:
+        """Las últimas n entradas como (número, entrada); no lee el resto del archivo."""
+        self.volcar()
+        with self._bloqueo():
+            total, cubierto = self._sincronizar_indice()
+            if total == 0 or n <= 0:
+                return []
+            desde = max(0, total - n)
+            offsets = self._leer_offsets(desde, total)
+        # Las últimas entradas son contiguas: una sola lectura desde la primera
+        with open(self.ruta, "rb") as f:
+            f.seek(offsets[0])
+            lineas = f.read(cubierto - offsets[0]).split(b"\n")[:len(offsets)]
+        return [(desde + i + 1, parsear_entrada_historial(l.decode("utf-8", "replace")))
+                for i, l in enumerate(lineas)]
+
+    def buscar(self, texto: str, limite: int = HISTORIAL_MOSTRAR) -> List[tuple]:
+        """Las `limite` coincidencias más recientes de `texto` en los comandos (sin distinguir mayúsculas)."""
+        self.volcar()
+        with self._bloqueo():
+            total, cubierto = self._sincronizar_indice()
+            if total == 0:
+                return []
+            offsets = self._leer_offsets(0, total)
+        aguja = texto.lower()
+        aguja_bytes = aguja.encode("utf-8")
+        encontrados = []
+        # Recorrer hacia atrás en bloques alineados a líneas: las coincidencias
+        # más recientes salen primero y se para al llegar al límite
+        fin, i_fin = cubierto, total
+        with open(self.ruta, "rb") as f:
+            while i_fin > 0 and len(encontrados) < limite:
+                i_ini = max(0, min(i_fin - 1, bisect.bisect_right(offsets, fin - HISTORIAL_BLOQUE_BUSQUEDA) - 1))
+                ini = offsets[i_ini]
+                f.seek(ini)
+                bloque = f.read(fin - ini)
+                minusculas = bloque.lower()
+                p = len(minusculas)
+                while len(encontrados) < limite:
+                    p = minusculas.rfind(aguja_bytes, 0, p)
+                    if p < 0:
+                        break
+                    i = bisect.bisect_right(offsets, ini + p, i_ini, i_fin) - 1
+                    desde = offsets[i] - ini
+                    hasta = offsets[i + 1] - ini if i + 1 < i_fin else len(bloque)
+                    # Descartar sin decodificar si la coincidencia cae en los metadatos
+                    tab = bloque.find(b"\t", bloque.find(b"\t", bloque.find(b"\t", desde, hasta) + 1, hasta) + 1, hasta)
+                    if tab < 0 or p > tab:
+                        entrada = parsear_entrada_historial(bloque[desde:hasta].decode("utf-8", "replace"))
+                        if aguja in entrada["comando"].lower():
+                            encontrados.append((i + 1, entrada))
+                    p = desde
+                fin, i_fin = ini, i_ini
+        encontrados.reverse()
+        return encontrados
+
+_almacen_historial: Optional[AlmacenHistorial] = None
+
+def obtener_almacen_historial() -> AlmacenHistorial:
+    global _almacen_historial
+    if _almacen_historial is None:
+        _almacen_historial = AlmacenHistorial(HISTORIAL_ARCHIVO)
+        atexit.register(_almacen_historial.volcar, True)
+    return _almacen_historial
+
 def cargar_historial():
     if not HISTORIAL_ACTIVO:
         return
-    if os.path.exists(HISTORIAL_ARCHIVO):
-        try:
-            with open(HISTORIAL_ARCHIVO, "r", encoding="utf-8") as f:
-                _historial_cache.extend([l.rstrip("\n") for l in f])
-        except Exception as e:
-            imprimir_error(f"No se pudo cargar historial: {e}")
+    try:
+        for _, entrada in obtener_almacen_historial().ultimas(HISTORIAL_CACHE):
+            _historial_cache.append(entrada["comando"])
+            if readline:
+                readline.add_history(entrada["comando"])
+    except Exception as e:
+        imprimir_error(f"No se pudo cargar historial: {e}")
 
-def guardar_en_historial(comando: str):
+def guardar_en_historial(comando: str, estado: Optional[int] = None):
     if not HISTORIAL_ACTIVO:
         return
     _historial_cache.append(comando)
     try:
-        with open(HISTORIAL_ARCHIVO, "a", encoding="utf-8") as f:
-            f.write(comando + "\n")
+        obtener_almacen_historial().registrar(comando, estado, os.getcwd())
     except Exception as e:
         imprimir_error(f"No se pudo guardar historial: {e}")
 
-def mostrar_historial():
+def _imprimir_entradas(entradas: List[tuple], detalle: bool):
+    gris, reset = COLORES["gris"], COLORES["reset"]
+    salida = []
+    for n, e in entradas:
+        extra = ""
+        if detalle and e["fecha"] is not None:
+            fecha = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(e["fecha"]))
+            estado = "?" if e["estado"] is None else e["estado"]
+            extra = f"{gris}[{fecha} ⏎{estado} {e['cwd']}]{reset} "
+        elif e["estado"]:
+            extra = f"{tema_actual['error']}[{e['estado']}]{reset} "
+        salida.append(f"{n:>5}: {extra}{e['comando']}\n")
+    sys.stdout.write("".join(salida))
+
+def mostrar_historial(args=None):
     if not HISTORIAL_ACTIVO:
         imprimir_error("El historial no está activado (edita HISTORIAL_ACTIVO=True en el código).")
         return
-    if not _historial_cache:
+    args = list(args or [])
+    detalle = "-v" in args
+    if detalle:
+        args.remove("-v")
+    uso = "Uso: vso-historial [-v] [--ultimos N | buscar <texto> | compactar]"
+    almacen = obtener_almacen_historial()
+    try:
+        if not args:
+            entradas = almacen.ultimas(HISTORIAL_MOSTRAR)
+        elif args[0] == "--ultimos" and len(args) == 2:
+            entradas = almacen.ultimas(int(args[1]))
+        elif args[0] == "buscar" and len(args) >= 2:
+            entradas = almacen.buscar(" ".join(args[1:]))
+            if not entradas:
+                print("Sin coincidencias.")
+                return
+        elif args[0] == "compactar":
+            imprimir_exito(f"Historial compactado: {almacen.compactar()} entradas")
+            return
+        else:
+            imprimir_error(uso)
+            return
+    except ValueError:
+        imprimir_error(uso)
+        return
+    except Exception as e:
+        imprimir_error(f"No se pudo leer el historial: {e}")
+        return
+    if not entradas:
         print("Historial vacío.")
         return
-    for i, cmd in enumerate(_historial_cache, 1):
-        print(f"{i:>3}: {cmd}")
+    _imprimir_entradas(entradas, detalle)
+
+# =========================
+# E/S de archivos en bloque (cat / cp)
+# =========================
+ES_TAM_BUFFER = 1 << 20          # buffer reutilizable para las copias sin atajo del kernel
+CP_TAM_PEQUENO = 1 << 20         # archivos menores se copian en paralelo en el pool
+CP_HILOS = 8
+FICLONE = 0x40049409             # ioctl de reflink (btrfs, xfs, ...)
+_buffer_es: Optional[bytearray] = None
+
+def _obtener_buffer() -> memoryview:
+    global _buffer_es
+    if _buffer_es is None:
+        _buffer_es = bytearray(ES_TAM_BUFFER)
+    return memoryview(_buffer_es)
+
+def _escribir_todo(fd: int, datos):
+    while datos:
+        n = os.write(fd, datos)
+        datos = datos[n:]
+
+def _copiar_con_buffer(origen, fd_destino: int, buffer: memoryview):
+    """`origen` es un archivo binario sin buffer; se reutiliza siempre el mismo buffer."""
+    while True:
+        n = origen.readinto(buffer)
+        if not n:
+            break
+        _escribir_todo(fd_destino, buffer[:n])
+
+def _copiar_con_sendfile(fd_origen: int, fd_destino: int) -> bool:
+    """Copia con os.sendfile; devuelve False si no se pudo usar (sin haber copiado nada)."""
+    if not hasattr(os, "sendfile"):
+        return False
+    enviado = 0
+    while True:
+        try:
+            n = os.sendfile(fd_destino, fd_origen, enviado, ES_TAM_BUFFER * 8)
+        except OSError as e:
+            if enviado == 0 and e.errno in (errno.EINVAL, errno.ENOSYS, errno.ENOTSUP, errno.EBADF):
+                return False
+            raise
+        if n == 0:
+            return True
+        enviado += n
+
+def _copiar_con_copy_file_range(fd_origen: int, fd_destino: int) -> bool:
+    if not hasattr(os, "copy_file_range"):
+        return False
+    copiado = 0
+    while True:
+        try:
+            n = os.copy_file_range(fd_origen, fd_destino, ES_TAM_BUFFER * 64)
+        except OSError as e:
+            if copiado == 0 and e.errno in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.ENOTSUP, errno.EOPNOTSUPP):
+                return False
+            raise
+        if n == 0:
+            return True
+        copiado += n
+
+def _clonar_reflink(fd_origen: int, fd_destino: int) -> bool:
+    if not sys.platform.startswith("linux"):
+        return False
+    import fcntl
+    try:
+        fcntl.ioctl(fd_destino, FICLONE, fd_origen)
+        return True
+    except OSError:
+        return False
+
+def volcar_archivo(ruta: str):
+    """Envía un archivo a la salida estándar sin decodificarlo ni cargarlo entero en memoria."""
+    sys.stdout.flush()
+    try:
+        fd_salida = sys.stdout.fileno()
+    except (AttributeError, OSError, ValueError):
+        fd_salida = None
+    with open(ruta, "rb", buffering=0) as f:
+        if fd_salida is None:
+            while True:
+                bloque = f.read(ES_TAM_BUFFER)
+                if not bloque:
+                    break
+                _escribir_bytes(bloque)
+            return
+        if hasattr(sys.stdout, "buffer"):
+            sys.stdout.buffer.flush()
+        if not _copiar_con_sendfile(f.fileno(), fd_salida):
+            _copiar_con_buffer(f, fd_salida, _obtener_buffer())
+
+def copiar_archivo(origen: str, destino: str, buffer: Optional[memoryview] = None) -> int:
+    """Copia un archivo probando reflink, copy_file_range, sendfile y por último un buffer.
+
+    Conserva permisos y fechas como shutil.copy2. Devuelve los bytes copiados.
+    Lanza shutil.SameFileError si origen y destino son el mismo archivo."""
+    import shutil
+    # El destino se abre sin truncar: antes hay que comprobar que no es el propio origen
+    flags = os.O_WRONLY | os.O_CREAT | getattr(os, "O_BINARY", 0)
+    with open(origen, "rb", buffering=0) as fo, open(os.open(destino, flags, 0o666), "wb", buffering=0) as fd:
+        info_o, info_d = os.fstat(fo.fileno()), os.fstat(fd.fileno())
+        if (info_o.st_dev, info_o.st_ino) == (info_d.st_dev, info_d.st_ino):
+            raise shutil.SameFileError(f"{origen} y {destino} son el mismo archivo")
+        fd.truncate(0)
+        tam = info_o.st_size
+        if not (_clonar_reflink(fo.fileno(), fd.fileno())
+                or _copiar_con_copy_file_range(fo.fileno(), fd.fileno())
+                or _copiar_con_sendfile(fo.fileno(), fd.fileno())):
+            _copiar_con_buffer(fo, fd.fileno(), buffer if buffer is not None else memoryview(bytearray(ES_TAM_BUFFER)))
+    shutil.copystat(origen, destino)
+    return tam
+
+class _Progreso:
+    """Contador de archivos/bytes compartido entre hilos con lectura de caudal."""
+
+    def __init__(self, total_archivos: int, total_bytes: int, etiqueta: str):
+        self.total_archivos = total_archivos
+        self.total_bytes = total_bytes
+        self.etiqueta = etiqueta
+        self.archivos = 0
+        self.bytes = 0
+        self.inicio = time.perf_counter()
+        self.ultimo = 0.0
+        self.cerrojo = threading.Lock()
+        self.interactivo = sys.stdout.isatty()
+
+    def sumar(self, num_bytes: int, archivos: int = 1):
+        with self.cerrojo:
+            self.archivos += archivos
+            self.bytes += num_bytes
+            self.mostrar()
+
+    def mostrar(self, final: bool = False):
+        ahora = time.perf_counter()
+        if not final and (not self.interactivo or ahora - self.ultimo < 0.2):
+            return
+        self.ultimo = ahora
+        duracion = max(ahora - self.inicio, 1e-9)
+        linea = (f"{self.etiqueta}: {self.archivos}/{self.total_archivos} archivos, "
+                 f"{tamano_legible(self.bytes)}/{tamano_legible(self.total_bytes)} "
+                 f"({tamano_legible(self.bytes / duracion)}/s, {duracion:.1f} s)")
+        fin = "\n" if final else ""
+        print(f"\r{COLORES['gris']}{linea}{COLORES['reset']}\033[K", end=fin, flush=True)
+
+def copiar_arbol(origen: str, destino: str, hilos: int = CP_HILOS) -> List[tuple]:
+    """Copia un árbol de directorios; los archivos pequeños se copian en paralelo.
+
+    Devuelve la lista de errores (ruta, mensaje); lanza shutil.Error si el
+    destino está dentro del origen."""
+    import shutil
+    from concurrent.futures import ThreadPoolExecutor
+    real_origen, real_destino = os.path.realpath(origen), os.path.realpath(destino)
+    if real_destino == real_origen or real_destino.startswith(real_origen.rstrip(os.sep) + os.sep):
+        raise shutil.Error(f"no se puede copiar {origen} dentro de sí mismo ({destino})")
+    errores = []
+    directorios = []
+    pequenos, grandes = [], []
+    pila = [(origen, destino)]
+    while pila:
+        src, dst = pila.pop()
+        try:
+            os.makedirs(dst, exist_ok=True)
+            directorios.append((src, dst))
+            with os.scandir(src) as it:
+                entradas = list(it)
+        except OSError as e:
+            errores.append((src, str(e)))
+            continue
+        for e in entradas:
+            d = os.path.join(dst, e.name)
+            try:
+                if e.is_symlink():
+                    os.symlink(os.readlink(e.path), d)
+                elif e.is_dir():
+                    pila.append((e.path, d))
+                else:
+                    tam = e.stat().st_size
+                    (pequenos if tam < CP_TAM_PEQUENO else grandes).append((e.path, d, tam))
+            except OSError as err:
+                errores.append((e.path, str(err)))
+
+    progreso = _Progreso(len(pequenos) + len(grandes), sum(t for *_, t in pequenos + grandes), "cp")
+    locales = threading.local()
+
+    def copiar(src, dst):
+        if not hasattr(locales, "buffer"):
+            locales.buffer = memoryview(bytearray(ES_TAM_BUFFER))
+        try:
+            progreso.sumar(copiar_archivo(src, dst, locales.buffer))
+        except OSError as e:
+            errores.append((src, str(e)))
+            progreso.sumar(0)
+
+    with ThreadPoolExecutor(max_workers=hilos) as pool:
+        for src, dst, _ in pequenos:
+            pool.submit(copiar, src, dst)
+        # Los grandes, de uno en uno: el kernel ya satura el disco con ellos
+        for src, dst, _ in grandes:
+            copiar(src, dst)
+    for src, dst in reversed(directorios):
+        try:
+            shutil.copystat(src, dst)
+        except OSError:
+            pass
+    progreso.mostrar(final=True)
+    return errores
+
+def _mostrar_errores(errores: List[tuple], accion: str, maximo: int = 10):
+    if not errores:
+        return
+    imprimir_error(f"{len(errores)} errores al {accion}:")
+    for ruta, msg in errores[:maximo]:
+        print(f"  {ruta}: {msg}")
+    if len(errores) > maximo:
+        print(f"  ... y {len(errores) - maximo} más")
+
+# =========================
+# Recorrido paralelo de árboles (rm -r / du / índices)
+# =========================
+ARBOL_HILOS = 16
+DU_TOP_DEFECTO = 10
+
+def recorrer_directorios(raiz: str, procesar, hilos: int = ARBOL_HILOS):
+    """Recorre un árbol en paralelo sobre un pool de hilos.
+
+    `procesar(ruta)` devuelve (resultado, subdirectorios) y se ejecuta en los hilos;
+    se generan pares (ruta, resultado) en el orden en que terminan."""
+    from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+    with ThreadPoolExecutor(max_workers=hilos) as pool:
+        pendientes = {pool.submit(procesar, raiz): raiz}
+        while pendientes:
+            hechos, _ = wait(pendientes, return_when=FIRST_COMPLETED)
+            for futuro in hechos:
+                ruta = pendientes.pop(futuro)
+                resultado, subdirs = futuro.result()
+                for sub in subdirs:
+                    pendientes[pool.submit(procesar, sub)] = sub
+                yield ruta, resultado
+
+def _borrar_contenido_dir(ruta: str):
+    """Borra los archivos de un directorio y devuelve sus subdirectorios (se ejecuta en el pool)."""
+    borrados, liberados, errores, subdirs = 0, 0, [], []
+    try:
+        with os.scandir(ruta) as it:
+            entradas = list(it)
+    except OSError as e:
+        return (0, 0, [(ruta, str(e))]), []
+    for e in entradas:
+        try:
+            if e.is_dir(follow_symlinks=False):
+                subdirs.append(e.path)
+                continue
+            tam = e.stat(follow_symlinks=False).st_size
+            os.unlink(e.path)
+            borrados += 1
+            liberados += tam
+        except OSError as err:
+            errores.append((e.path, err.strerror or str(err)))
+    return (borrados, liberados, errores), subdirs
+
+def borrar_arbol(raiz: str, hilos: int = ARBOL_HILOS) -> List[tuple]:
+    """rm -r en paralelo: los archivos se borran al recorrer y los directorios al final, de hojas a raíz.
+
+    Devuelve la lista de errores (ruta, mensaje)."""
+    if not os.path.isdir(raiz) or os.path.islink(raiz):
+        os.unlink(raiz)
+        return []
+    progreso = _Progreso(0, 0, "rm")
+    errores = []
+    directorios = []
+    for ruta, (borrados, liberados, errs) in recorrer_directorios(raiz, _borrar_contenido_dir, hilos):
+        directorios.append(ruta)
+        errores.extend(errs)
+        progreso.total_archivos += borrados
+        progreso.total_bytes += liberados
+        progreso.sumar(liberados, borrados)
+    directorios.sort(key=lambda r: r.count(os.sep), reverse=True)
+    for ruta in directorios:
+        try:
+            os.rmdir(ruta)
+        except OSError as e:
+            errores.append((ruta, e.strerror or str(e)))
+    progreso.mostrar(final=True)
+    return errores
+
+def _estadisticas_dir(ruta: str):
+    archivos, subdirs = [], []
+    try:
+        with os.scandir(ruta) as it:
+            for e in it:
+                try:
+                    if e.is_dir(follow_symlinks=False):
+                        subdirs.append(e.path)
+                    else:
+                        archivos.append((e.stat(follow_symlinks=False).st_size, e.name))
+                except OSError:
+                    continue
+    except OSError as e:
+        return (archivos, str(e)), []
+    return (archivos, None), subdirs
+
+def estadisticas_arbol(raiz: str, top: int = DU_TOP_DEFECTO, hilos: int = ARBOL_HILOS) -> dict:
+    """Tamaños y número de archivos acumulados por directorio, más los N archivos más grandes."""
+    import heapq
+    propios: Dict[str, List[int]] = {}
+    mayores: List[tuple] = []
+    errores = []
+    for ruta, (archivos, error) in recorrer_directorios(raiz, _estadisticas_dir, hilos):
+        if error:
+            errores.append((ruta, error))
+        propios[ruta] = [sum(t for t, _ in archivos), len(archivos)]
+        for tam, nombre in archivos:
+            if len(mayores) < top:
+                heapq.heappush(mayores, (tam, os.path.join(ruta, nombre)))
+            elif tam > mayores[0][0]:
+                heapq.heappushpop(mayores, (tam, os.path.join(ruta, nombre)))
+    # Acumular de las hojas hacia la raíz
+    totales = {r: list(v) for r, v in propios.items()}
+    for ruta in sorted(totales, key=lambda r: r.count(os.sep), reverse=True):
+        if ruta == raiz:
+            continue
+        padre = totales.get(os.path.dirname(ruta))
+        if padre is not None:
+            padre[0] += totales[ruta][0]
+            padre[1] += totales[ruta][1]
+    return {"totales": totales, "mayores": sorted(mayores, reverse=True), "errores": errores}
+
+def cmd_du(args):
+    """Tamaño por directorio, número de archivos y entradas más grandes"""
+    uso = "Uso: du [ruta] [-d profundidad] [-n top]"
+    profundidad, top, rutas = 1, DU_TOP_DEFECTO, []
+    try:
+        i = 0
+        while i < len(args):
+            if args[i] == "-d":
+                profundidad = int(args[i + 1])
+                i += 2
+            elif args[i] == "-n":
+                top = int(args[i + 1])
+                i += 2
+            else:
+                rutas.append(args[i])
+                i += 1
+    except (IndexError, ValueError):
+        imprimir_error(uso)
+        return
+    raiz = os.path.abspath(os.path.expanduser(rutas[0] if rutas else "."))
+    if not os.path.isdir(raiz):
+        imprimir_error(f"No es un directorio: {raiz}")
+        return
+    inicio = time.perf_counter()
+    try:
+        datos = estadisticas_arbol(raiz, top)
+    except KeyboardInterrupt:
+        print(f"\n{COLORES['amarillo']}du interrumpido.{COLORES['reset']}")
+        return
+    duracion = time.perf_counter() - inicio
+    totales = datos["totales"]
+    nivel_raiz = raiz.rstrip(os.sep).count(os.sep)
+    cian, gris, reset = COLORES["cian"], COLORES["gris"], COLORES["reset"]
+    salida = []
+    visibles = [r for r in totales if r.rstrip(os.sep).count(os.sep) - nivel_raiz <= profundidad]
+    for ruta in sorted(visibles, key=lambda r: totales[r][0], reverse=True):
+        tam, n = totales[ruta]
+        salida.append(f"{tamano_legible(tam):>8} {n:>9} arch  {cian}{ruta}{reset}\n")
+    if datos["mayores"]:
+        salida.append(f"\n{COLORES['amarillo']}Top {len(datos['mayores'])} archivos más grandes:{reset}\n")
+        for tam, ruta in datos["mayores"]:
+            salida.append(f"{tamano_legible(tam):>8}  {ruta}\n")
+    salida.append(f"{gris}{len(totales)} directorios recorridos en {duracion:.2f} s{reset}\n")
+    sys.stdout.write("".join(salida))
+    _mostrar_errores(datos["errores"], "leer")
 
 # =========================
 # Comandos tipo shell internos (cross-platform)
@@ -187,6 +922,8 @@ def cmd_cd(args):
     ruta = args[0]
     try:
         os.chdir(os.path.expanduser(ruta))
+        if motor_prompt is not None:
+            motor_prompt.marcar_cwd()
     except FileNotFoundError:
         imprimir_error(f"No existe: {ruta}")
     except NotADirectoryError:
@@ -199,20 +936,137 @@ def cmd_cd(args):
 def cmd_pwd(_args):
     print(os.getcwd())
 
+def _fecha_ls(mtime: float, ahora: float) -> str:
+    formato = "%b %d %H:%M" if ahora - mtime < 180 * 86400 else "%b %d  %Y"
+    return time.strftime(formato, time.localtime(mtime))
+
+def _formatear_columnas(nombres: List[str], visibles: List[int], ancho_terminal: int) -> List[str]:
+    """Distribuye los nombres en columnas (orden por columnas, como ls)."""
+    ancho_col = max(visibles) + 2
+    columnas = max(1, ancho_terminal // ancho_col)
+    filas = -(-len(nombres) // columnas)
+    lineas = []
+    for f in range(filas):
+        partes = []
+        for c in range(columnas):
+            i = c * filas + f
+            if i >= len(nombres):
+                break
+            relleno = " " * (ancho_col - visibles[i]) if (c + 1) * filas + f < len(nombres) else ""
+            partes.append(nombres[i] + relleno)
+        lineas.append("".join(partes) + "\n")
+    return lineas
+
+class _EntradaArchivo:
+    """Imita a os.DirEntry para listar una ruta que no es un directorio."""
+
+    def __init__(self, ruta: str):
+        self.path = ruta
+        self.name = ruta
+        self._stat = os.lstat(ruta)
+
+    def stat(self, follow_symlinks: bool = True):
+        return os.stat(self.path) if follow_symlinks else self._stat
+
+    def is_dir(self, follow_symlinks: bool = True) -> bool:
+        return stat.S_ISDIR(self.stat(follow_symlinks).st_mode)
+
+    def is_symlink(self) -> bool:
+        return stat.S_ISLNK(self._stat.st_mode)
+
 def cmd_ls(args):
-    ruta = args[0] if args else "."
-    ruta = os.path.expanduser(ruta)
-    try:
-        items = os.listdir(ruta)
-    except Exception as e:
-        imprimir_error(f"No se puede listar {ruta}: {e}")
-        return
-    for nombre in sorted(items):
-        full = os.path.join(ruta, nombre)
-        if os.path.isdir(full):
-            print(f"{COLORES['cian']}{nombre}/ {COLORES['reset']}")
+    import shutil
+    largo = todos = por_tamano = por_fecha = inverso = legible = False
+    rutas = []
+    for a in args:
+        if a.startswith("-") and len(a) > 1:
+            for letra in a[1:]:
+                if letra == "l":
+                    largo = True
+                elif letra == "a":
+                    todos = True
+                elif letra == "S":
+                    por_tamano = True
+                elif letra == "t":
+                    por_fecha = True
+                elif letra == "r":
+                    inverso = True
+                elif letra == "h":
+                    legible = True
+                else:
+                    imprimir_error("Uso: ls [-l] [-a] [-S|-t] [-r] [-h] [ruta]")
+                    return
         else:
-            print(nombre)
+            rutas.append(a)
+
+    cian, reset = COLORES["cian"], COLORES["reset"]
+    salida = []
+    for n_ruta, ruta in enumerate(rutas or ["."]):
+        ruta = os.path.expanduser(ruta)
+        try:
+            if os.path.isdir(ruta):
+                with os.scandir(ruta) as it:
+                    entradas = [e for e in it if todos or not e.name.startswith(".")]
+            else:
+                entradas = [_EntradaArchivo(ruta)]
+        except Exception as e:
+            imprimir_error(f"No se puede listar {ruta}: {e}")
+            continue
+
+        # DirEntry cachea el tipo (readdir) y el stat: un solo syscall por entrada como mucho
+        necesita_stat = largo or por_tamano or por_fecha
+        stats = {}
+        if necesita_stat:
+            for e in entradas:
+                try:
+                    stats[e.name] = e.stat(follow_symlinks=False)
+                except OSError:
+                    stats[e.name] = None
+        if por_tamano:
+            entradas.sort(key=lambda e: (-(stats[e.name].st_size if stats[e.name] else 0), e.name))
+        elif por_fecha:
+            entradas.sort(key=lambda e: (-(stats[e.name].st_mtime if stats[e.name] else 0), e.name))
+        else:
+            entradas.sort(key=operator.attrgetter("name"))
+        if inverso:
+            entradas.reverse()
+
+        if len(rutas) > 1:
+            salida.append(f"{chr(10) if n_ruta else ''}{ruta}:\n")
+        if largo:
+            ahora = time.time()
+            for e in entradas:
+                st = stats[e.name]
+                if st is None:
+                    salida.append(f"?????????? {e.name}\n")
+                    continue
+                tam = tamano_legible(st.st_size) if legible else str(st.st_size)
+                nombre = e.name
+                if e.is_dir(follow_symlinks=False):
+                    nombre = f"{cian}{nombre}/{reset}"
+                elif e.is_symlink():
+                    try:
+                        nombre = f"{nombre} -> {os.readlink(e.path)}"
+                    except OSError:
+                        pass
+                salida.append(f"{stat.filemode(st.st_mode)} {st.st_nlink:>3} {tam:>8} "
+                              f"{_fecha_ls(st.st_mtime, ahora)} {nombre}\n")
+        elif entradas:
+            nombres = [e.name for e in entradas]
+            visibles = [len(n) for n in nombres]
+            for i, e in enumerate(entradas):
+                try:
+                    es_dir = e.is_dir()
+                except OSError:
+                    es_dir = False
+                if es_dir:
+                    nombres[i] = f"{cian}{e.name}/{reset}"
+                    visibles[i] += 1
+            if sys.stdout.isatty():
+                salida.extend(_formatear_columnas(nombres, visibles, shutil.get_terminal_size().columns))
+            else:
+                salida.extend(n + "\n" for n in nombres)
+    sys.stdout.write("".join(salida))
 
 def _safe_rm_file(path):
     try:
@@ -237,10 +1091,13 @@ def _safe_rmdir(path):
         imprimir_error(f"Error: {e}")
 
 def _safe_rm_recursive(path):
-    try:
-        shutil.rmtree(path)
-    except FileNotFoundError:
+    if not os.path.lexists(path):
         imprimir_error(f"No existe: {path}")
+        return
+    try:
+        _mostrar_errores(borrar_arbol(path), "borrar")
+    except KeyboardInterrupt:
+        print(f"\n{COLORES['amarillo']}Borrado interrumpido.{COLORES['reset']}")
     except Exception as e:
         imprimir_error(f"Error borrando recursivo: {e}")
 
@@ -269,14 +1126,44 @@ def cmd_mkdir(args):
             imprimir_error(f"No se pudo crear {d}: {e}")
 
 def cmd_cp(args):
-    if len(args) < 2:
-        imprimir_error("Uso: cp <origen> <dest>")
-        return
-    src, dst = args[0], args[1]
+    recursivo = False
+    hilos = CP_HILOS
+    rutas = []
     try:
-        shutil.copy2(os.path.expanduser(src), os.path.expanduser(dst))
-    except Exception as e:
-        imprimir_error(f"Error copiando: {e}")
+        i = 0
+        while i < len(args):
+            if args[i] in ("-r", "-R"):
+                recursivo = True
+            elif args[i] == "-j":
+                i += 1
+                hilos = int(args[i])
+            else:
+                rutas.append(os.path.expanduser(args[i]))
+            i += 1
+    except (IndexError, ValueError):
+        rutas = []
+    if len(rutas) < 2:
+        imprimir_error("Uso: cp [-r] [-j hilos] <origen>... <dest>")
+        return
+    *origenes, dst = rutas
+    if len(origenes) > 1 and not os.path.isdir(dst):
+        imprimir_error(f"El destino debe ser un directorio: {dst}")
+        return
+    for src in origenes:
+        destino = os.path.join(dst, os.path.basename(src.rstrip(os.sep))) if os.path.isdir(dst) else dst
+        try:
+            if os.path.isdir(src):
+                if not recursivo:
+                    imprimir_error(f"{src} es un directorio (usa cp -r)")
+                    continue
+                _mostrar_errores(copiar_arbol(src, destino, hilos), "copiar")
+            else:
+                copiar_archivo(src, destino)
+        except KeyboardInterrupt:
+            print(f"\n{COLORES['amarillo']}Copia interrumpida.{COLORES['reset']}")
+            return
+        except Exception as e:
+            imprimir_error(f"Error copiando: {e}")
 
 def cmd_mv(args):
     if len(args) < 2:
@@ -295,8 +1182,7 @@ def cmd_cat(args):
     for archivo in args:
         archivo = os.path.expanduser(archivo)
         try:
-            with open(archivo, "r", encoding="utf-8", errors="replace") as f:
-                print(f.read(), end="")
+            volcar_archivo(archivo)
         except Exception as e:
             imprimir_error(f"No se pudo leer {archivo}: {e}")
 
@@ -322,67 +1208,242 @@ def cmd_echo(args):
     print(" ".join(args))
 
 def cmd_whoami(_args):
-    try:
-        print(os.getlogin())
-    except Exception:
-        print(os.environ.get("USERNAME") or os.environ.get("USER") or "desconocido")
+    print(usuario_actual())
 
 def cmd_date(_args):
-    print(datetime.now().strftime("%a %b %d %H:%M:%S %Y"))
+    print(time.strftime("%a %b %d %H:%M:%S %Y"))
 
 def cmd_clear(_args):
     limpiar()
 
+# =========================
+# Lectura por bloques (head / tail)
+# =========================
+TAIL_TAM_BLOQUE = 64 * 1024
+TAIL_INTERVALO_SONDEO = 0.5
+TAIL_LINEAS_DEFECTO = 10
+
+def _escribir_bytes(datos: bytes):
+    """Escribe bytes sin decodificar en la salida estándar."""
+    destino = getattr(sys.stdout, "buffer", None)
+    if destino is None:
+        sys.stdout.write(datos.decode("utf-8", "replace"))
+        return
+    sys.stdout.flush()
+    destino.write(datos)
+    destino.flush()
+
+def _copiar_hasta_el_final(f, desde: int):
+    f.seek(desde)
+    while True:
+        bloque = f.read(TAIL_TAM_BLOQUE)
+        if not bloque:
+            break
+        _escribir_bytes(bloque)
+
+def desplazamiento_ultimas_lineas(f, n: int) -> int:
+    """Lee bloques hacia atrás desde el final y devuelve el offset donde empiezan las últimas n líneas."""
+    fin = f.seek(0, os.SEEK_END)
+    if n <= 0 or fin == 0:
+        return fin
+    f.seek(fin - 1)
+    if f.read(1) == b"\n":
+        fin -= 1  # el salto final no abre una línea nueva
+    pos = fin
+    saltos = 0
+    while pos > 0:
+        leer = min(TAIL_TAM_BLOQUE, pos)
+        pos -= leer
+        f.seek(pos)
+        bloque = f.read(leer)
+        idx = len(bloque)
+        while True:
+            idx = bloque.rfind(b"\n", 0, idx)
+            if idx < 0:
+                break
+            saltos += 1
+            if saltos == n:
+                return pos + idx + 1
+    return 0
+
+class _Inotify:
+    """Envoltorio mínimo de inotify vía ctypes (solo Linux)."""
+    IN_MODIFY = 0x002
+    IN_ATTRIB = 0x004
+    IN_MOVED_FROM = 0x040
+    IN_MOVED_TO = 0x080
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+
+    def __init__(self, directorio: str):
+        import ctypes
+        libc = ctypes.CDLL(None, use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1")
+        mascara = (self.IN_MODIFY | self.IN_ATTRIB | self.IN_MOVED_FROM |
+                   self.IN_MOVED_TO | self.IN_CREATE | self.IN_DELETE)
+        if libc.inotify_add_watch(self.fd, os.fsencode(directorio), mascara) < 0:
+            err = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(err, "inotify_add_watch")
+
+    def esperar(self, timeout: float):
+        import select
+        listos, _, _ = select.select([self.fd], [], [], timeout)
+        if listos:
+            try:
+                while os.read(self.fd, 4096):
+                    pass
+            except BlockingIOError:
+                pass
+
+    def cerrar(self):
+        os.close(self.fd)
+
+def _seguir_archivo(ruta: str, f):
+    """Modo -f: espera datos nuevos con inotify (o sondeo) y reabre el archivo si rota."""
+    vigilante = None
+    if sys.platform.startswith("linux"):
+        try:
+            vigilante = _Inotify(os.path.dirname(os.path.abspath(ruta)) or ".")
+        except (OSError, AttributeError):
+            vigilante = None
+    try:
+        while True:
+            bloque = f.read(TAIL_TAM_BLOQUE)
+            if bloque:
+                _escribir_bytes(bloque)
+                continue
+            # Sin datos nuevos: comprobar rotación (otro inodo) o truncado
+            try:
+                st = os.stat(ruta)
+            except FileNotFoundError:
+                st = None
+            if st is not None and st.st_ino != os.fstat(f.fileno()).st_ino:
+                f.close()
+                f = open(ruta, "rb")
+                print(f"{COLORES['amarillo']}tail: {ruta} ha rotado, siguiendo el archivo nuevo{COLORES['reset']}")
+                continue
+            if st is not None and st.st_size < f.tell():
+                f.seek(0)
+                print(f"{COLORES['amarillo']}tail: {ruta} truncado{COLORES['reset']}")
+                continue
+            if vigilante:
+                vigilante.esperar(1.0)
+            else:
+                time.sleep(TAIL_INTERVALO_SONDEO)
+    except KeyboardInterrupt:
+        print()
+    finally:
+        f.close()
+        if vigilante:
+            vigilante.cerrar()
+
+def _parsear_opciones_lineas(args, permitir_seguir: bool):
+    """Devuelve (lineas, bytes, seguir, archivos) a partir de -n N, -c N, -N y -f."""
+    lineas, num_bytes, seguir, archivos = TAIL_LINEAS_DEFECTO, None, False, []
+    i = 0
+    while i < len(args):
+        a = args[i]
+        if a in ("-n", "-c"):
+            valor = int(args[i + 1])
+            if a == "-n":
+                lineas = valor
+            else:
+                num_bytes = valor
+            i += 2
+            continue
+        if a.startswith("-n") and a[2:].isdigit():
+            lineas = int(a[2:])
+        elif a.startswith("-c") and a[2:].isdigit():
+            num_bytes = int(a[2:])
+        elif a == "-f" and permitir_seguir:
+            seguir = True
+        elif a.startswith("-") and a[1:].isdigit():
+            lineas = int(a[1:])
+        elif a.startswith("-") and len(a) > 1:
+            raise ValueError(a)
+        else:
+            archivos.append(a)
+        i += 1
+    if lineas < 0 or (num_bytes is not None and num_bytes < 0):
+        raise ValueError("negativo")
+    return lineas, num_bytes, seguir, archivos
+
 def cmd_head(args):
-    if not args:
-        imprimir_error("Uso: head <archivo>")
+    try:
+        lineas, num_bytes, _, archivos = _parsear_opciones_lineas(args, False)
+    except (IndexError, ValueError):
+        archivos = []
+    if not archivos:
+        imprimir_error("Uso: head [-n N | -c BYTES] <archivo>")
         return
-    archivo = os.path.expanduser(args[0])
+    archivo = os.path.expanduser(archivos[0])
     try:
-        with open(archivo, "r", encoding="utf-8") as f:
-            for _ in range(10):
-                linea = f.readline()
-                if not linea:
+        with open(archivo, "rb") as f:
+            restantes = num_bytes if num_bytes is not None else lineas
+            while restantes > 0:
+                bloque = f.read(TAIL_TAM_BLOQUE)
+                if not bloque:
                     break
-                print(linea, end="")
+                if num_bytes is not None:
+                    bloque = bloque[:restantes]
+                    restantes -= len(bloque)
+                else:
+                    pos = -1
+                    while restantes > 0:
+                        pos = bloque.find(b"\n", pos + 1)
+                        if pos < 0:
+                            break
+                        restantes -= 1
+                    if restantes == 0:
+                        bloque = bloque[:pos + 1]
+                _escribir_bytes(bloque)
     except Exception as e:
         imprimir_error(f"No se pudo leer {archivo}: {e}")
 
 def cmd_tail(args):
-    if not args:
-        imprimir_error("Uso: tail <archivo>")
+    try:
+        lineas, num_bytes, seguir, archivos = _parsear_opciones_lineas(args, True)
+    except (IndexError, ValueError):
+        archivos = []
+    if not archivos:
+        imprimir_error("Uso: tail [-n N | -c BYTES] [-f] <archivo>")
+        return
+    archivo = os.path.expanduser(archivos[0])
+    try:
+        f = open(archivo, "rb")
+    except Exception as e:
+        imprimir_error(f"No se pudo leer {archivo}: {e}")
         return
-    archivo = os.path.expanduser(args[0])
     try:
-        with open(archivo, "r", encoding="utf-8") as f:
-            lineas = f.readlines()[-10:]
-            for l in lineas:
-                print(l, end="")
+        if num_bytes is not None:
+            desde = max(0, f.seek(0, os.SEEK_END) - num_bytes)
+        else:
+            desde = desplazamiento_ultimas_lineas(f, lineas)
+        _copiar_hasta_el_final(f, desde)
     except Exception as e:
+        f.close()
         imprimir_error(f"No se pudo leer {archivo}: {e}")
+        return
+    if seguir:
+        _seguir_archivo(archivo, f)
+    else:
+        f.close()
 
 def cmd_gci(args):
     cmd_ls(args)
 
 def cmd_gps(_args):
-    try:
-        cmd = "tasklist" if platform.system() == "Windows" else "ps aux"
-        subprocess.run(cmd, shell=True)
-    except Exception as e:
-        imprimir_error(f"Error al listar procesos: {e}")
+    # Por ejecutar_en_shell: dentro de un bloque paralelo la salida lleva el prefijo del trabajo
+    ejecutar_en_shell("tasklist" if platform.system() == "Windows" else "ps aux")
 
 def cmd_hostname(_args):
-    print(platform.node())
-
-def cmd_ip_publica(_args):
-    try:
-        with urllib.request.urlopen('https://api.ipify.org') as response:
-            ip = response.read().decode()
-            print(f"{COLORES['verde']}IP pública: {ip}{COLORES['reset']}")
-    except Exception as e:
-        imprimir_error(f"No se pudo obtener IP pública: {e}")
+    print(nombre_equipo())
 
 def cmd_ip_local(_args):
+    import socket
     try:
         hostname = socket.gethostname()
         ips = socket.gethostbyname_ex(hostname)[2]
@@ -393,17 +1454,6 @@ def cmd_ip_local(_args):
     except Exception as e:
         imprimir_error(f"No se pudo obtener IP local: {e}")
 
-def cmd_ip_dominio(args):
-    if not args:
-        imprimir_error("Uso: vso-ip-dominio <dominio>")
-        return
-    dominio = args[0]
-    try:
-        ip = socket.gethostbyname(dominio)
-        print(f"{COLORES['verde']}IP de {dominio}: {ip}{COLORES['reset']}")
-    except Exception as e:
-        imprimir_error(f"No se pudo resolver IP de {dominio}: {e}")
-
 def cambiar_tema(modo: str):
     if modo == "claro":
         tema_actual["prompt"] = COLORES["cian"]
@@ -421,228 +1471,5191 @@ def cambiar_tema(modo: str):
 # =========================
 def cmd_automatizar(args):
     """Ejecuta una serie de comandos desde un archivo de automatización"""
-    if not args:
-        imprimir_error("Uso: automatizar <archivo.auto>")
-        return
-    try:
-        with open(args[0], 'r') as f:
-            for linea in f:
-                linea = linea.strip()
-                if linea and not linea.startswith('#'):
-                    print(f"{COLORES['morado']}$ {linea}{COLORES['reset']}")
-                    ejecutar_comando_interno(linea) or ejecutar_en_shell(linea)
-    except Exception as e:
-        imprimir_error(f"Error en automatización: {e}")
+    _ejecutar_archivo_script(args, "Uso: automatizar [-e] [-q] <archivo.auto>")
 
-def cmd_analisis_seguridad(args):
-    """Analiza aspectos básicos de seguridad de un sistema"""
-    if not args:
-        imprimir_error("Uso: analisis-seguridad <dominio/IP>")
-        return
-    
-    objetivo = args[0]
-    print(f"{COLORES['amarillo']}🔍 Analizando seguridad básica de {objetivo}...{COLORES['reset']}")
-    
-    # Comandos básicos de análisis (éticos)
-    print(f"\n{COLORES['cian']}=== Información básica ==={COLORES['reset']}")
-    ejecutar_en_shell(f"ping -c 4 {objetivo}" if platform.system() != "Windows" else f"ping -n 4 {objetivo}")
-    
-    print(f"\n{COLORES['cian']}=== Encabezados HTTP ==={COLORES['reset']}")
-    ejecutar_en_shell(f"curl -I http://{objetivo}" if platform.system() != "Windows" else f"curl -I http://{objetivo}")
-    
-    print(f"\n{COLORES['cian']}=== Puertos comunes ==={COLORES['reset']}")
-    ejecutar_en_shell(f"nmap -T4 -F {objetivo}")
+# =========================
+# Monitor del sistema (lectura directa de /proc)
+# =========================
+MONITOR_INTERVALO = 1.0
+MONITOR_INTERVALO_MIN = 0.1
+MONITOR_TOP = 8
+MONITOR_REFRESCO_MONTAJES = 30   # muestras entre relecturas de /proc/mounts
 
-def cmd_monitorizar(args):
-    """Monitoriza recursos del sistema en tiempo real"""
-    try:
-        while True:
-            limpiar()
-            print(f"{COLORES['verde']}=== Monitor del Sistema (Ctrl+C para salir) ==={COLORES['reset']}")
-            
-            if platform.system() == "Windows":
-                ejecutar_en_shell("tasklist")
-                ejecutar_en_shell("systeminfo | findstr /B /C:'OS Name' /C:'OS Version' /C:'System Type' /C:'Total Physical Memory'")
-            else:
-                ejecutar_en_shell("top -n 1 -b | head -n 5")
-                ejecutar_en_shell("df -h | grep -v loop")
-                ejecutar_en_shell("free -h")
-            
-            time.sleep(5)
-    except KeyboardInterrupt:
-        print(f"\n{COLORES['verde']}Monitorización detenida.{COLORES['reset']}")
+def _leer_proc(ruta: str) -> str:
+    with open(ruta, "r") as f:
+        return f.read()
 
-def cmd_benchmark(args):
-    """Ejecuta pruebas de rendimiento del sistema"""
-    print(f"{COLORES['amarillo']}🚀 Ejecutando benchmark del sistema...{COLORES['reset']}")
-    
-    # Prueba de CPU
-    start = time.time()
-    [x**2 for x in range(1000000)]
-    cpu_time = time.time() - start
-    
-    # Prueba de disco
-    start = time.time()
-    with open("temp_benchmark.txt", "w") as f:
-        for i in range(10000):
-            f.write(f"Linea de prueba {i}\n")
-    write_time = time.time() - start
-    
-    os.remove("temp_benchmark.txt")
-    
-    print(f"\n{COLORES['cian']}Resultados del Benchmark:{COLORES['reset']}")
-    print(f"CPU: {cpu_time:.4f} segundos (cálculo intensivo)")
-    print(f"Disco: {write_time:.4f} segundos (escritura de 10k líneas)")
+class MuestreadorSistema:
+    """Toma muestras de /proc y statvfs y calcula tasas por intervalo (sin lanzar procesos)."""
 
-def cmd_python_repl(_args):
-    print(f"{COLORES['verde']}🔮 Modo Python interactivo (escribe 'salir' para volver){COLORES['reset']}")
-    while True:
+    def __init__(self):
+        self.ticks = os.sysconf("SC_CLK_TCK")
+        self.tam_pagina = os.sysconf("SC_PAGE_SIZE")
+        self.previa = None
+        self.t_previo = None
+        self.montajes: List[str] = []
+        self.muestras = 0
         try:
-            codigo = input(f"{COLORES['amarillo']}>>> {COLORES['reset']}").strip()
-            if codigo.lower() in ["salir", "exit"]:
+            self.discos = {d for d in os.listdir("/sys/block") if not d.startswith(("loop", "ram", "zram"))}
+        except OSError:
+            self.discos = set()
+
+    def _cpu(self) -> List[tuple]:
+        resultado = []
+        for linea in _leer_proc("/proc/stat").splitlines():
+            if not linea.startswith("cpu"):
                 break
-            
-            try:
-                resultado = eval(codigo)
-                if resultado is not None:
-                    print(f"{COLORES['azul']}{resultado}{COLORES['reset']}")
-            except SyntaxError:
-                exec(codigo)
-        except Exception as e:
-            imprimir_error(f"Error en Python: {e}")
+            campos = linea.split()
+            valores = [int(v) for v in campos[1:9]]
+            resultado.append((campos[0], sum(valores), valores[3] + valores[4]))
+        return resultado
 
-def cmd_ping(args):
-    if not args:
-        imprimir_error("Uso: ping <host>")
-        return
-    host = args[0]
-    comando = f"ping -c 4 {host}" if platform.system() != "Windows" else f"ping -n 4 {host}"
-    ejecutar_en_shell(comando)
+    def _memoria(self) -> Dict[str, int]:
+        mem = {}
+        for linea in _leer_proc("/proc/meminfo").splitlines():
+            clave, _, valor = linea.partition(":")
+            mem[clave] = int(valor.split()[0]) * 1024
+        return mem
 
-def cmd_escaneo_puertos(args):
-    if len(args) < 2:
-        imprimir_error("Uso: escaneo-puertos <host> <rango> (ej: 1-100)")
-        return
+    def _discos(self) -> tuple:
+        leidos = escritos = 0
+        for linea in _leer_proc("/proc/diskstats").splitlines():
+            campos = linea.split()
+            if campos[2] in self.discos:
+                leidos += int(campos[5]) * 512
+                escritos += int(campos[9]) * 512
+        return leidos, escritos
+
+    def _red(self) -> tuple:
+        rx = tx = 0
+        for linea in _leer_proc("/proc/net/dev").splitlines()[2:]:
+            interfaz, _, datos = linea.partition(":")
+            if interfaz.strip() == "lo":
+                continue
+            campos = datos.split()
+            rx += int(campos[0])
+            tx += int(campos[8])
+        return rx, tx
+
+    def _procesos(self) -> Dict[int, tuple]:
+        procesos = {}
+        for entrada in os.listdir("/proc"):
+            if not entrada.isdigit():
+                continue
+            try:
+                with open(f"/proc/{entrada}/stat", "rb") as f:
+                    datos = f.read()
+            except OSError:
+                continue  # el proceso terminó entre listdir y open
+            cierre = datos.rfind(b")")
+            nombre = datos[datos.find(b"(") + 1:cierre].decode("utf-8", "replace")
+            resto = datos[cierre + 2:].split()
+            procesos[int(entrada)] = (nombre, int(resto[11]) + int(resto[12]), int(resto[21]) * self.tam_pagina)
+        return procesos
+
+    def _sistemas_archivos(self) -> List[tuple]:
+        if not self.montajes or self.muestras % MONITOR_REFRESCO_MONTAJES == 0:
+            vistos, montajes = set(), []
+            for linea in _leer_proc("/proc/mounts").splitlines():
+                dispositivo, punto = linea.split()[:2]
+                if dispositivo.startswith("/dev/") and "loop" not in dispositivo and dispositivo not in vistos:
+                    vistos.add(dispositivo)
+                    montajes.append(punto.replace("\\040", " "))
+            self.montajes = montajes
+        resultado = []
+        for punto in self.montajes:
+            try:
+                st = os.statvfs(punto)
+            except OSError:
+                continue
+            total = st.f_blocks * st.f_frsize
+            libre = st.f_bavail * st.f_frsize
+            resultado.append((punto, total, total - st.f_bfree * st.f_frsize, libre))
+        return resultado
+
+    def muestra(self, top: int = MONITOR_TOP) -> dict:
+        ahora = time.monotonic()
+        actual = {"cpu": self._cpu(), "discos": self._discos(), "red": self._red(), "procesos": self._procesos()}
+        carga = _leer_proc("/proc/loadavg").split()
+        datos = {"fecha": time.time(), "memoria": self._memoria(), "carga": [float(x) for x in carga[:3]],
+                 "tareas": carga[3], "fs": self._sistemas_archivos(),
+                 "cpu": [], "io": (0.0, 0.0), "red": (0.0, 0.0), "top": []}
+        if self.previa is not None:
+            dt = max(ahora - self.t_previo, 1e-6)
+            previa_cpu = {n: (t, i) for n, t, i in self.previa["cpu"]}
+            for nombre, total, inactivo in actual["cpu"]:
+                t0, i0 = previa_cpu.get(nombre, (total, inactivo))
+                dtotal = total - t0
+                datos["cpu"].append((nombre, 100.0 * (1 - (inactivo - i0) / dtotal) if dtotal else 0.0))
+            datos["io"] = tuple((a - b) / dt for a, b in zip(actual["discos"], self.previa["discos"]))
+            datos["red"] = tuple((a - b) / dt for a, b in zip(actual["red"], self.previa["red"]))
+            previos = self.previa["procesos"]
+            uso = []
+            for pid, (nombre, ticks, rss) in actual["procesos"].items():
+                anterior = previos.get(pid)
+                dticks = ticks - anterior[1] if anterior else 0
+                uso.append((100.0 * dticks / self.ticks / dt, pid, nombre, rss))
+            uso.sort(reverse=True)
+            datos["top"] = uso[:top]
+        self.previa, self.t_previo = actual, ahora
+        self.muestras += 1
+        return datos
+
+def _barra(pct: float, ancho: int = 20) -> str:
+    llenos = int(round(max(0.0, min(pct, 100.0)) / 100 * ancho))
+    color = COLORES["verde"] if pct < 60 else COLORES["amarillo"] if pct < 85 else COLORES["rojo"]
+    return f"{color}{'█' * llenos}{COLORES['gris']}{'·' * (ancho - llenos)}{COLORES['reset']}"
+
+def _lineas_monitor(d: dict, intervalo: float) -> List[str]:
+    cian, gris, reset = COLORES["cian"], COLORES["gris"], COLORES["reset"]
+    mem = d["memoria"]
+    total = mem.get("MemTotal", 0)
+    usada = total - mem.get("MemAvailable", mem.get("MemFree", 0))
+    swap_total = mem.get("SwapTotal", 0)
+    swap_usada = swap_total - mem.get("SwapFree", 0)
+    lineas = [f"{COLORES['verde']}=== Monitor del Sistema (cada {intervalo:g} s, Ctrl+C para salir) ==={reset}",
+              f"Carga: {d['carga'][0]:.2f} {d['carga'][1]:.2f} {d['carga'][2]:.2f}   tareas: {d['tareas']}   "
+              f"{time.strftime('%H:%M:%S', time.localtime(d['fecha']))}"]
+    for nombre, pct in d["cpu"][:17]:
+        etiqueta = "CPU" if nombre == "cpu" else nombre
+        lineas.append(f"{etiqueta:<6} {_barra(pct)} {pct:5.1f}%")
+    if total:
+        lineas.append(f"{'Mem':<6} {_barra(100 * usada / total)} {tamano_legible(usada)}/{tamano_legible(total)}")
+    if swap_total:
+        lineas.append(f"{'Swap':<6} {_barra(100 * swap_usada / swap_total)} "
+                      f"{tamano_legible(swap_usada)}/{tamano_legible(swap_total)}")
+    lineas.append(f"Disco: lectura {tamano_legible(d['io'][0])}/s  escritura {tamano_legible(d['io'][1])}/s   "
+                  f"Red: rx {tamano_legible(d['red'][0])}/s  tx {tamano_legible(d['red'][1])}/s")
+    lineas.append("")
+    lineas.append(f"{cian}{'Montaje':<24} {'Tamaño':>8} {'Usado':>8} {'Libre':>8} {'Uso':>5}{reset}")
+    for punto, tam, usado, libre in d["fs"]:
+        pct = 100 * usado / tam if tam else 0
+        lineas.append(f"{punto[:24]:<24} {tamano_legible(tam):>8} {tamano_legible(usado):>8} "
+                      f"{tamano_legible(libre):>8} {pct:4.0f}%")
+    lineas.append("")
+    lineas.append(f"{cian}{'PID':>7} {'CPU%':>6} {'RSS':>8}  Comando{reset}")
+    for pct, pid, nombre, rss in d["top"]:
+        lineas.append(f"{pid:>7} {pct:6.1f} {tamano_legible(rss):>8}  {nombre}")
+    if not d["top"]:
+        lineas.append(f"{gris}(midiendo...){reset}")
+    return lineas
+
+def _redibujar(lineas: List[str], previas: List[str]):
+    """Reescribe solo las líneas que cambiaron usando posicionamiento de cursor ANSI."""
+    salida = []
+    for i, linea in enumerate(lineas):
+        if i >= len(previas) or previas[i] != linea:
+            salida.append(f"\033[{i + 1};1H{linea}\033[K")
+    if len(lineas) < len(previas):
+        salida.append(f"\033[{len(lineas) + 1};1H\033[J")
+    sys.stdout.write("".join(salida))
+    sys.stdout.flush()
+
+class _RegistroMuestras:
+    """Escribe las muestras como serie temporal CSV o JSONL (según la extensión)."""
+    COLUMNAS = ["fecha", "cpu_pct", "mem_usada", "mem_total", "carga1", "io_lectura_bs",
+                "io_escritura_bs", "red_rx_bs", "red_tx_bs"]
+
+    def __init__(self, ruta: str):
+        self.jsonl = ruta.endswith((".jsonl", ".json"))
+        nuevo = not os.path.exists(ruta) or os.path.getsize(ruta) == 0
+        self.archivo = open(ruta, "a", encoding="utf-8", buffering=1)
+        if nuevo and not self.jsonl:
+            self.archivo.write(",".join(self.COLUMNAS) + "\n")
+
+    def escribir(self, d: dict):
+        mem = d["memoria"]
+        fila = {
+            "fecha": round(d["fecha"], 3),
+            "cpu_pct": round(d["cpu"][0][1], 2) if d["cpu"] else None,
+            "mem_usada": mem.get("MemTotal", 0) - mem.get("MemAvailable", 0),
+            "mem_total": mem.get("MemTotal", 0),
+            "carga1": d["carga"][0],
+            "io_lectura_bs": round(d["io"][0]), "io_escritura_bs": round(d["io"][1]),
+            "red_rx_bs": round(d["red"][0]), "red_tx_bs": round(d["red"][1]),
+        }
+        if self.jsonl:
+            import json
+            fila["top"] = [{"pid": pid, "nombre": n, "cpu_pct": round(p, 2), "rss": rss} for p, pid, n, rss in d["top"]]
+            self.archivo.write(json.dumps(fila, ensure_ascii=False) + "\n")
+        else:
+            self.archivo.write(",".join("" if fila[c] is None else str(fila[c]) for c in self.COLUMNAS) + "\n")
+
+    def cerrar(self):
+        self.archivo.close()
+
+def _monitorizar_con_shell():
+    while True:
+        limpiar()
+        print(f"{COLORES['verde']}=== Monitor del Sistema (Ctrl+C para salir) ==={COLORES['reset']}")
+        if platform.system() == "Windows":
+            ejecutar_en_shell("tasklist")
+            ejecutar_en_shell("systeminfo | findstr /B /C:'OS Name' /C:'OS Version' /C:'System Type' /C:'Total Physical Memory'")
+        else:
+            ejecutar_en_shell("top -n 1 -b | head -n 5")
+            ejecutar_en_shell("df -h | grep -v loop")
+            ejecutar_en_shell("free -h")
+        time.sleep(5)
+
+def cmd_monitorizar(args):
+    """Monitoriza recursos del sistema en tiempo real"""
+    uso = "Uso: monitorizar [-i segundos] [-n top] [--log archivo.csv|.jsonl] [--muestras N]"
+    intervalo, top, ruta_log, max_muestras = MONITOR_INTERVALO, MONITOR_TOP, None, None
+    try:
+        i = 0
+        while i < len(args):
+            opcion, valor = args[i], args[i + 1]
+            if opcion == "-i":
+                intervalo = max(MONITOR_INTERVALO_MIN, float(valor))
+            elif opcion == "-n":
+                top = int(valor)
+            elif opcion == "--log":
+                ruta_log = os.path.expanduser(valor)
+            elif opcion == "--muestras":
+                max_muestras = int(valor)
+            else:
+                raise ValueError(opcion)
+            i += 2
+    except (IndexError, ValueError):
+        imprimir_error(uso)
+        return
+
+    if not os.path.exists("/proc/stat"):
+        try:
+            _monitorizar_con_shell()
+        except KeyboardInterrupt:
+            print(f"\n{COLORES['verde']}Monitorización detenida.{COLORES['reset']}")
+        return
+
+    registro = None
+    try:
+        registro = _RegistroMuestras(ruta_log) if ruta_log else None
+    except OSError as e:
+        imprimir_error(f"No se pudo abrir {ruta_log}: {e}")
+        return
+    interactivo = sys.stdout.isatty()
+    muestreador = MuestreadorSistema()
+    previas: List[str] = []
+    tomadas = 0
+    if interactivo:
+        sys.stdout.write("\033[?25l\033[H\033[2J")  # ocultar cursor y limpiar
+    try:
+        muestreador.muestra(top)  # línea base para los deltas
+        siguiente = time.monotonic() + intervalo
+        while max_muestras is None or tomadas < max_muestras:
+            time.sleep(max(0.0, siguiente - time.monotonic()))
+            siguiente += intervalo
+            datos = muestreador.muestra(top)
+            tomadas += 1
+            if registro:
+                registro.escribir(datos)
+            if interactivo:
+                lineas = _lineas_monitor(datos, intervalo)
+                _redibujar(lineas, previas)
+                previas = lineas
+            else:
+                cpu = datos["cpu"][0][1] if datos["cpu"] else 0.0
+                mem = datos["memoria"]
+                print(f"{time.strftime('%H:%M:%S')} cpu={cpu:.1f}% "
+                      f"mem={tamano_legible(mem.get('MemTotal', 0) - mem.get('MemAvailable', 0))} "
+                      f"carga={datos['carga'][0]:.2f} io_r={tamano_legible(datos['io'][0])}/s "
+                      f"io_w={tamano_legible(datos['io'][1])}/s", flush=True)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if registro:
+            registro.cerrar()
+        if interactivo:
+            sys.stdout.write(f"\033[{len(previas) + 1};1H\033[?25h")
+    print(f"\n{COLORES['verde']}Monitorización detenida.{COLORES['reset']}")
+
+# =========================
+# Suite de benchmarks
+# =========================
+BENCH_REPETICIONES = 5
+BENCH_CALENTAMIENTO = 1
+BENCH_TAM_MB = 64                 # tamaño de las pruebas de disco, memoria y red
+BENCH_BLOQUE = 1 << 20
+BENCH_BLOQUE_ALEATORIO = 4096
+BENCH_UMBRAL_REGRESION = 5.0      # % de empeoramiento de la mediana para marcar regresión
+# Parámetros que dependen del host: van aparte del nombre para poder comparar entre máquinas
+BENCH_PARAMETROS = (("nucleos", "{} CPU"), ("tam_mb", "{:.0f} MB"), ("ejecutable", "{}"))
+
+def _trabajo_cpu(n: int) -> int:
+    """Carga de CPU pura en Python (a nivel de módulo para poder enviarla a otros procesos)."""
+    total = 0
+    for i in range(n):
+        total += (i * i) % 7
+    return total
+
+def _medir(prueba, opciones: dict, cantidad: Optional[float] = None, escala: float = 1.0) -> List[float]:
+    """Ejecuta `prueba` tras el calentamiento; devuelve tasas (cantidad/s) o duraciones escaladas."""
+    for _ in range(opciones["calentamiento"]):
+        prueba()
+    valores = []
+    for _ in range(opciones["repeticiones"]):
+        inicio = time.perf_counter()
+        prueba()
+        duracion = time.perf_counter() - inicio
+        valores.append(cantidad / duracion if cantidad else duracion * escala)
+    return valores
+
+def _resultado(nombre: str, valores: List[float], unidad: str, mayor_mejor: bool, **extra) -> dict:
+    import statistics
+    ordenados = sorted(valores, reverse=mayor_mejor)
+    # p95 en el sentido "peor": el 95 % de las repeticiones fue al menos así de bueno
+    p95 = ordenados[min(len(ordenados) - 1, int(0.95 * len(ordenados)))]
+    return {"nombre": nombre, "unidad": unidad, "mayor_mejor": mayor_mejor,
+            "mediana": statistics.median(valores), "p95": p95,
+            "desviacion": statistics.stdev(valores) if len(valores) > 1 else 0.0,
+            "muestras": valores, **extra}
+
+def _bench_cpu(opciones: dict) -> List[dict]:
+    from concurrent.futures import ProcessPoolExecutor
+    n = opciones["n"] or 2_000_000
+    nucleos = os.cpu_count() or 1
+    simple = _resultado("un núcleo", _medir(lambda: _trabajo_cpu(n), opciones, n / 1e6), "Mops/s", True)
+    with ProcessPoolExecutor(max_workers=nucleos) as pool:
+        valores = _medir(lambda: list(pool.map(_trabajo_cpu, [n] * nucleos)), opciones, n * nucleos / 1e6)
+    todos = _resultado("todos los núcleos", valores, "Mops/s", True, nucleos=nucleos)
+    todos["escalado"] = todos["mediana"] / simple["mediana"]
+    return [simple, todos]
+
+def _bench_memoria(opciones: dict) -> List[dict]:
+    tam = opciones["tam_mb"] << 20
+    origen = bytearray(os.urandom(1 << 20)) * opciones["tam_mb"]
+    destino = bytearray(tam)
+
+    def copiar():
+        destino[:] = origen
+
+    def recorrer():
+        origen.find(b"\0" * 32)  # no aparece en datos aleatorios: recorre todo el buffer
+
+    mb = tam / (1 << 20)
+    return [_resultado("copia", _medir(copiar, opciones, mb), "MB/s", True, tam_mb=mb),
+            _resultado("lectura (búsqueda)", _medir(recorrer, opciones, mb), "MB/s", True, tam_mb=mb)]
+
+def _descartar_cache(fd: int):
+    if hasattr(os, "posix_fadvise"):
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+
+def _bench_disco(opciones: dict) -> List[dict]:
+    import random
+    import tempfile
+    tam = opciones["tam_mb"] << 20
+    bloque = os.urandom(BENCH_BLOQUE)
+    fd_tmp, ruta = tempfile.mkstemp(prefix="vso-bench-", dir=opciones["dir"])
+    os.close(fd_tmp)
+    mb = tam / (1 << 20)
+    try:
+        def escribir_secuencial():
+            fd = os.open(ruta, os.O_WRONLY | os.O_TRUNC)
+            try:
+                for _ in range(tam // BENCH_BLOQUE):
+                    os.write(fd, bloque)
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+        def leer_secuencial():
+            with open(ruta, "rb", buffering=0) as f:
+                _descartar_cache(f.fileno())
+                buffer = bytearray(BENCH_BLOQUE)
+                while f.readinto(buffer):
+                    pass
+
+        n_lecturas = opciones["n"] or 2000
+        n_escrituras = max(1, (opciones["n"] or 2000) // 8)
+        posiciones = tam // BENCH_BLOQUE_ALEATORIO
+
+        def leer_aleatorio():
+            fd = os.open(ruta, os.O_RDONLY)
+            try:
+                _descartar_cache(fd)
+                for _ in range(n_lecturas):
+                    os.pread(fd, BENCH_BLOQUE_ALEATORIO, random.randrange(posiciones) * BENCH_BLOQUE_ALEATORIO)
+            finally:
+                os.close(fd)
+
+        pagina = bloque[:BENCH_BLOQUE_ALEATORIO]
+        sincronizar = getattr(os, "fdatasync", os.fsync)
+
+        def escribir_aleatorio():
+            fd = os.open(ruta, os.O_WRONLY)
+            try:
+                for _ in range(n_escrituras):
+                    os.pwrite(fd, pagina, random.randrange(posiciones) * BENCH_BLOQUE_ALEATORIO)
+                    sincronizar(fd)
+            finally:
+                os.close(fd)
+
+        resultados = [
+            _resultado("escritura secuencial + fsync", _medir(escribir_secuencial, opciones, mb), "MB/s", True,
+                       tam_mb=mb),
+            _resultado("lectura secuencial (sin caché)", _medir(leer_secuencial, opciones, mb), "MB/s", True,
+                       tam_mb=mb),
+        ]
+        if not (hasattr(os, "pread") and hasattr(os, "pwrite")):  # Windows
+            imprimir_error("pread/pwrite no están disponibles: se omiten las pruebas aleatorias")
+            return resultados
+        return resultados + [
+            _resultado("lectura aleatoria 4K", _medir(leer_aleatorio, opciones, n_lecturas), "IOPS", True),
+            _resultado("escritura aleatoria 4K + fdatasync", _medir(escribir_aleatorio, opciones, n_escrituras), "IOPS", True),
+        ]
+    finally:
+        os.remove(ruta)
+
+def _bench_fork(opciones: dict) -> List[dict]:
+    if not hasattr(os, "fork"):
+        imprimir_error("fork no está disponible en este sistema")
+        return []
+    import shutil
+    n = opciones["n"] or 200
+    true = shutil.which("true") or "/bin/true"
+
+    def fork_exit():
+        for _ in range(n):
+            pid = os.fork()
+            if pid == 0:
+                os._exit(0)
+            os.waitpid(pid, 0)
+
+    def spawn_exec():
+        for _ in range(n):
+            pid = os.posix_spawn(true, [true], os.environ)
+            os.waitpid(pid, 0)
+
+    escala = 1e6 / n
+    return [_resultado("fork + exit", _medir(fork_exit, opciones, escala=escala), "µs", False),
+            _resultado("spawn + exec", _medir(spawn_exec, opciones, escala=escala), "µs", False, ejecutable=true)]
+
+def _servidor_loopback(atender):
+    """Escucha en 127.0.0.1 y atiende cada conexión con `atender(conexion)` en un hilo."""
+    import socket
+    servidor = socket.create_server(("127.0.0.1", 0))
+
+    def aceptar():
+        while True:
+            try:
+                conexion, _ = servidor.accept()
+            except OSError:
+                return
+            with conexion:
+                conexion.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                atender(conexion)
+
+    threading.Thread(target=aceptar, daemon=True).start()
+    return servidor
+
+def _bench_red(opciones: dict) -> List[dict]:
+    import socket
+    tam = opciones["tam_mb"] << 20
+    n = opciones["n"] or 2000
+
+    def sumidero(conexion):
+        buffer = bytearray(BENCH_BLOQUE)
+        recibido = 0
+        while recibido < tam:
+            leidos = conexion.recv_into(buffer)
+            if not leidos:
+                return
+            recibido += leidos
+        conexion.sendall(b"k")
+
+    def eco(conexion):
+        while True:
+            datos = conexion.recv(1)
+            if not datos:
+                return
+            conexion.sendall(datos)
+
+    resultados = []
+    servidor = _servidor_loopback(sumidero)
+    bloque = memoryview(bytes(BENCH_BLOQUE))
+    try:
+        def enviar():
+            with socket.create_connection(servidor.getsockname()) as s:
+                for _ in range(tam // BENCH_BLOQUE):
+                    s.sendall(bloque)
+                s.recv(1)
+
+        mb = tam / (1 << 20)
+        resultados.append(_resultado("TCP loopback", _medir(enviar, opciones, mb), "MB/s", True, tam_mb=mb))
+    finally:
+        servidor.close()
+
+    servidor = _servidor_loopback(eco)
+    try:
+        with socket.create_connection(servidor.getsockname()) as s:
+            s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def ida_y_vuelta():
+                for _ in range(n):
+                    s.sendall(b"x")
+                    s.recv(1)
+
+            resultados.append(_resultado("latencia TCP ida y vuelta",
+                                         _medir(ida_y_vuelta, opciones, escala=1e6 / n), "µs", False))
+    finally:
+        servidor.close()
+    return resultados
+
+def _bench_terminal(opciones: dict) -> List[dict]:
+    import tempfile
+    n = opciones["n"] or 20000
+    resultados = []
+    with tempfile.TemporaryDirectory(prefix="vso-bench-", dir=opciones["dir"]) as tmp:
+        # Coste puro del despacho: un comando que no hace nada
+        registro.registrar("vso-bench-nop", lambda args: None, "interno")
+        try:
+            lineas = [f"vso-bench-nop {i} 'arg con espacios' --opcion" for i in range(n)]
+
+            def repetida():
+                for _ in range(n):
+                    ejecutar_comando_interno("vso-bench-nop 1 'arg con espacios' --opcion")
+
+            def distintas():
+                for linea in lineas:  # más líneas que la caché: siempre se tokeniza
+                    ejecutar_comando_interno(linea)
+            activa, instrumentacion.activa = instrumentacion.activa, False
+            try:
+                resultados.append(_resultado("despacho: línea repetida (caché)",
+                                             _medir(repetida, opciones, escala=1e6 / n), "µs", False))
+                resultados.append(_resultado("despacho: líneas distintas",
+                                             _medir(distintas, opciones, escala=1e6 / n), "µs", False))
+            finally:
+                instrumentacion.activa = activa
+            resultados.append(_resultado("despacho: línea repetida + vso-perf",
+                                         _medir(repetida, opciones, escala=1e6 / n), "µs", False))
+        finally:
+            instrumentacion.metricas.pop("vso-bench-nop", None)
+            registro.quitar("vso-bench-nop")
+            registro.llamadas.pop("vso-bench-nop", None)
+            registro.tiempo.pop("vso-bench-nop", None)
+        with open(os.devnull, "w") as nulo, contextlib.redirect_stdout(nulo):
+            def despachar():
+                for _ in range(n):
+                    ejecutar_comando_interno("pwd")
+            valores = _medir(despachar, opciones, escala=1e6 / n)
+        resultados.append(_resultado("despacho de comando interno (pwd)", valores, "µs", False))
+
+        ruta = os.path.join(tmp, "grep.txt")
+        with open(ruta, "w") as f:
+            for i in range(400_000):
+                f.write(f"linea {i} con texto de relleno para el benchmark de busqueda\n")
+            f.write("aguja\n")
+        mb = os.path.getsize(ruta) / (1 << 20)
+        buscar = lambda: list(buscar_en_archivos("AGUJA", [ruta], procesos=1))  # noqa: E731
+        resultados.append(_resultado("grep (literal, sin mayúsculas)", _medir(buscar, opciones, mb), "MB/s", True))
+        origen, nulo = shlex.quote(ruta), shlex.quote(os.devnull)
+        completa = lambda: ejecutar_tuberia(f"cat {origen} | grep -c AGUJA > {nulo}")  # noqa: E731
+        resultados.append(_resultado("tubería: cat|grep -c (completa)",
+                                     _medir(completa, opciones, mb), "MB/s", True))
+        # head corta la tubería: el tiempo no debe depender del tamaño del archivo
+        corte = lambda: ejecutar_tuberia(f"cat {origen} | grep relleno | head -n 10 > {nulo}")  # noqa: E731
+        resultados.append(_resultado("tubería: cat|grep|head (corte)",
+                                     _medir(corte, opciones, escala=1e6), "µs", False))
+
+        arbol = os.path.join(tmp, "arbol")
+        for d in range(100):
+            sub = os.path.join(arbol, f"dir{d}")
+            os.makedirs(sub)
+            for a in range(100):
+                open(os.path.join(sub, f"archivo_{a}.txt"), "w").close()
+        indice = construir_indice(arbol)
+        resultados.append(_resultado("find: construir índice (10k)",
+                                     _medir(lambda: construir_indice(arbol), opciones, escala=1e3), "ms", False))
+        consultar = lambda: sum(1 for _ in consultar_indice(indice, "archivo_42"))  # noqa: E731
+        resultados.append(_resultado("find: consulta en índice",
+                                     _medir(consultar, opciones, escala=1e3), "ms", False))
+
+        almacen = AlmacenHistorial(os.path.join(tmp, "historial.txt"))
+
+        def registrar():
+            for i in range(n):
+                almacen.registrar(f"comando de prueba {i}", 0, tmp)
+            almacen.volcar()
+        resultados.append(_resultado("historial: registrar", _medir(registrar, opciones, n), "ops/s", True))
+        resultados.append(_resultado("historial: buscar (sin coincidencia)",
+                                     _medir(lambda: almacen.buscar("no-existe"), opciones, escala=1e3), "ms", False))
+    return resultados
+
+def _bench_shell(opciones: dict) -> List[dict]:
+    """Latencia por comando externo del shell efímero y del persistente"""
+    global MODO_SHELL
+    if os.name != "posix":
+        imprimir_error("El shell persistente solo está disponible en sistemas POSIX")
+        return []
+    n = opciones["n"] or 200
+    resultados = []
+    modo_previo = MODO_SHELL
+
+    def ejecutar():
+        for _ in range(n):
+            ejecutar_en_shell("true")
+    try:
+        for modo in ("efimero", "persistente"):
+            MODO_SHELL = modo
+            ejecutar_en_shell("true")  # arranca el coproceso fuera de la medida
+            resultados.append(_resultado(f"shell {modo}", _medir(ejecutar, opciones, escala=1e3 / n), "ms", False))
+    finally:
+        MODO_SHELL = modo_previo
+    resultados[1]["aceleracion"] = resultados[0]["mediana"] / resultados[1]["mediana"]
+    return resultados
+
+BENCH_SUITES = {
+    "cpu": _bench_cpu,
+    "memoria": _bench_memoria,
+    "disco": _bench_disco,
+    "fork": _bench_fork,
+    "red": _bench_red,
+    "terminal": _bench_terminal,
+    "shell": _bench_shell,
+}
+
+def _formatear_valor(valor: float) -> str:
+    return f"{valor:,.0f}" if abs(valor) >= 1000 else f"{valor:.3g}" if abs(valor) < 1 else f"{valor:.1f}"
+
+def _parametros_bench(r: dict) -> str:
+    return ", ".join(formato.format(r[clave]) for clave, formato in BENCH_PARAMETROS if clave in r)
+
+def _etiqueta_bench(r: dict) -> str:
+    parametros = _parametros_bench(r)
+    return f"{r['nombre']} ({parametros})" if parametros else r["nombre"]
+
+def _imprimir_resultado(r: dict):
+    extra = ""
+    if "escalado" in r:
+        extra = f"  escalado {r['escalado']:.2f}x"
+    elif "aceleracion" in r:
+        extra = f"  aceleración {r['aceleracion']:.1f}x"
+    print(f"  {_etiqueta_bench(r):<40} {_formatear_valor(r['mediana']):>10} {r['unidad']:<7}"
+          f"{COLORES['gris']}p95 {_formatear_valor(r['p95']):>9}  ±{_formatear_valor(r['desviacion'])}"
+          f"{COLORES['reset']}{extra}")
+
+def ejecutar_benchmarks(suites: List[str], opciones: dict) -> dict:
+    informe = {"version": 1, "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"), "host": platform.node(),
+               "sistema": platform.platform(), "python": platform.python_version(),
+               "cpus": os.cpu_count(), "opciones": opciones, "suites": {}}
+    for suite in suites:
+        print(f"\n{COLORES['cian']}[{suite}]{COLORES['reset']}")
+        try:
+            resultados = BENCH_SUITES[suite](opciones)
+        except OSError as e:
+            imprimir_error(f"La suite {suite} falló: {e}")
+            continue
+        for r in resultados:
+            _imprimir_resultado(r)
+        informe["suites"][suite] = resultados
+    return informe
+
+def comparar_benchmarks(base: dict, nuevo: dict, umbral: float = BENCH_UMBRAL_REGRESION) -> int:
+    """Imprime el cambio de cada prueba común y las que solo están en un informe; devuelve el número de regresiones."""
+    print(f"{COLORES['gris']}base : {base.get('host')} {base.get('fecha')}\n"
+          f"nuevo: {nuevo.get('host')} {nuevo.get('fecha')}{COLORES['reset']}")
+    regresiones = sin_pareja = 0
+    suites_base, suites_nuevo = base.get("suites", {}), nuevo.get("suites", {})
+    for suite in list(suites_nuevo) + [s for s in suites_base if s not in suites_nuevo]:
+        previos = {r["nombre"]: r for r in suites_base.get(suite, [])}
+        actuales = {r["nombre"]: r for r in suites_nuevo.get(suite, [])}
+        print(f"\n{COLORES['cian']}[{suite}]{COLORES['reset']}")
+        for nombre in [n for n in previos if n not in actuales] + [n for n in actuales if n not in previos]:
+            lado = "base" if nombre in previos else "nuevo"
+            print(f"  {nombre:<40} {COLORES['amarillo']}solo en el informe {lado}{COLORES['reset']}")
+            sin_pareja += 1
+        for nombre in [n for n in actuales if n in previos]:
+            a, b = previos[nombre], actuales[nombre]
+            if _parametros_bench(a) != _parametros_bench(b):
+                print(f"  {COLORES['gris']}{nombre}: {_parametros_bench(a)} → {_parametros_bench(b)}{COLORES['reset']}")
+            cambio = (b["mediana"] - a["mediana"]) / a["mediana"] * 100 if a["mediana"] else 0.0
+            mejora = cambio if b["mayor_mejor"] else -cambio
+            # Solo es regresión si supera el umbral y además el ruido de ambas mediciones
+            ruido = a["desviacion"] + b["desviacion"]
+            if mejora < -umbral and abs(b["mediana"] - a["mediana"]) > ruido:
+                color, marca = COLORES["rojo"], "REGRESIÓN"
+                regresiones += 1
+            elif mejora > umbral and abs(b["mediana"] - a["mediana"]) > ruido:
+                color, marca = COLORES["verde"], "mejora"
+            else:
+                color, marca = COLORES["gris"], "="
+            print(f"  {b['nombre']:<40} {_formatear_valor(a['mediana']):>10} → {_formatear_valor(b['mediana']):>10} "
+                  f"{b['unidad']:<7}{color}{mejora:+7.1f}% {marca}{COLORES['reset']}")
+    print()
+    if sin_pareja:
+        print(f"{COLORES['amarillo']}{sin_pareja} prueba(s) sin pareja: no se han comparado{COLORES['reset']}")
+    if regresiones:
+        imprimir_error(f"{regresiones} regresión(es) por encima del {umbral:g}%")
+    else:
+        imprimir_exito(f"Sin regresiones por encima del {umbral:g}%")
+    return regresiones
+
+def cmd_benchmark(args):
+    """Ejecuta pruebas de rendimiento del sistema"""
+    import json
+    uso = ("Uso: benchmark [suite...] [N] [-r reps] [-w calentamiento] [--tam MB] [--dir ruta] [-o salida.json]\n"
+           "     benchmark comparar <base.json> <nuevo.json> [--umbral %]\n"
+           f"     suites: {', '.join(BENCH_SUITES)}")
+    if args and args[0] == "comparar":
+        rutas, umbral = list(args[1:]), BENCH_UMBRAL_REGRESION
+        try:
+            if "--umbral" in rutas:
+                i = rutas.index("--umbral")
+                umbral = float(rutas[i + 1])
+                del rutas[i:i + 2]
+            if len(rutas) != 2:
+                raise IndexError
+            with open(rutas[0], encoding="utf-8") as f:
+                base = json.load(f)
+            with open(rutas[1], encoding="utf-8") as f:
+                nuevo = json.load(f)
+        except (IndexError, ValueError):
+            imprimir_error(uso)
+            return
+        except OSError as e:
+            imprimir_error(f"No se pudo leer el informe: {e}")
+            return
+        comparar_benchmarks(base, nuevo, umbral)
+        return
+
+    opciones = {"repeticiones": BENCH_REPETICIONES, "calentamiento": BENCH_CALENTAMIENTO,
+                "tam_mb": BENCH_TAM_MB, "dir": os.getcwd(), "n": None}
+    suites, salida = [], None
+    try:
+        i = 0
+        while i < len(args):
+            a = args[i]
+            if a in BENCH_SUITES:
+                suites.append(a)
+            elif a.isdigit():
+                opciones["n"] = int(a)  # operaciones por repetición en las pruebas de latencia
+            elif a in ("-r", "-w", "--tam", "--dir", "-o"):
+                valor = args[i + 1]
+                i += 1
+                if a == "-r":
+                    opciones["repeticiones"] = max(1, int(valor))
+                elif a == "-w":
+                    opciones["calentamiento"] = max(0, int(valor))
+                elif a == "--tam":
+                    opciones["tam_mb"] = max(1, int(valor))
+                elif a == "--dir":
+                    opciones["dir"] = os.path.abspath(os.path.expanduser(valor))
+                else:
+                    salida = valor
+            else:
+                raise ValueError(a)
+            i += 1
+    except (IndexError, ValueError):
+        imprimir_error(uso)
+        return
+
+    suites = suites or list(BENCH_SUITES)
+    print(f"{COLORES['amarillo']}🚀 Benchmark: {', '.join(suites)} "
+          f"({opciones['repeticiones']} repeticiones, {opciones['calentamiento']} de calentamiento)...{COLORES['reset']}")
+    informe = ejecutar_benchmarks(suites, opciones)
+    if salida:
+        try:
+            with open(salida, "w", encoding="utf-8") as f:
+                json.dump(informe, f, ensure_ascii=False, indent=1)
+            imprimir_exito(f"Resultados guardados en {salida}")
+        except OSError as e:
+            imprimir_error(f"No se pudo guardar {salida}: {e}")
+
+def cmd_python_repl(_args):
+    print(f"{COLORES['verde']}🔮 Modo Python interactivo (escribe 'salir' para volver){COLORES['reset']}")
+    while True:
+        try:
+            codigo = input(f"{COLORES['amarillo']}>>> {COLORES['reset']}").strip()
+            if codigo.lower() in ["salir", "exit"]:
+                break
+            
+            try:
+                resultado = eval(codigo)
+                if resultado is not None:
+                    print(f"{COLORES['azul']}{resultado}{COLORES['reset']}")
+            except SyntaxError:
+                exec(codigo)
+        except Exception as e:
+            imprimir_error(f"Error en Python: {e}")
+
+# =========================
+# Resolución de nombres (caché DNS compartida)
+# =========================
+DNS_TTL = 300              # getaddrinfo no expone el TTL real: se usa uno fijo
+DNS_TTL_NEGATIVO = 30      # los fallos también se recuerdan, pero menos tiempo
+DNS_TIMEOUT = 5.0
+DNS_HILOS = 32             # consultas simultáneas por defecto en los lotes
+DNS_MAX_HILOS = 256
+DNS_HILO_OCIOSO = 60.0     # segundos sin trabajo tras los que un hilo del pool termina
+DNS_MAX_PERSISTIDAS = 5000
+DNS_TIPOS = {"*": 0, "A": 4, "AAAA": 6}   # familia pedida a getaddrinfo (0 = ambas)
+
+class _PoolDNS:
+    """Hilos daemon para getaddrinfo, que no admite timeout.
+
+    A diferencia de ThreadPoolExecutor, una consulta colgada no retrasa la salida
+    del programa, y si todos los hilos están ocupados (p. ej. con consultas que ya
+    vencieron) se arranca otro en vez de dejar la nueva esperando en la cola."""
+
+    def __init__(self, maximo: int):
+        import queue
+        self.cola = queue.Queue()
+        self.maximo = maximo
+        self.hilos = 0
+        self.libres = 0
+        self.cerrojo = threading.Lock()
+
+    def enviar(self, funcion, *args):
+        from concurrent.futures import Future
+        futuro = Future()
+        with self.cerrojo:
+            if self.libres:
+                self.libres -= 1
+            elif self.hilos < self.maximo:
+                self.hilos += 1
+                threading.Thread(target=self._trabajar, daemon=True, name=f"vso-dns-{self.hilos}").start()
+        self.cola.put((futuro, funcion, args))
+        return futuro
+
+    def _trabajar(self):
+        import queue
+        while True:
+            try:
+                futuro, funcion, args = self.cola.get(timeout=DNS_HILO_OCIOSO)
+            except queue.Empty:
+                with self.cerrojo:
+                    if self.libres:
+                        self.libres -= 1
+                        self.hilos -= 1
+                        return
+                continue
+            if futuro.set_running_or_notify_cancel():
+                try:
+                    futuro.set_result(funcion(*args))
+                except BaseException as e:
+                    futuro.set_exception(e)
+            with self.cerrojo:
+                self.libres += 1
+
+class ResolvedorDNS:
+    """Caché de getaddrinfo compartida por todos los comandos de red.
+
+    Las consultas se hacen en hilos aparte, así que se les puede poner
+    timeout; si varios comandos piden el mismo nombre a la vez se comparte una
+    sola consulta. Las respuestas se guardan en ~/.vsouver/dns.json."""
+
+    def __init__(self):
+        self.entradas: Dict[tuple, tuple] = {}   # (host, tipo) → (expira, direcciones, error)
+        self.en_vuelo: Dict[tuple, object] = {}
+        self.cerrojo = threading.Lock()
+        self.pool = _PoolDNS(DNS_MAX_HILOS)
+        self.persistir = True
+        self.cargado = False
+        self.modificado = False
+        self.aciertos = self.consultas = self.fallos = 0
+        self.tiempo_consultas = 0.0
+
+    @staticmethod
+    def literal(host: str) -> Optional[str]:
+        import ipaddress
+        try:
+            return str(ipaddress.ip_address(host.strip("[]")))
+        except ValueError:
+            return None
+
+    @staticmethod
+    def _ruta() -> str:
+        return os.path.join(VSO_DIR, "dns.json")
+
+    def _cargar(self):
+        if self.cargado:
+            return
+        import json
+        self.cargado = True
+        atexit.register(self.guardar)
+        try:
+            with open(self._ruta(), "r", encoding="utf-8") as f:
+                datos = json.load(f)
+            self.persistir = datos.get("persistir", True)
+            ahora = time.time()
+            for clave, (expira, direcciones) in datos.get("entradas", {}).items():
+                if expira > ahora:
+                    host, tipo = clave.rsplit("|", 1)
+                    self.entradas[(host, tipo)] = (expira, tuple(direcciones), None)
+        except (OSError, ValueError, TypeError, AttributeError):
+            pass
+
+    def guardar(self):
+        if not self.modificado:
+            return
+        import json
+        ahora = time.time()
+        validas = sorted(((e[0], clave, e[1]) for clave, e in self.entradas.items() if e[1] and e[0] > ahora),
+                         reverse=True)[:DNS_MAX_PERSISTIDAS] if self.persistir else []
+        datos = {"persistir": self.persistir,
+                 "entradas": {f"{host}|{tipo}": [expira, list(direcciones)]
+                              for expira, (host, tipo), direcciones in validas}}
+        try:
+            os.makedirs(VSO_DIR, exist_ok=True)
+            temporal = f"{self._ruta()}.{os.getpid()}.tmp"
+            with open(temporal, "w", encoding="utf-8") as f:
+                json.dump(datos, f)
+            os.replace(temporal, self._ruta())
+            self.modificado = False
+        except OSError:
+            pass
+
+    def _consultar(self, clave: tuple) -> tuple:
+        """Se ejecuta en el pool: hace la consulta real y la deja en la caché."""
+        import socket
+        host, tipo = clave
+        familia = {4: socket.AF_INET, 6: socket.AF_INET6}.get(DNS_TIPOS[tipo], socket.AF_UNSPEC)
+        inicio = time.perf_counter()
+        try:
+            infos = socket.getaddrinfo(host, None, familia, socket.SOCK_STREAM)
+            entrada = (time.time() + DNS_TTL, tuple(dict.fromkeys(info[4][0] for info in infos)), None)
+        except (OSError, UnicodeError) as e:
+            entrada = (time.time() + DNS_TTL_NEGATIVO, (), str(e))
+        with self.cerrojo:
+            self.consultas += 1
+            self.tiempo_consultas += time.perf_counter() - inicio
+            if entrada[2]:
+                self.fallos += 1
+            self.entradas[clave] = entrada
+            self.en_vuelo.pop(clave, None)
+            self.modificado = True
+        return entrada
+
+    def _pedir(self, host: str, tipo: str):
+        """Devuelve (entrada, None) si está en caché o (None, futuro) con la consulta en curso."""
+        if tipo not in DNS_TIPOS:
+            raise ValueError(f"tipo de registro no soportado: {tipo}")
+        self._cargar()
+        clave = (host.lower().rstrip("."), tipo)
+        with self.cerrojo:
+            entrada = self.entradas.get(clave)
+            if entrada is not None and entrada[0] > time.time():
+                self.aciertos += 1
+                return entrada, None
+            futuro = self.en_vuelo.get(clave)
+            if futuro is None:
+                futuro = self.en_vuelo[clave] = self.pool.enviar(self._consultar, clave)
+        return None, futuro
+
+    @staticmethod
+    def _direcciones(entrada: tuple) -> List[str]:
+        if entrada[2]:
+            raise OSError(entrada[2])
+        return list(entrada[1])
+
+    def en_cache(self, host: str, tipo: str = "*") -> bool:
+        self._cargar()
+        entrada = self.entradas.get((host.lower().rstrip("."), tipo))
+        return entrada is not None and entrada[0] > time.time()
+
+    def resolver(self, host: str, tipo: str = "*", timeout: float = DNS_TIMEOUT) -> List[str]:
+        """Direcciones de `host` (o el propio host si ya es una IP). OSError si no resuelve."""
+        literal = self.literal(host)
+        if literal:
+            return [literal]
+        entrada, futuro = self._pedir(host, tipo)
+        if futuro is not None:
+            from concurrent.futures import TimeoutError as TimeoutFuturo
+            try:
+                entrada = futuro.result(timeout)
+            except TimeoutFuturo:
+                raise TimeoutError(f"sin respuesta en {timeout:g} s") from None
+        return self._direcciones(entrada)
+
+    async def resolver_async(self, host: str, tipo: str = "*", timeout: float = DNS_TIMEOUT) -> List[str]:
+        import asyncio
+        literal = self.literal(host)
+        if literal:
+            return [literal]
+        entrada, futuro = self._pedir(host, tipo)
+        if futuro is not None:
+            try:
+                # shield: un timeout aquí no cancela la consulta que comparten otros
+                entrada = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(futuro)), timeout)
+            except asyncio.TimeoutError:
+                raise TimeoutError(f"sin respuesta en {timeout:g} s") from None
+        return self._direcciones(entrada)
+
+    def resolver_lote(self, hosts: List[str], tipo: str = "*", timeout: float = DNS_TIMEOUT,
+                      concurrencia: int = DNS_HILOS, al_resolver=None) -> List[tuple]:
+        """Resuelve muchos nombres a la vez; devuelve (host, direcciones, error, segundos, caché) por host.
+
+        `al_resolver` recibe cada tupla en cuanto está lista (en orden de llegada)."""
+        import asyncio
+        resultados = []
+
+        async def todos():
+            limite = asyncio.Semaphore(concurrencia)
+
+            async def uno(host):
+                async with limite:
+                    cacheado = self.literal(host) is not None or self.en_cache(host, tipo)
+                    inicio = time.perf_counter()
+                    try:
+                        direcciones, error = await self.resolver_async(host, tipo, timeout), None
+                    except OSError as e:
+                        direcciones, error = [], str(e)
+                    resultado = (host, direcciones, error, time.perf_counter() - inicio, cacheado)
+                    resultados.append(resultado)
+                    if al_resolver:
+                        al_resolver(resultado)
+            await asyncio.gather(*(uno(h) for h in hosts))
+
+        asyncio.run(todos())
+        return resultados
+
+    def limpiar(self):
+        with self.cerrojo:
+            self.entradas.clear()
+            self.aciertos = self.consultas = self.fallos = 0
+            self.tiempo_consultas = 0.0
+            self.modificado = True
+
+_resolvedor_dns: Optional[ResolvedorDNS] = None
+
+def obtener_resolvedor() -> ResolvedorDNS:
+    global _resolvedor_dns
+    if _resolvedor_dns is None:
+        _resolvedor_dns = ResolvedorDNS()
+    return _resolvedor_dns
+
+def _leer_dominios(ruta: str) -> List[str]:
+    with open(os.path.expanduser(ruta), "r", encoding="utf-8") as f:
+        dominios = (linea.split("#", 1)[0].strip() for linea in f)
+        return list(dict.fromkeys(d for d in dominios if d))
+
+def cmd_ip_dominio(args):
+    uso = ("Uso: vso-ip-dominio [-4|-6] [-t timeout] <dominio>...\n"
+           "     vso-ip-dominio -f lista.txt [-j hilos] [-t timeout] [-o salida.csv]")
+    tipo = "*"
+    timeout = DNS_TIMEOUT
+    concurrencia = DNS_HILOS
+    archivo = salida = None
+    dominios = []
+    try:
+        i = 0
+        while i < len(args):
+            a = args[i]
+            if a in ("-4", "-6"):
+                tipo = "A" if a == "-4" else "AAAA"
+            elif a in ("-t", "-j", "-f", "-o"):
+                valor = args[i + 1]
+                i += 1
+                if a == "-t":
+                    timeout = float(valor)
+                elif a == "-j":
+                    concurrencia = int(valor)
+                elif a == "-f":
+                    archivo = valor
+                else:
+                    salida = valor
+            else:
+                dominios.append(a)
+            i += 1
+    except (IndexError, ValueError):
+        imprimir_error(uso)
+        return
+    if archivo:
+        try:
+            dominios += _leer_dominios(archivo)
+        except OSError as e:
+            imprimir_error(f"No se pudo leer {archivo}: {e}")
+            return
+    if not dominios or timeout <= 0 or concurrencia < 1:
+        imprimir_error(uso)
+        return
+
+    resolvedor = obtener_resolvedor()
+    verde, gris, reset = COLORES["verde"], COLORES["gris"], COLORES["reset"]
+    if len(dominios) == 1 and not salida:
+        dominio = dominios[0]
+        cacheado = resolvedor.en_cache(dominio, tipo)
+        try:
+            ips = resolvedor.resolver(dominio, tipo, timeout)
+        except OSError as e:
+            imprimir_error(f"No se pudo resolver IP de {dominio}: {e}")
+            return
+        origen = f" {gris}(caché){reset}" if cacheado else ""
+        print(f"{verde}IP de {dominio}: {', '.join(ips)}{reset}{origen}")
+        return
+
+    filas = []
+    def mostrar(resultado):
+        host, direcciones, error, _, cacheado = resultado
+        if salida:
+            filas.append(resultado)
+        elif error:
+            print(f"{COLORES['rojo']}✖ {host}: {error}{reset}")
+        else:
+            print(f"{verde}{host}{reset} {', '.join(direcciones)}{f' {gris}(caché){reset}' if cacheado else ''}")
+
+    inicio = time.perf_counter()
+    try:
+        resultados = resolvedor.resolver_lote(dominios, tipo, timeout, concurrencia, mostrar)
+    except KeyboardInterrupt:
+        print(f"\n{COLORES['amarillo']}Resolución interrumpida.{reset}")
+        return
+    duracion = time.perf_counter() - inicio
+    if salida:
+        import csv
+        try:
+            with open(os.path.expanduser(salida), "w", newline="", encoding="utf-8") as f:
+                escritor = csv.writer(f)
+                escritor.writerow(["dominio", "direcciones", "error", "ms", "cache"])
+                for host, direcciones, error, segundos, cacheado in filas:
+                    escritor.writerow([host, " ".join(direcciones), error or "", f"{segundos * 1000:.1f}",
+                                       int(cacheado)])
+        except OSError as e:
+            imprimir_error(f"No se pudo escribir {salida}: {e}")
+            return
+    latencias = sorted(r[3] for r in resultados if not r[4])
+    fallidos = sum(1 for r in resultados if r[2])
+    sin_respuesta = sum(1 for r in resultados if r[2] and "sin respuesta" in r[2])
+    cacheados = sum(1 for r in resultados if r[4])
+    resumen = (f"{len(resultados)} dominios en {duracion:.2f} s ({len(resultados) / max(duracion, 1e-9):,.0f}/s): "
+               f"{len(resultados) - fallidos} resueltos, {fallidos} fallidos ({sin_respuesta} sin respuesta), "
+               f"{cacheados} desde caché")
+    if latencias:
+        p50 = latencias[len(latencias) // 2]
+        p95 = latencias[min(len(latencias) - 1, int(0.95 * len(latencias)))]
+        resumen += f"; latencia p50 {_formatear_duracion(p50)}, p95 {_formatear_duracion(p95)}"
+    print(f"{gris}{resumen}{reset}")
+
+def cmd_vso_dns(args):
+    """Estado y gestión de la caché DNS compartida"""
+    uso = "Uso: vso-dns [estado|limpiar|persistir on|off]"
+    resolvedor = obtener_resolvedor()
+    resolvedor._cargar()
+    accion = args[0] if args else "estado"
+    if accion == "estado":
+        ahora = time.time()
+        vigentes = [e for e in resolvedor.entradas.values() if e[0] > ahora]
+        negativas = sum(1 for e in vigentes if e[2])
+        pedidas = resolvedor.aciertos + resolvedor.consultas
+        tasa = 100 * resolvedor.aciertos / pedidas if pedidas else 0.0
+        media = resolvedor.tiempo_consultas / resolvedor.consultas if resolvedor.consultas else 0.0
+        print(f"{COLORES['cian']}Caché DNS:{COLORES['reset']} {len(vigentes)} entradas vigentes "
+              f"({negativas} negativas), TTL {DNS_TTL} s / {DNS_TTL_NEGATIVO} s")
+        print(f"  sesión: {pedidas} búsquedas, {resolvedor.aciertos} aciertos ({tasa:.0f} %), "
+              f"{resolvedor.consultas} consultas reales ({resolvedor.fallos} fallidas), "
+              f"media {_formatear_duracion(media)}")
+        print(f"  persistencia: {'sí' if resolvedor.persistir else 'no'} ({resolvedor._ruta()})")
+    elif accion == "limpiar":
+        resolvedor.limpiar()
+        resolvedor.guardar()
+        imprimir_exito("Caché DNS vaciada")
+    elif accion == "persistir" and len(args) > 1 and args[1] in ("on", "off"):
+        resolvedor.persistir = args[1] == "on"
+        resolvedor.modificado = True
+        resolvedor.guardar()
+        imprimir_exito(f"Persistencia de la caché DNS: {'activada' if resolvedor.persistir else 'desactivada'}")
+    else:
+        imprimir_error(uso)
+
+# =========================
+# Cliente HTTP (keep-alive, reintentos y caché)
+# =========================
+HTTP_TIMEOUT = 5.0
+HTTP_REINTENTOS = 2
+HTTP_ESPERA_REINTENTO = 0.2        # se duplica en cada reintento
+HTTP_MAX_LIBRES_POR_HOST = 4
+HTTP_MAX_CUERPO = 8 << 20          # respuestas más grandes se rechazan
+HTTP_METODOS_IDEMPOTENTES = {"GET", "HEAD", "OPTIONS"}
+HTTP_AGENTE = "VsoUver/2.0"
+IP_PUBLICA_ARCHIVO = os.path.join(os.path.expanduser("~"), ".vsouver", "ip-publica")
+IP_PUBLICA_SERVICIOS = ("https://api.ipify.org", "https://checkip.amazonaws.com",
+                        "https://icanhazip.com", "https://ifconfig.me/ip")
+IP_PUBLICA_TTL = 6 * 3600          # en la práctica, toda la sesión
+
+class RespuestaHTTP:
+    __slots__ = ("url", "estado", "motivo", "cabeceras", "cuerpo", "segundos", "desde_cache")
+
+    def __init__(self, url, estado, motivo, cabeceras, cuerpo, segundos, desde_cache=False):
+        self.url = url
+        self.estado = estado
+        self.motivo = motivo
+        self.cabeceras: Dict[str, str] = cabeceras   # nombres en minúsculas
+        self.cuerpo: bytes = cuerpo
+        self.segundos = segundos
+        self.desde_cache = desde_cache
+
+    def texto(self) -> str:
+        return self.cuerpo.decode("utf-8", "replace")
+
+class ClienteHTTP:
+    """Cliente HTTP/1.1 sobre http.client compartido por los comandos y los plugins.
+
+    Reutiliza conexiones por (esquema, host, puerto, verificar, ip), resuelve con la
+    caché DNS, reintenta con espera exponencial los métodos idempotentes y guarda
+    en caché las respuestas 2xx a las que se pida TTL. Desde un plugin:
+    `from __main__ import obtener_cliente_http`."""
+
+    def __init__(self, timeout: float = HTTP_TIMEOUT, reintentos: int = HTTP_REINTENTOS):
+        self.timeout = timeout
+        self.reintentos = reintentos
+        self.libres: Dict[tuple, List] = {}
+        self.cache: Dict[tuple, tuple] = {}   # (método, url) → (expira, respuesta)
+        self.cerrojo = threading.Lock()
+        self.peticiones = self.reutilizadas = self.aciertos_cache = self.fallos = 0
+
+    @staticmethod
+    def _partir_url(url: str) -> tuple:
+        from urllib.parse import urlsplit
+        partes = urlsplit(url)
+        if partes.scheme not in ("http", "https") or not partes.hostname:
+            raise ValueError(f"URL no soportada: {url}")
+        puerto = partes.port or (443 if partes.scheme == "https" else 80)
+        ruta = (partes.path or "/") + (f"?{partes.query}" if partes.query else "")
+        return partes.scheme, partes.hostname, puerto, ruta
+
+    def _nueva_conexion(self, esquema: str, host: str, puerto: int, timeout: float, verificar: bool,
+                        ip: Optional[str]):
+        import http.client
+        import socket
+        import ssl
+        ip = ip or obtener_resolvedor().resolver(host, timeout=timeout)[0]
+        sock = socket.create_connection((ip, puerto), timeout=timeout)
+        try:
+            if esquema == "https":
+                contexto = ssl.create_default_context()
+                literal = ResolvedorDNS.literal(host)
+                if not verificar or literal:
+                    contexto.check_hostname = False
+                if not verificar:
+                    contexto.verify_mode = ssl.CERT_NONE
+                sock = contexto.wrap_socket(sock, server_hostname=None if literal else host)
+        except (OSError, ssl.SSLError):
+            sock.close()
+            raise
+        if esquema == "https":
+            # HTTPSConnection: puerto por defecto 443, así la cabecera Host no lleva ":443"
+            conexion = http.client.HTTPSConnection(host, puerto, timeout=timeout, context=contexto)
+        else:
+            conexion = http.client.HTTPConnection(host, puerto, timeout=timeout)
+        conexion.sock = sock  # ya conectada a la IP de la caché DNS
+        return conexion
+
+    def _tomar(self, clave: tuple):
+        with self.cerrojo:
+            libres = self.libres.get(clave)
+            return libres.pop() if libres else None
+
+    def _devolver(self, clave: tuple, conexion):
+        with self.cerrojo:
+            libres = self.libres.setdefault(clave, [])
+            if len(libres) < HTTP_MAX_LIBRES_POR_HOST:
+                libres.append(conexion)
+                return
+        conexion.close()
+
+    def _una_vez(self, metodo, url, cabeceras, cuerpo, timeout, verificar, ip) -> RespuestaHTTP:
+        import http.client
+        esquema, host, puerto, ruta = self._partir_url(url)
+        clave = (esquema, host, puerto, verificar, ip)
+        # Un POST no se puede repetir sin riesgo, así que nunca va por una conexión que pueda estar caducada
+        conexion = self._tomar(clave) if metodo in HTTP_METODOS_IDEMPOTENTES else None
+        reutilizada = conexion is not None
+        inicio = time.perf_counter()
+        while True:
+            if conexion is None:
+                conexion = self._nueva_conexion(esquema, host, puerto, timeout, verificar, ip)
+            conexion.sock.settimeout(timeout)
+            try:
+                conexion.request(metodo, ruta, body=cuerpo,
+                                 headers={"User-Agent": HTTP_AGENTE, **(cabeceras or {})})
+                respuesta = conexion.getresponse()
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                conexion.close()
+                if reutilizada:
+                    # El servidor cerró la conexión ociosa sin responder nada: repetir con
+                    # una nueva sin gastar un reintento. Un timeout no entra aquí: la
+                    # petición pudo llegar y la decide el bucle de reintentos.
+                    conexion, reutilizada = None, False
+                    continue
+                raise
+            except (OSError, http.client.HTTPException):
+                conexion.close()
+                raise
+            try:
+                datos = respuesta.read(HTTP_MAX_CUERPO + 1)
+            except (OSError, http.client.HTTPException):
+                conexion.close()
+                raise
+            break
+        if len(datos) > HTTP_MAX_CUERPO:
+            conexion.close()
+            raise http.client.HTTPException(f"respuesta de más de {tamano_legible(HTTP_MAX_CUERPO)}")
+        if respuesta.will_close:
+            conexion.close()
+        else:
+            self._devolver(clave, conexion)
+        with self.cerrojo:
+            self.peticiones += 1
+            self.reutilizadas += reutilizada
+        return RespuestaHTTP(url, respuesta.status, respuesta.reason,
+                             {k.lower(): v for k, v in respuesta.getheaders()}, datos,
+                             time.perf_counter() - inicio)
+
+    def solicitar(self, metodo: str, url: str, cabeceras: Optional[dict] = None, cuerpo: Optional[bytes] = None,
+                  timeout: Optional[float] = None, reintentos: Optional[int] = None,
+                  cache_ttl: float = 0, verificar: bool = True, ip: Optional[str] = None) -> RespuestaHTTP:
+        """Hace la petición; lanza OSError/http.client.HTTPException si fallan todos los intentos.
+
+        `ip` fija la dirección a la que conectar (sin pasar por la caché DNS)."""
+        import http.client
+        metodo = metodo.upper()
+        timeout = self.timeout if timeout is None else timeout
+        reintentos = self.reintentos if reintentos is None else reintentos
+        if metodo not in HTTP_METODOS_IDEMPOTENTES:
+            reintentos = 0  # repetir un POST podría duplicar su efecto
+        clave_cache = (metodo, url)
+        if cache_ttl > 0:
+            with self.cerrojo:
+                guardada = self.cache.get(clave_cache)
+                if guardada and guardada[0] > time.monotonic():
+                    self.aciertos_cache += 1
+                    r = guardada[1]
+                    return RespuestaHTTP(r.url, r.estado, r.motivo, r.cabeceras, r.cuerpo, 0.0, True)
+        for intento in range(reintentos + 1):
+            try:
+                respuesta = self._una_vez(metodo, url, cabeceras, cuerpo, timeout, verificar, ip)
+            except (OSError, http.client.HTTPException):
+                with self.cerrojo:
+                    self.fallos += 1
+                if intento == reintentos:
+                    raise
+                time.sleep(HTTP_ESPERA_REINTENTO * (2 ** intento))
+                continue
+            if respuesta.estado >= 500 and intento < reintentos:
+                time.sleep(HTTP_ESPERA_REINTENTO * (2 ** intento))
+                continue
+            if cache_ttl > 0 and 200 <= respuesta.estado < 300:
+                with self.cerrojo:
+                    self.cache[clave_cache] = (time.monotonic() + cache_ttl, respuesta)
+            return respuesta
+        return respuesta
+
+    def obtener(self, url: str, **opciones) -> RespuestaHTTP:
+        return self.solicitar("GET", url, **opciones)
+
+    def carrera(self, urls, validar=None, **opciones) -> RespuestaHTTP:
+        """Pide todas las URL a la vez y devuelve la primera respuesta 2xx que pase `validar`.
+
+        Las peticiones perdedoras terminan en segundo plano (hilos daemon) y sus
+        conexiones vuelven al pool. Si todas fallan, lanza OSError con los motivos."""
+        import queue
+        urls = list(urls)
+        if opciones.get("cache_ttl"):
+            with self.cerrojo:
+                for url in urls:
+                    guardada = self.cache.get(("GET", url))
+                    if guardada and guardada[0] > time.monotonic():
+                        self.aciertos_cache += 1
+                        r = guardada[1]
+                        return RespuestaHTTP(r.url, r.estado, r.motivo, r.cabeceras, r.cuerpo, 0.0, True)
+        resultados = queue.Queue()
+
+        def pedir(url):
+            try:
+                respuesta = self.obtener(url, **opciones)
+                if not 200 <= respuesta.estado < 300:
+                    raise OSError(f"HTTP {respuesta.estado} {respuesta.motivo}")
+                if validar and not validar(respuesta):
+                    raise ValueError("respuesta no válida")
+                resultados.put((url, respuesta, None))
+            except Exception as e:
+                resultados.put((url, None, e))
+
+        for url in urls:
+            threading.Thread(target=pedir, args=(url,), daemon=True, name="vso-http").start()
+        errores = []
+        for _ in urls:
+            url, respuesta, error = resultados.get()
+            if respuesta is not None:
+                return respuesta
+            errores.append(f"{url}: {error}")
+        raise OSError("; ".join(errores) or "no hay URL que probar")
+
+    def cerrar(self):
+        with self.cerrojo:
+            for libres in self.libres.values():
+                for conexion in libres:
+                    conexion.close()
+            self.libres.clear()
+
+_cliente_http: Optional[ClienteHTTP] = None
+
+def obtener_cliente_http() -> ClienteHTTP:
+    global _cliente_http
+    if _cliente_http is None:
+        _cliente_http = ClienteHTTP()
+    return _cliente_http
+
+def _servicios_ip_publica() -> List[str]:
+    """Servicios configurados en ~/.vsouver/ip-publica (uno por línea) o los de serie."""
+    try:
+        return _leer_dominios(IP_PUBLICA_ARCHIVO) or list(IP_PUBLICA_SERVICIOS)
+    except OSError:
+        return list(IP_PUBLICA_SERVICIOS)
+
+def cmd_ip_publica(args):
+    uso = "Uso: vso-ip-publica [-t timeout] [--refrescar]"
+    timeout = HTTP_TIMEOUT
+    refrescar = False
+    try:
+        i = 0
+        while i < len(args):
+            if args[i] == "-t":
+                timeout = float(args[i + 1])
+                i += 1
+            elif args[i] == "--refrescar":
+                refrescar = True
+            else:
+                raise ValueError(args[i])
+            i += 1
+    except (IndexError, ValueError):
+        imprimir_error(uso)
+        return
+    if timeout <= 0:
+        imprimir_error(uso)
+        return
+    cliente = obtener_cliente_http()
+    servicios = _servicios_ip_publica()
+    if refrescar:
+        with cliente.cerrojo:
+            for url in servicios:
+                cliente.cache.pop(("GET", url), None)
+    try:
+        respuesta = cliente.carrera(servicios, validar=lambda r: ResolvedorDNS.literal(r.texto().strip()),
+                                    timeout=timeout, reintentos=0, cache_ttl=IP_PUBLICA_TTL)
+    except OSError as e:
+        imprimir_error(f"No se pudo obtener IP pública: {e}")
+        return
+    from urllib.parse import urlsplit
+    origen = "caché" if respuesta.desde_cache else f"{urlsplit(respuesta.url).hostname}, {respuesta.segundos * 1000:.0f} ms"
+    print(f"{COLORES['verde']}IP pública: {respuesta.texto().strip()}{COLORES['reset']} "
+          f"{COLORES['gris']}({origen}){COLORES['reset']}")
+
+# =========================
+# Motor de escaneo de puertos (asyncio)
+# =========================
+ESCANEO_CONCURRENCIA = 500
+ESCANEO_TIMEOUT_INICIAL = 1.0
+ESCANEO_TIMEOUT_MIN = 0.05
+ESCANEO_TIMEOUT_MAX = 3.0
+ESCANEO_MAX_HOSTS = 65536
+
+def _parsear_puertos(spec: str) -> List[int]:
+    """Convierte '22,80,443,8000-8100' en una lista ordenada de puertos."""
+    puertos = set()
+    for parte in spec.split(","):
+        parte = parte.strip()
+        if not parte:
+            continue
+        if "-" in parte:
+            ini, fin = parte.split("-", 1)
+            ini = int(ini) if ini else 1
+            fin = int(fin) if fin else 65535
+        else:
+            ini = fin = int(parte)
+        if not (1 <= ini <= fin <= 65535):
+            raise ValueError(f"rango de puertos inválido: {parte}")
+        puertos.update(range(ini, fin + 1))
+    if not puertos:
+        raise ValueError("no se indicó ningún puerto")
+    return sorted(puertos)
+
+def _expandir_objetivos(specs: List[str]) -> List[str]:
+    """Expande hosts separados por comas y rangos CIDR en una lista de hosts."""
+    import ipaddress
+    hosts = []
+    for spec in specs:
+        for parte in spec.split(","):
+            parte = parte.strip()
+            if not parte:
+                continue
+            if "/" in parte:
+                red = ipaddress.ip_network(parte, strict=False)
+                if red.num_addresses > ESCANEO_MAX_HOSTS:
+                    raise ValueError(f"red demasiado grande: {parte}")
+                miembros = list(red.hosts()) or [red.network_address]
+                hosts.extend(str(ip) for ip in miembros)
+            else:
+                hosts.append(parte)
+    return list(dict.fromkeys(hosts))
+
+class _EstimadorRTT:
+    """Timeout adaptativo al estilo de TCP (RFC 6298) a partir del RTT medido."""
+
+    def __init__(self, inicial: float):
+        self.srtt = None
+        self.rttvar = None
+        self.timeout = inicial
+
+    def medir(self, rtt: float):
+        if self.srtt is None:
+            self.srtt, self.rttvar = rtt, rtt / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+            self.srtt = 0.875 * self.srtt + 0.125 * rtt
+        self.timeout = min(ESCANEO_TIMEOUT_MAX,
+                           max(ESCANEO_TIMEOUT_MIN, self.srtt + 4 * self.rttvar))
+
+def _ajustar_limite_descriptores(concurrencia: int) -> int:
+    """Sube el límite blando de descriptores si hace falta y ajusta la concurrencia."""
+    try:
+        import resource
+    except ImportError:
+        return concurrencia
+    blando, duro = resource.getrlimit(resource.RLIMIT_NOFILE)
+    necesario = concurrencia + 64
+    if blando != resource.RLIM_INFINITY and blando < necesario:
+        nuevo = necesario if duro == resource.RLIM_INFINITY else min(necesario, duro)
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (nuevo, duro))
+            blando = nuevo
+        except (ValueError, OSError):
+            pass
+    if blando == resource.RLIM_INFINITY:
+        return concurrencia
+    return max(1, min(concurrencia, blando - 64))
+
+async def _resolver_objetivo(host: str):
+    import socket
+    ip = (await obtener_resolvedor().resolver_async(host))[0]
+    return (socket.AF_INET6 if ":" in ip else socket.AF_INET), ip
+
+def _completar_futuro(futuro, valor):
+    if not futuro.done():
+        futuro.set_result(valor)
+
+async def _conectar_async(loop, familia, ip, puerto, timeout) -> tuple:
+    """Conecta con un socket no bloqueante y devuelve (errno, segundos); errno None si venció el timeout.
+
+    loop.sock_connect funciona tanto con el bucle de selectores como con el
+    Proactor de Windows, que no implementa add_writer."""
+    import asyncio
+    import socket
+    sock = socket.socket(familia, socket.SOCK_STREAM)
+    sock.setblocking(False)
+    inicio = time.perf_counter()
+    try:
+        await asyncio.wait_for(loop.sock_connect(sock, (ip, puerto)), timeout)
+        return 0, time.perf_counter() - inicio
+    except asyncio.TimeoutError:
+        return None, None
+    except OSError as e:
+        return e.errno, time.perf_counter() - inicio
+    finally:
+        sock.close()
+
+async def _probar_puerto(loop, familia, ip, puerto, estimador):
+    err, rtt = await _conectar_async(loop, familia, ip, puerto, estimador.timeout)
+    if rtt is not None and err in (0, errno.ECONNREFUSED):
+        # Un RST también es una medida válida del RTT
+        estimador.medir(rtt)
+    return err == 0
+
+async def escanear_puertos(hosts: List[str], puertos: List[int], concurrencia: int = ESCANEO_CONCURRENCIA,
+                           timeout: float = ESCANEO_TIMEOUT_INICIAL, al_encontrar=None) -> Dict[str, List[int]]:
+    """Escanea todos los puertos de todos los hosts con un número acotado de conexiones simultáneas.
+
+    `al_encontrar(host, puerto)` se llama en cuanto se detecta un puerto abierto.
+    """
+    import asyncio
+    loop = asyncio.get_running_loop()
+    abiertos: Dict[str, List[int]] = {}
+    objetivos = []
+    for host in hosts:
+        try:
+            familia, ip = await _resolver_objetivo(host)
+        except OSError as e:
+            imprimir_error(f"No se pudo resolver {host}: {e}")
+            continue
+        abiertos[host] = []
+        objetivos.append((host, familia, ip, _EstimadorRTT(timeout)))
+
+    # Intercalar hosts para repartir la carga en lugar de saturar uno tras otro
+    trabajo = ((obj, puerto) for puerto in puertos for obj in objetivos)
+
+    async def trabajador():
+        for (host, familia, ip, estimador), puerto in trabajo:
+            if await _probar_puerto(loop, familia, ip, puerto, estimador):
+                abiertos[host].append(puerto)
+                if al_encontrar:
+                    al_encontrar(host, puerto)
+
+    total = len(puertos) * len(objetivos)
+    await asyncio.gather(*(trabajador() for _ in range(max(1, min(concurrencia, total)))))
+    for lista in abiertos.values():
+        lista.sort()
+    return abiertos
+
+def cmd_escaneo_puertos(args):
+    import asyncio
+    uso = "Uso: escaneo-puertos <host|CIDR>[,...] <puertos> [-c concurrencia] [-t timeout] (ej: 22,80,8000-8100)"
+    posicionales = []
+    concurrencia = ESCANEO_CONCURRENCIA
+    timeout = ESCANEO_TIMEOUT_INICIAL
+    try:
+        i = 0
+        while i < len(args):
+            if args[i] == "-c":
+                concurrencia = int(args[i + 1])
+                i += 2
+            elif args[i] == "-t":
+                timeout = float(args[i + 1])
+                i += 2
+            else:
+                posicionales.append(args[i])
+                i += 1
+    except (IndexError, ValueError):
+        imprimir_error(uso)
+        return
+    if len(posicionales) < 2 or concurrencia < 1 or timeout <= 0:
+        imprimir_error(uso)
+        return
+
+    try:
+        hosts = _expandir_objetivos(posicionales[:-1])
+        puertos = _parsear_puertos(posicionales[-1])
+    except ValueError as e:
+        imprimir_error(f"Error en escaneo: {e}")
+        return
+
+    concurrencia = _ajustar_limite_descriptores(concurrencia)
+    varios = len(hosts) > 1
+    descripcion = hosts[0] if not varios else f"{len(hosts)} hosts"
+    print(f"{COLORES['verde']}Escaneando {descripcion} ({len(puertos)} puertos, "
+          f"{concurrencia} conexiones simultáneas)...{COLORES['reset']}")
+
+    def al_encontrar(host, puerto):
+        origen = f"{host}:" if varios else ""
+        print(f"{COLORES['cian']}✔ Puerto {origen}{puerto} abierto{COLORES['reset']}", flush=True)
+
+    inicio = time.perf_counter()
+    try:
+        abiertos = asyncio.run(escanear_puertos(hosts, puertos, concurrencia, timeout, al_encontrar))
+    except KeyboardInterrupt:
+        print(f"\n{COLORES['amarillo']}Escaneo interrumpido.{COLORES['reset']}")
+        return
+    except Exception as e:
+        imprimir_error(f"Error en escaneo: {e}")
+        return
+    duracion = time.perf_counter() - inicio
+    total = sum(len(p) for p in abiertos.values())
+    print(f"{COLORES['gris']}{total} puertos abiertos en {len(abiertos)} hosts "
+          f"({duracion:.2f} s){COLORES['reset']}")
+
+# =========================
+# Sonda de latencia (ping nativo)
+# =========================
+PING_CUENTA = 4
+PING_INTERVALO = 1.0
+PING_INTERVALO_MIN = 0.01
+PING_TIMEOUT = 1.0
+PING_PUERTO_TCP = 80
+PING_CONCURRENCIA = 1000      # sondas TCP simultáneas como máximo (descriptores)
+PING_REFRESCO = 0.2           # segundos entre redibujados de la tabla en vivo
+PING_TAM_DATOS = 16
+
+class EstadisticasPing:
+    __slots__ = ("host", "ip", "enviados", "rtts", "error")
+
+    def __init__(self, host: str, ip: Optional[str] = None, error: Optional[str] = None):
+        self.host = host
+        self.ip = ip
+        self.enviados = 0
+        self.rtts: List[float] = []
+        self.error = error
+
+    def registrar(self, rtt: Optional[float]):
+        self.enviados += 1
+        if rtt is not None:
+            self.rtts.append(rtt * 1000)
+
+    def resumen(self) -> dict:
+        """min/avg/max/stddev en ms (stddev poblacional, como el mdev de ping) y % de pérdida."""
+        n = len(self.rtts)
+        media = sum(self.rtts) / n if n else None
+        return {
+            "host": self.host, "ip": self.ip, "enviados": self.enviados, "recibidos": n,
+            "perdida_pct": round(100 * (1 - n / self.enviados), 1) if self.enviados else None,
+            "min_ms": round(min(self.rtts), 3) if n else None,
+            "media_ms": round(media, 3) if n else None,
+            "max_ms": round(max(self.rtts), 3) if n else None,
+            "desviacion_ms": round(math.sqrt(sum((r - media) ** 2 for r in self.rtts) / n), 3) if n else None,
+            "error": self.error,
+        }
+
+class _SondaICMP:
+    """Eco ICMP con sockets de datagrama sin privilegios (Linux: net.ipv4.ping_group_range).
+
+    Un socket por familia para todos los hosts: el núcleo fija el identificador y
+    calcula la suma de control, así que solo hay que emparejar (ip, secuencia)."""
+
+    def __init__(self, loop):
+        import socket
+        self.loop = loop
+        self.sockets = {}
+        self.pendientes: Dict[tuple, tuple] = {}   # (ip, secuencia) → (futuro, instante de envío)
+        self.secuencia = 0
+        for familia, protocolo in ((socket.AF_INET, socket.IPPROTO_ICMP), (socket.AF_INET6, socket.IPPROTO_ICMPV6)):
+            try:
+                sock = socket.socket(familia, socket.SOCK_DGRAM, protocolo)
+            except OSError:
+                continue
+            sock.setblocking(False)
+            try:
+                loop.add_reader(sock.fileno(), self._leer, sock)
+            except NotImplementedError:  # bucle Proactor de Windows
+                sock.close()
+                continue
+            self.sockets[familia] = sock
+        if socket.AF_INET not in self.sockets:
+            self.cerrar()
+            raise PermissionError("ICMP sin privilegios no disponible (net.ipv4.ping_group_range)")
+
+    def _leer(self, sock):
+        ahora = time.perf_counter()
+        while True:
+            try:
+                datos, origen = sock.recvfrom(2048)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                continue  # p. ej. un ICMP de error encolado en el socket
+            if len(datos) < 8 or datos[0] not in (0, 129):  # echo reply v4 / v6
+                continue
+            secuencia = struct.unpack_from("!H", datos, 6)[0]
+            pendiente = self.pendientes.pop((origen[0], secuencia), None)
+            if pendiente and not pendiente[0].done():
+                pendiente[0].set_result(ahora - pendiente[1])
+
+    async def sondear(self, familia, ip: str, timeout: float) -> Optional[float]:
+        import socket
+        sock = self.sockets.get(familia)
+        if sock is None:
+            return None
+        self.secuencia = (self.secuencia + 1) & 0xFFFF
+        clave = (ip, self.secuencia)
+        tipo = 128 if familia == socket.AF_INET6 else 8
+        paquete = struct.pack("!BBHHH", tipo, 0, 0, 0, self.secuencia) + os.urandom(PING_TAM_DATOS)
+        futuro = self.loop.create_future()
+        self.pendientes[clave] = (futuro, time.perf_counter())
+        try:
+            sock.sendto(paquete, (ip, 0))
+        except OSError:
+            self.pendientes.pop(clave, None)
+            return None
+        limite = self.loop.call_later(timeout, _completar_futuro, futuro, None)
+        try:
+            return await futuro
+        finally:
+            limite.cancel()
+            self.pendientes.pop(clave, None)
+
+    def cerrar(self):
+        for sock in self.sockets.values():
+            try:
+                self.loop.remove_reader(sock.fileno())
+            except (ValueError, OSError):
+                pass
+            sock.close()
+        self.sockets.clear()
+
+async def medir_latencias(hosts: List[str], cuenta: int = PING_CUENTA, intervalo: float = PING_INTERVALO,
+                          timeout: float = PING_TIMEOUT, puerto: Optional[int] = None,
+                          concurrencia: int = PING_CONCURRENCIA, al_actualizar=None) -> tuple:
+    """Sondea todos los hosts a la vez desde un único bucle de eventos; devuelve (modo, estadísticas).
+
+    Con `puerto` (o si ICMP sin privilegios no está disponible) mide el tiempo de
+    conexión TCP; un RST también cuenta como respuesta. `al_actualizar(estadisticas, modo)`
+    se llama tras cada sonda."""
+    import asyncio
+    import socket
+    loop = asyncio.get_running_loop()
+    icmp = None
+    if puerto is None:
+        try:
+            icmp = _SondaICMP(loop)
+        except (PermissionError, OSError):
+            puerto = PING_PUERTO_TCP
+    modo = "icmp" if icmp else f"tcp/{puerto}"
+    resolvedor = obtener_resolvedor()
+    estadisticas = [EstadisticasPing(h) for h in hosts]
+    limite = asyncio.Semaphore(concurrencia)
+
+    async def sondear(est: EstadisticasPing):
+        try:
+            est.ip = (await resolvedor.resolver_async(est.host))[0]
+        except OSError as e:
+            est.error = f"no se pudo resolver: {e}"
+            return
+        familia = socket.AF_INET6 if ":" in est.ip else socket.AF_INET
+        siguiente = loop.time()
+        for n in range(cuenta):
+            if icmp:
+                rtt = await icmp.sondear(familia, est.ip, timeout)
+            else:
+                async with limite:
+                    err, rtt = await _conectar_async(loop, familia, est.ip, puerto, timeout)
+                if err not in (0, errno.ECONNREFUSED):
+                    rtt = None
+            est.registrar(rtt)
+            if al_actualizar:
+                al_actualizar(estadisticas, modo)
+            if n + 1 < cuenta:
+                siguiente += intervalo
+                await asyncio.sleep(max(0.0, siguiente - loop.time()))
+
+    try:
+        await asyncio.gather(*(sondear(e) for e in estadisticas))
+    finally:
+        if icmp:
+            icmp.cerrar()
+    return modo, estadisticas
+
+def _formatear_ms(valor: Optional[float]) -> str:
+    return "-" if valor is None else f"{valor:.2f}"
+
+def _lineas_ping(estadisticas: List[EstadisticasPing], modo: str, maximo: Optional[int] = None) -> List[str]:
+    cian, rojo, amarillo, verde, reset = (COLORES["cian"], COLORES["rojo"], COLORES["amarillo"],
+                                          COLORES["verde"], COLORES["reset"])
+    ancho = min(40, max([len(e.host) for e in estadisticas] + [4]))
+    lineas = [f"{cian}{'Host':<{ancho}} {'IP':<15} {'env':>4} {'rec':>4} {'pérd%':>6} {'mín':>8} "
+              f"{'media':>8} {'máx':>8} {'desv':>7}  ({modo}, ms){reset}"]
+    visibles = estadisticas if maximo is None else estadisticas[:max(0, maximo - 2)]
+    for est in visibles:
+        r = est.resumen()
+        if est.error:
+            lineas.append(f"{est.host[:ancho]:<{ancho}} {rojo}{est.error}{reset}")
+            continue
+        perdida = r["perdida_pct"]
+        color = verde if perdida == 0 else rojo if perdida == 100 else amarillo if perdida else ""
+        lineas.append(f"{est.host[:ancho]:<{ancho}} {est.ip or '':<15} {r['enviados']:>4} {r['recibidos']:>4} "
+                      f"{color}{'-' if perdida is None else f'{perdida:.0f}':>6}{reset} "
+                      f"{_formatear_ms(r['min_ms']):>8} {_formatear_ms(r['media_ms']):>8} "
+                      f"{_formatear_ms(r['max_ms']):>8} {_formatear_ms(r['desviacion_ms']):>7}")
+    if len(visibles) < len(estadisticas):
+        lineas.append(f"{COLORES['gris']}... y {len(estadisticas) - len(visibles)} hosts más{reset}")
+    return lineas
+
+def _exportar_ping(ruta: str, estadisticas: List[EstadisticasPing], modo: str):
+    resumenes = [e.resumen() for e in estadisticas]
+    with open(os.path.expanduser(ruta), "w", encoding="utf-8", newline="") as f:
+        if ruta.endswith(".csv"):
+            import csv
+            escritor = csv.DictWriter(f, fieldnames=list(resumenes[0]) if resumenes else ["host"])
+            escritor.writeheader()
+            escritor.writerows(resumenes)
+        else:
+            import json
+            json.dump({"fecha": time.strftime("%Y-%m-%dT%H:%M:%S"), "modo": modo,
+                       "hosts": [dict(r, rtts_ms=[round(x, 3) for x in e.rtts])
+                                 for r, e in zip(resumenes, estadisticas)]}, f, indent=2)
+
+def cmd_ping(args):
+    import asyncio
+    import shutil
+    uso = ("Uso: ping <host|CIDR>[,...]... [-c cuenta] [-i intervalo] [-t timeout] "
+           "[-p puerto_tcp] [-f lista] [-o salida.json|.csv]")
+    hosts_spec = []
+    cuenta, intervalo, timeout = PING_CUENTA, PING_INTERVALO, PING_TIMEOUT
+    puerto = None
+    salida = None
+    try:
+        i = 0
+        while i < len(args):
+            a = args[i]
+            if a in ("-c", "-i", "-t", "-p", "-f", "-o"):
+                valor = args[i + 1]
+                i += 1
+                if a == "-c":
+                    cuenta = int(valor)
+                elif a == "-i":
+                    intervalo = float(valor)
+                elif a == "-t":
+                    timeout = float(valor)
+                elif a == "-p":
+                    puerto = int(valor)
+                elif a == "-f":
+                    hosts_spec += _leer_dominios(valor)
+                else:
+                    salida = valor
+            else:
+                hosts_spec.append(a)
+            i += 1
+    except (IndexError, ValueError):
+        imprimir_error(uso)
+        return
+    except OSError as e:
+        imprimir_error(f"No se pudo leer la lista de hosts: {e}")
+        return
+    try:
+        hosts = _expandir_objetivos(hosts_spec)
+    except ValueError as e:
+        imprimir_error(f"Objetivo inválido: {e}")
+        return
+    if (not hosts or cuenta < 1 or intervalo < PING_INTERVALO_MIN or timeout <= 0
+            or (puerto is not None and not 1 <= puerto <= 65535)):
+        imprimir_error(uso)
+        return
+
+    concurrencia = _ajustar_limite_descriptores(min(PING_CONCURRENCIA, len(hosts)))
+    interactivo = sys.stdout.isatty()
+    previas: List[str] = []
+    ultimo = [0.0]
+    filas = shutil.get_terminal_size().lines
+
+    def al_actualizar(estadisticas, modo):
+        ahora = time.monotonic()
+        if not interactivo or ahora - ultimo[0] < PING_REFRESCO:
+            return
+        ultimo[0] = ahora
+        lineas = _lineas_ping(estadisticas, modo, filas - 1)
+        _redibujar(lineas, previas)
+        previas[:] = lineas
+
+    if interactivo:
+        sys.stdout.write("\033[?25l\033[H\033[2J")
+    inicio = time.perf_counter()
+    try:
+        modo, estadisticas = asyncio.run(medir_latencias(hosts, cuenta, intervalo, timeout, puerto,
+                                                   concurrencia, al_actualizar))
+    except KeyboardInterrupt:
+        print(f"\n{COLORES['amarillo']}Ping interrumpido.{COLORES['reset']}")
+        return
+    finally:
+        if interactivo:
+            sys.stdout.write("\033[H\033[2J\033[?25h")
+    duracion = time.perf_counter() - inicio
+    print("\n".join(_lineas_ping(estadisticas, modo)))
+    vivos = sum(1 for e in estadisticas if e.rtts)
+    print(f"{COLORES['gris']}{vivos}/{len(estadisticas)} hosts responden; {cuenta} sondas por host "
+          f"en {duracion:.2f} s{COLORES['reset']}")
+    if salida:
+        try:
+            _exportar_ping(salida, estadisticas, modo)
+            imprimir_exito(f"Resultados guardados en {salida}")
+        except OSError as e:
+            imprimir_error(f"No se pudo escribir {salida}: {e}")
+    if not vivos:
+        # Pérdida total: estado de error para scripts y prompt, como el ping del sistema
+        imprimir_error("Ningún host respondió")
+
+# =========================
+# Análisis de seguridad (sondas nativas)
+# =========================
+ANALISIS_TIMEOUT = 3.0
+ANALISIS_HILOS = 8
+ANALISIS_MUESTRAS_RTT = 3
+ANALISIS_PUERTOS = ("21,22,23,25,53,80,110,135,139,143,443,445,993,995,1433,1521,"
+                    "2375,3306,3389,5432,5900,6379,8080,8443,9200,11211,27017")
+# Servicios que no deberían estar expuestos (o no sin cifrar)
+PUERTOS_DELICADOS = {21: "ftp", 23: "telnet", 135: "msrpc", 139: "netbios", 445: "smb", 1433: "mssql",
+                     1521: "oracle", 2375: "docker", 3306: "mysql", 3389: "rdp", 5432: "postgresql",
+                     5900: "vnc", 6379: "redis", 9200: "elasticsearch", 11211: "memcached", 27017: "mongodb"}
+CABECERAS_SEGURIDAD = ("strict-transport-security", "content-security-policy", "x-frame-options",
+                       "x-content-type-options", "referrer-policy")
+ANALISIS_DIAS_AVISO_CERT = 21
+OID_ATRIBUTOS_CERT = {"2.5.4.3": "commonName", "2.5.4.10": "organizationName"}
+OID_SAN = "2.5.29.17"
+
+def parsear_objetivo(texto: str) -> dict:
+    """Acepta host, host:puerto, IP, [IPv6]:puerto o URL; devuelve host, esquema, puerto y ruta."""
+    from urllib.parse import urlsplit
+    texto = texto.strip()
+    if not texto:
+        raise ValueError("objetivo vacío")
+    con_esquema = "://" in texto
+    if not con_esquema and texto.count(":") > 1 and not texto.startswith("["):
+        texto_url = f"//[{texto}]"  # IPv6 sin corchetes
+    else:
+        texto_url = texto if con_esquema else f"//{texto}"
+    partes = urlsplit(texto_url)
+    esquema = partes.scheme.lower() or None
+    if esquema not in (None, "http", "https"):
+        raise ValueError(f"esquema no soportado: {esquema}")
+    try:
+        puerto = partes.port
+    except ValueError:
+        raise ValueError(f"puerto inválido en {texto}") from None
+    if not partes.hostname:
+        raise ValueError(f"no se encontró el host en {texto}")
+    return {"objetivo": texto, "host": partes.hostname, "esquema": esquema, "puerto": puerto,
+            "ruta": (partes.path or "/") + (f"?{partes.query}" if partes.query else "")}
+
+def _servicios_web(destino: dict) -> List[tuple]:
+    """(esquema, puerto) a sondear: el indicado, o http y https por defecto."""
+    esquema, puerto = destino["esquema"], destino["puerto"]
+    if esquema:
+        return [(esquema, puerto or (443 if esquema == "https" else 80))]
+    if puerto:
+        return [("https" if puerto in (443, 8443) else "http", puerto)]
+    return [("http", 80), ("https", 443)]
+
+def _conectar(ip: str, puerto: int, timeout: float):
+    import socket
+    return socket.create_connection((ip, puerto), timeout=timeout)
+
+def _sonda_tcp(ip: str, puerto: int, timeout: float) -> dict:
+    rtts = []
+    for _ in range(ANALISIS_MUESTRAS_RTT):
+        inicio = time.perf_counter()
+        try:
+            _conectar(ip, puerto, timeout).close()
+        except OSError as e:
+            return {"puerto": puerto, "error": str(e) or type(e).__name__, "rtt_ms": rtts}
+        rtts.append(round((time.perf_counter() - inicio) * 1000, 2))
+    return {"puerto": puerto, "rtt_ms": rtts, "min_ms": min(rtts), "media_ms": round(sum(rtts) / len(rtts), 2)}
+
+def _sonda_http(destino: dict, ip: str, esquema: str, puerto: int, timeout: float) -> dict:
+    import http.client
+    resultado = {"esquema": esquema, "puerto": puerto}
+    host = f"[{destino['host']}]" if ":" in destino["host"] else destino["host"]
+    try:
+        # La validez del certificado la juzga la sonda TLS; aquí solo interesan las cabeceras
+        respuesta = obtener_cliente_http().solicitar(
+            "HEAD", f"{esquema}://{host}:{puerto}{destino['ruta']}",
+            timeout=timeout, reintentos=0, verificar=False, ip=ip)
+    except (OSError, http.client.HTTPException) as e:
+        resultado["error"] = str(e) or type(e).__name__
+        return resultado
+    cabeceras = respuesta.cabeceras
+    resultado.update({
+        "estado": respuesta.estado, "motivo": respuesta.motivo,
+        "ms": round(respuesta.segundos * 1000, 2),
+        "cabeceras": cabeceras,
+        "faltan": [c for c in CABECERAS_SEGURIDAD if c not in cabeceras
+                   and not (c == "strict-transport-security" and esquema == "http")],
+    })
+    return resultado
+
+def _leer_tlv(der: bytes, pos: int) -> tuple:
+    """Lee un elemento DER en `pos`; devuelve (etiqueta, inicio del contenido, fin)."""
+    etiqueta, largo = der[pos], der[pos + 1]
+    pos += 2
+    if largo & 0x80:
+        n = largo & 0x7F
+        largo = int.from_bytes(der[pos:pos + n], "big")
+        pos += n
+    if pos + largo > len(der):
+        raise ValueError("DER truncado")
+    return etiqueta, pos, pos + largo
+
+def _hijos_der(der: bytes, ini: int, fin: int):
+    while ini < fin:
+        etiqueta, a, b = _leer_tlv(der, ini)
+        yield etiqueta, a, b
+        ini = b
+
+def _oid_der(datos: bytes) -> str:
+    partes, valor = [], 0
+    for byte in datos:
+        valor = (valor << 7) | (byte & 0x7F)
+        if not byte & 0x80:
+            partes.append(valor)
+            valor = 0
+    primero = min(partes[0] // 40, 2)
+    return ".".join(map(str, [primero, partes[0] - 40 * primero] + partes[1:]))
+
+def _nombre_der(der: bytes, ini: int, fin: int) -> Dict[str, str]:
+    """Name de X.509 (SEQUENCE de SET de {OID, valor}) → {nombre del atributo: valor}."""
+    nombre = {}
+    for _, a, b in _hijos_der(der, ini, fin):
+        for _, c, d in _hijos_der(der, a, b):
+            (_, o1, o2), (_, v1, v2) = list(_hijos_der(der, c, d))[:2]
+            clave = OID_ATRIBUTOS_CERT.get(_oid_der(der[o1:o2]))
+            if clave:
+                nombre[clave] = der[v1:v2].decode("utf-8", "replace")
+    return nombre
+
+def _fecha_der(etiqueta: int, datos: bytes) -> float:
+    import calendar
+    texto = datos.decode("ascii").rstrip("Z")
+    if etiqueta == 0x17:  # UTCTime: año con dos cifras
+        texto = ("19" if int(texto[:2]) >= 50 else "20") + texto
+    return calendar.timegm(time.strptime(texto[:14], "%Y%m%d%H%M%S"))
+
+def _decodificar_certificado(der: bytes) -> dict:
+    """Extrae de un certificado X.509 en DER sujeto, emisor, SAN (DNS) y caducidad (epoch).
+
+    Se usa también con certificados no verificados, para los que getpeercert()
+    devuelve un dict vacío. Si el DER no se entiende devuelve {}."""
+    try:
+        _, ini, fin = _leer_tlv(der, 0)
+        _, ini, fin = _leer_tlv(der, ini)                 # tbsCertificate
+        campos = list(_hijos_der(der, ini, fin))
+        if campos[0][0] == 0xA0:                           # [0] versión (opcional)
+            campos = campos[1:]
+        # serie, algoritmo, emisor, validez, sujeto, clave pública, [1], [2], [3] extensiones
+        emisor, validez, sujeto = campos[2], campos[3], campos[4]
+        no_despues = list(_hijos_der(der, validez[1], validez[2]))[1]
+        certificado = {"emisor": _nombre_der(der, emisor[1], emisor[2]),
+                       "sujeto": _nombre_der(der, sujeto[1], sujeto[2]),
+                       "caduca": _fecha_der(no_despues[0], der[no_despues[1]:no_despues[2]]),
+                       "san": []}
+        for etiqueta, a, b in campos[6:]:
+            if etiqueta != 0xA3:
+                continue
+            _, a, b = _leer_tlv(der, a)                    # SEQUENCE de extensiones
+            for _, c, d in _hijos_der(der, a, b):
+                partes = list(_hijos_der(der, c, d))
+                if _oid_der(der[partes[0][1]:partes[0][2]]) != OID_SAN:
+                    continue
+                _, v1, v2 = partes[-1]                     # OCTET STRING con el valor
+                _, v1, v2 = _leer_tlv(der, v1)
+                certificado["san"] = [der[x:y].decode("ascii", "replace")
+                                      for t, x, y in _hijos_der(der, v1, v2) if t == 0x82]  # dNSName
+        return certificado
+    except (IndexError, ValueError, UnicodeDecodeError):
+        return {}
+
+def _sonda_tls(host: str, ip: str, puerto: int, timeout: float) -> dict:
+    import hashlib
+    import ssl
+    literal = ResolvedorDNS.literal(host)
+    resultado = {"puerto": puerto, "verificado": True}
+
+    def negociar(contexto):
+        with _conectar(ip, puerto, timeout) as sock:
+            with contexto.wrap_socket(sock, server_hostname=None if literal else host) as tls:
+                return tls.version(), tls.cipher(), tls.getpeercert(True)
+
+    contexto = ssl.create_default_context()
+    if literal:
+        contexto.check_hostname = False  # una IP no se puede comprobar contra el nombre del certificado
+        resultado["nombre_comprobado"] = False
+    try:
+        try:
+            version, cifrado, der = negociar(contexto)
+        except ssl.SSLCertVerificationError as e:
+            resultado["verificado"] = False
+            resultado["error_verificacion"] = e.verify_message or str(e)
+            contexto = ssl.create_default_context()
+            contexto.check_hostname = False
+            contexto.verify_mode = ssl.CERT_NONE
+            version, cifrado, der = negociar(contexto)
+    except (OSError, ssl.SSLError) as e:
+        return {"puerto": puerto, "error": str(e) or type(e).__name__}
+
+    # El mismo decodificador para certificados verificados y no verificados
+    certificado = _decodificar_certificado(der) if der else {}
+    emisor = certificado.get("emisor", {})
+    resultado.update({"version": version, "cifrado": cifrado[0], "bits": cifrado[2],
+                      "sujeto": certificado.get("sujeto", {}).get("commonName"),
+                      "emisor": emisor.get("organizationName") or emisor.get("commonName"),
+                      "san": certificado.get("san", []),
+                      "sha256": hashlib.sha256(der).hexdigest() if der else None})
+    if certificado.get("caduca"):
+        caduca = certificado["caduca"]
+        resultado["caduca"] = time.strftime("%Y-%m-%d", time.gmtime(caduca))
+        resultado["dias_restantes"] = int((caduca - time.time()) // 86400)
+    return resultado
+
+def _sonda_puertos(ip: str, puertos: List[int], timeout: float) -> dict:
+    import asyncio
+    try:
+        abiertos = asyncio.run(escanear_puertos([ip], puertos, min(len(puertos), 100), timeout))
+    except OSError as e:
+        return {"error": str(e)}
+    return {"probados": len(puertos), "abiertos": abiertos.get(ip, [])}
+
+def _hallazgos(informe: dict) -> List[str]:
+    hallazgos = []
+    http_planos = [h for h in informe.get("http", []) if h["esquema"] == "http" and "estado" in h]
+    https_ok = any(h["esquema"] == "https" and "estado" in h for h in informe.get("http", []))
+    for h in http_planos:
+        destino = h["cabeceras"].get("location", "")
+        if not (300 <= h["estado"] < 400 and destino.startswith("https://")):
+            hallazgos.append(f"HTTP en el puerto {h['puerto']} no redirige a HTTPS"
+                             if https_ok else f"solo HTTP sin cifrar (puerto {h['puerto']})")
+    for h in informe.get("http", []):
+        if "estado" not in h:
+            continue
+        if h["faltan"] and not 300 <= h["estado"] < 400:  # en una redirección no importan
+            hallazgos.append(f"{h['esquema'].upper()} {h['puerto']}: faltan cabeceras {', '.join(h['faltan'])}")
+        servidor = h["cabeceras"].get("server", "")
+        if any(ch.isdigit() for ch in servidor):
+            hallazgos.append(f"la cabecera Server revela la versión: {servidor}")
+    tls = informe.get("tls")
+    if tls and "error" not in tls:
+        if not tls["verificado"]:
+            hallazgos.append(f"certificado no válido: {tls['error_verificacion']}")
+        if tls.get("dias_restantes") is not None and tls["dias_restantes"] < ANALISIS_DIAS_AVISO_CERT:
+            hallazgos.append(f"el certificado caduca en {tls['dias_restantes']} días")
+        if tls["version"] in ("SSLv3", "TLSv1", "TLSv1.1"):
+            hallazgos.append(f"protocolo obsoleto negociado: {tls['version']}")
+        if tls["bits"] and tls["bits"] < 128:
+            hallazgos.append(f"cifrado débil: {tls['cifrado']} ({tls['bits']} bits)")
+    for puerto in informe.get("puertos", {}).get("abiertos", []):
+        if puerto in PUERTOS_DELICADOS:
+            hallazgos.append(f"servicio expuesto: {PUERTOS_DELICADOS[puerto]} (puerto {puerto})")
+    return hallazgos
+
+def _sondas_fallidas(informe: dict) -> List[str]:
+    """Sondas que no dieron resultado: sin ellas la ausencia de hallazgos no prueba nada."""
+    fallidas = []
+    if "error" in informe.get("tcp", {}):
+        fallidas.append(f"TCP {informe['tcp']['puerto']}")
+    fallidas += [f"{h['esquema'].upper()} {h['puerto']}" for h in informe.get("http", []) if "error" in h]
+    if "error" in informe.get("tls", {}):
+        fallidas.append(f"TLS {informe['tls']['puerto']}")
+    if "error" in informe.get("puertos", {}):
+        fallidas.append("puertos")
+    return fallidas
+
+def analizar_objetivos(textos: List[str], hilos: int = ANALISIS_HILOS, timeout: float = ANALISIS_TIMEOUT,
+                       puertos: Optional[List[int]] = None, al_terminar=None) -> List[dict]:
+    """Analiza varios objetivos: resuelve todos a la vez y reparte sus sondas en un pool acotado.
+
+    `al_terminar(informe)` se llama en cuanto todas las sondas de un objetivo acaban."""
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    puertos = _parsear_puertos(ANALISIS_PUERTOS) if puertos is None else puertos
+    informes, destinos = [], []
+    for texto in textos:
+        try:
+            destinos.append(parsear_objetivo(texto))
+            informes.append({"objetivo": texto.strip(), "host": destinos[-1]["host"]})
+        except ValueError as e:
+            informes.append({"objetivo": texto, "error": str(e)})
+            destinos.append(None)
+
+    # Etapa 1: resolución de todos los nombres en paralelo (caché DNS compartida)
+    hosts = list(dict.fromkeys(d["host"] for d in destinos if d))
+    direcciones = {h: (ips, error) for h, ips, error, _, _ in
+                   obtener_resolvedor().resolver_lote(hosts, timeout=timeout, concurrencia=hilos)} if hosts else {}
+
+    # Etapa 2: todas las sondas de todos los objetivos en un único pool
+    pendientes = {}
+    inicio = {}
+    with ThreadPoolExecutor(max_workers=hilos, thread_name_prefix="vso-analisis") as pool:
+        tareas = {}
+        for informe, destino in zip(informes, destinos):
+            if destino is None:
+                continue
+            ips, error = direcciones[destino["host"]]
+            if error:
+                informe["error"] = f"no se pudo resolver: {error}"
+                continue
+            informe["direcciones"] = ips
+            ip = ips[0]
+            servicios = _servicios_web(destino)
+            sondas = [("tcp", functools.partial(_sonda_tcp, ip, servicios[-1][1], timeout))]
+            sondas += [("http", functools.partial(_sonda_http, destino, ip, esquema, puerto, timeout))
+                       for esquema, puerto in servicios]
+            sondas += [("tls", functools.partial(_sonda_tls, destino["host"], ip, puerto, timeout))
+                       for esquema, puerto in servicios if esquema == "https"]
+            if puertos:
+                sondas.append(("puertos", functools.partial(_sonda_puertos, ip, puertos, timeout)))
+            informe["http"] = []
+            pendientes[id(informe)] = len(sondas)
+            inicio[id(informe)] = time.perf_counter()
+            for clave, sonda in sondas:
+                tareas[pool.submit(sonda)] = (informe, clave)
+        for informe in informes:
+            if id(informe) not in pendientes and al_terminar:
+                al_terminar(informe)  # no resolvió o no se pudo interpretar
+        for futuro in as_completed(tareas):
+            informe, clave = tareas[futuro]
+            try:
+                resultado = futuro.result()
+            except Exception as e:
+                resultado = {"error": f"{type(e).__name__}: {e}"}
+            if clave == "http":
+                informe["http"].append(resultado)
+            else:
+                informe[clave] = resultado
+            pendientes[id(informe)] -= 1
+            if not pendientes[id(informe)]:
+                informe["http"].sort(key=lambda h: (h["esquema"], h["puerto"]))
+                informe["hallazgos"] = _hallazgos(informe)
+                informe["sondas_fallidas"] = _sondas_fallidas(informe)
+                informe["concluyente"] = not informe["sondas_fallidas"]
+                informe["duracion_s"] = round(time.perf_counter() - inicio[id(informe)], 3)
+                if al_terminar:
+                    al_terminar(informe)
+    return informes
+
+def _imprimir_informe(informe: dict):
+    cian, verde, amarillo, gris, reset = (COLORES["cian"], COLORES["verde"], COLORES["amarillo"],
+                                          COLORES["gris"], COLORES["reset"])
+    cabecera = informe["objetivo"]
+    if informe.get("direcciones"):
+        cabecera += f" ({', '.join(informe['direcciones'])})"
+    print(f"\n{cian}=== {cabecera} ==={reset}")
+    if "error" in informe:
+        imprimir_error(informe["error"])
+        return
+    tcp = informe.get("tcp", {})
+    if "error" in tcp:
+        print(f" TCP {tcp['puerto']}: {COLORES['rojo']}{tcp['error']}{reset}")
+    elif tcp:
+        print(f" TCP {tcp['puerto']}: rtt mín {tcp['min_ms']} ms, media {tcp['media_ms']} ms")
+    for h in informe.get("http", []):
+        if "error" in h:
+            print(f" {h['esquema'].upper()} {h['puerto']}: {COLORES['rojo']}{h['error']}{reset}")
+            continue
+        extra = f" → {h['cabeceras']['location']}" if "location" in h["cabeceras"] else ""
+        servidor = f" {gris}[{h['cabeceras']['server']}]{reset}" if "server" in h["cabeceras"] else ""
+        print(f" {h['esquema'].upper()} {h['puerto']}: {h['estado']} {h['motivo']}{extra}{servidor} "
+              f"{gris}({h['ms']} ms){reset}")
+    tls = informe.get("tls")
+    if tls and "error" in tls:
+        print(f" TLS: {COLORES['rojo']}{tls['error']}{reset}")
+    elif tls:
+        estado = f"{verde}verificado{reset}" if tls["verificado"] else f"{COLORES['rojo']}no verificado{reset}"
+        caducidad = f", caduca {tls['caduca']} ({tls['dias_restantes']} días)" if "caduca" in tls else ""
+        print(f" TLS: {tls['version']} {tls['cifrado']} ({tls['bits']} bits), "
+              f"CN={tls['sujeto']}, emisor {tls['emisor']}{caducidad}, {estado}")
+    puertos = informe.get("puertos")
+    if puertos and "error" not in puertos:
+        abiertos = ", ".join(map(str, puertos["abiertos"])) or "ninguno"
+        print(f" Puertos abiertos ({puertos['probados']} probados): {abiertos}")
+    if informe.get("hallazgos"):
+        print(f" {amarillo}Hallazgos:{reset}")
+        for hallazgo in informe["hallazgos"]:
+            print(f"   {amarillo}• {hallazgo}{reset}")
+    if informe.get("sondas_fallidas"):
+        print(f" {COLORES['rojo']}No concluyente: fallaron las sondas {', '.join(informe['sondas_fallidas'])}{reset}")
+    elif not informe.get("hallazgos"):
+        print(f" {verde}Sin hallazgos.{reset}")
+    print(f" {gris}({informe['duracion_s']} s){reset}")
+
+def cmd_analisis_seguridad(args):
+    """Analiza aspectos básicos de seguridad de uno o varios hosts/URL"""
+    uso = ("Uso: analisis-seguridad <host|URL>... [-f lista] [-j hilos] [-t timeout] "
+           "[-p puertos|-p no] [-o informe.json]")
+    textos = []
+    hilos, timeout = ANALISIS_HILOS, ANALISIS_TIMEOUT
+    puertos = None
+    salida = None
+    try:
+        i = 0
+        while i < len(args):
+            a = args[i]
+            if a in ("-f", "-j", "-t", "-p", "-o"):
+                valor = args[i + 1]
+                i += 1
+                if a == "-f":
+                    textos += _leer_dominios(valor)
+                elif a == "-j":
+                    hilos = int(valor)
+                elif a == "-t":
+                    timeout = float(valor)
+                elif a == "-p":
+                    puertos = valor
+                else:
+                    salida = valor
+            else:
+                textos.append(a)
+            i += 1
+    except (IndexError, ValueError):
+        imprimir_error(uso)
+        return
+    except OSError as e:
+        imprimir_error(f"No se pudo leer la lista de objetivos: {e}")
+        return
+    if puertos is not None:
+        # Aparte: el error de una lista de puertos se explica mejor que uno de int()/float()
+        try:
+            puertos = [] if puertos == "no" else _parsear_puertos(puertos)
+        except ValueError as e:
+            imprimir_error(f"Error en los puertos: {e}")
+            return
+    if not textos or hilos < 1 or timeout <= 0:
+        imprimir_error(uso)
+        return
+
+    descripcion = textos[0] if len(textos) == 1 else f"{len(textos)} objetivos"
+    print(f"{COLORES['amarillo']}🔍 Analizando seguridad básica de {descripcion}...{COLORES['reset']}")
+    inicio = time.perf_counter()
+    try:
+        informes = analizar_objetivos(textos, hilos, timeout, puertos, _imprimir_informe)
+    except KeyboardInterrupt:
+        print(f"\n{COLORES['amarillo']}Análisis interrumpido.{COLORES['reset']}")
+        return
+    duracion = time.perf_counter() - inicio
+    if salida:
+        import json
+        try:
+            with open(os.path.expanduser(salida), "w", encoding="utf-8") as f:
+                json.dump({"version": 1, "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                           "duracion_s": round(duracion, 3), "objetivos": informes}, f, indent=2, ensure_ascii=False)
+        except OSError as e:
+            imprimir_error(f"No se pudo escribir {salida}: {e}")
+            return
+        imprimir_exito(f"Informe guardado en {salida}")
+    hallazgos = sum(len(inf.get("hallazgos", ())) for inf in informes)
+    dudosos = sum(1 for inf in informes if "error" in inf or not inf.get("concluyente", True))
+    extra = f", {dudosos} no concluyentes" if dudosos else ""
+    print(f"\n{COLORES['gris']}{len(informes)} objetivos, {hallazgos} hallazgos{extra} en {duracion:.2f} s{COLORES['reset']}")
+
+# =========================
+# Motor de búsqueda (grep)
+# =========================
+GREP_BYTES_BINARIO = 8192           # bytes inspeccionados para detectar binarios
+GREP_MIN_BYTES_PARALELO = 8 << 20   # por debajo, buscar en el propio proceso
+GREP_CHUNKSIZE = 16
+
+@functools.lru_cache(maxsize=64)
+def _compilar_patron(patron: str, regex: bool, ignorar_mayus: bool):
+    """Compila el patrón a una regex de bytes (las coincidencias se buscan sin decodificar)."""
+    flags = re.MULTILINE
+    if regex:
+        fuente = patron.encode("utf-8")
+        if ignorar_mayus:
+            flags |= re.IGNORECASE
+    elif ignorar_mayus and not patron.isascii():
+        # IGNORECASE sobre bytes solo cubre ASCII: alternar las dos grafías UTF-8
+        partes = []
+        for ch in patron:
+            variantes = {ch.lower(), ch.upper()}
+            if len(variantes) == 1:
+                partes.append(re.escape(ch.encode("utf-8")))
+            else:
+                partes.append(b"(?:" + b"|".join(re.escape(v.encode("utf-8")) for v in sorted(variantes)) + b")")
+        fuente = b"".join(partes)
+        flags |= re.IGNORECASE
+    else:
+        fuente = re.escape(patron.encode("utf-8"))
+        if ignorar_mayus:
+            flags |= re.IGNORECASE
+    return re.compile(fuente, flags)
+
+def _buscar_en_buffer(buf, rx) -> List:
+    """Busca en un buffer (mmap o bytes) y decodifica solo las líneas que coinciden."""
+    resultados = []
+    tam = len(buf)
+    n_linea = 1
+    contado = 0
+    pos = 0
+    while pos < tam:
+        m = rx.search(buf, pos)
+        if not m or (m.start() == tam and buf[tam - 1:tam] == b"\n"):
+            # Tras el último salto de línea no hay otra línea (patrones como '^' o '$')
+            break
+        ini = buf.rfind(b"\n", 0, m.start()) + 1
+        fin = buf.find(b"\n", m.start())
+        if fin < 0:
+            fin = tam
+        linea = buf[ini:fin]
+        if m.end() > fin and not rx.search(linea):
+            # La coincidencia cruzaba un salto de línea: no cuenta
+            pos = fin + 1
+            continue
+        n_linea += buf[contado:ini].count(b"\n")
+        contado = ini
+        resultados.append((n_linea, linea.rstrip(b"\r").decode("utf-8", "replace")))
+        pos = fin + 1
+    return resultados
+
+def _buscar_en_archivo(ruta: str, patron: str, regex: bool, ignorar_mayus: bool):
+    """Devuelve (ruta, es_binario, coincidencias, error). Se ejecuta en los procesos del pool."""
+    import mmap
+    rx = _compilar_patron(patron, regex, ignorar_mayus)
+    try:
+        with open(ruta, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                # Vacío o pseudoarchivo (/proc): no se puede mapear
+                buf = f.read()
+                binario = b"\0" in buf[:GREP_BYTES_BINARIO]
+                coincidencias = _buscar_en_buffer(buf, rx)
+            else:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    binario = mm.find(b"\0", 0, GREP_BYTES_BINARIO) != -1
+                    if binario:
+                        coincidencias = [(0, "")] if rx.search(mm) else []
+                    else:
+                        coincidencias = _buscar_en_buffer(mm, rx)
+    except (OSError, ValueError) as e:
+        return ruta, False, [], str(e)
+    return ruta, binario, coincidencias, None
+
+def _recorrer_archivos(rutas: List[str], recursivo: bool):
+    """Genera (ruta, tamaño) de los archivos a buscar, en orden estable."""
+    for ruta in rutas:
+        if not os.path.isdir(ruta):
+            try:
+                yield ruta, os.path.getsize(ruta)
+            except OSError:
+                yield ruta, 0
+            continue
+        if not recursivo:
+            imprimir_error(f"{ruta} es un directorio (usa grep -r)")
+            continue
+        pila = [ruta]
+        while pila:
+            actual = pila.pop()
+            try:
+                with os.scandir(actual) as it:
+                    entradas = sorted(it, key=lambda e: e.name)
+            except OSError as e:
+                imprimir_error(f"No se puede leer {actual}: {e}")
+                continue
+            subdirs = []
+            for e in entradas:
+                try:
+                    if e.is_dir(follow_symlinks=False):
+                        subdirs.append(e.path)
+                    elif e.is_file():
+                        yield e.path, e.stat().st_size
+                except OSError:
+                    continue
+            pila.extend(reversed(subdirs))
+
+def buscar_en_archivos(patron: str, rutas: List[str], regex: bool = False, ignorar_mayus: bool = True,
+                       recursivo: bool = False, procesos: Optional[int] = None):
+    """Genera resultados por archivo en orden; reparte el trabajo en un pool de procesos si compensa."""
+    archivos = list(_recorrer_archivos(rutas, recursivo))
+    buscar = functools.partial(_buscar_en_archivo, patron=patron, regex=regex, ignorar_mayus=ignorar_mayus)
+    total = sum(tam for _, tam in archivos)
+    nombres = [r for r, _ in archivos]
+    if procesos == 1 or len(archivos) < 2 or total < GREP_MIN_BYTES_PARALELO:
+        for ruta in nombres:
+            yield buscar(ruta)
+        return
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=procesos) as pool:
+        # map conserva el orden y entrega cada resultado en cuanto está listo
+        yield from pool.map(buscar, nombres, chunksize=GREP_CHUNKSIZE)
+
+GREP_USO = "Uso: grep [-E] [--mayus] [-r] [-l] [-c] [-j N] <patrón> <archivo|dir>..."
+
+def _parsear_grep(args):
+    """Devuelve (regex, ignorar_mayus, recursivo, solo_nombres, contar, procesos, posicionales)."""
+    regex = False
+    ignorar_mayus = True
+    recursivo = solo_nombres = contar = False
+    procesos = None
+    posicionales = []
+    i = 0
+    try:
+        while i < len(args):
+            a = args[i]
+            if a == "--":
+                posicionales.extend(args[i + 1:])
+                break
+            if a in ("--mayus", "--no-ignore-case") and not posicionales:
+                ignorar_mayus = False
+            elif a.startswith("-") and len(a) > 1 and not posicionales:
+                for letra in a[1:]:
+                    if letra == "E":
+                        regex = True
+                    elif letra == "F":
+                        regex = False
+                    elif letra == "i":
+                        ignorar_mayus = True
+                    elif letra == "r":
+                        recursivo = True
+                    elif letra == "l":
+                        solo_nombres = True
+                    elif letra == "c":
+                        contar = True
+                    elif letra == "j":
+                        i += 1
+                        procesos = int(args[i])
+                    else:
+                        raise ValueError(letra)
+            else:
+                posicionales.append(a)
+            i += 1
+    except IndexError:
+        raise ValueError("falta el valor de -j") from None
+    return regex, ignorar_mayus, recursivo, solo_nombres, contar, procesos, posicionales
+
+def cmd_grep(args):
+    try:
+        regex, ignorar_mayus, recursivo, solo_nombres, contar, procesos, posicionales = _parsear_grep(args)
+    except ValueError:
+        imprimir_error(GREP_USO)
+        return
+    if not posicionales or (len(posicionales) < 2 and not recursivo):
+        imprimir_error(GREP_USO)
+        return
+
+    patron, rutas = posicionales[0], [os.path.expanduser(r) for r in posicionales[1:]] or ["."]
+    try:
+        _compilar_patron(patron, regex, ignorar_mayus)
+    except re.error as e:
+        imprimir_error(f"Patrón inválido: {e}")
+        return
+
+    con_nombre = recursivo or len(rutas) > 1
+    verde, cian, reset = COLORES["verde"], COLORES["cian"], COLORES["reset"]
+    try:
+        for ruta, binario, coincidencias, error in buscar_en_archivos(
+                patron, rutas, regex, ignorar_mayus, recursivo, procesos):
+            if error:
+                imprimir_error(f"Error en grep: {ruta}: {error}")
+                continue
+            if not coincidencias:
+                continue
+            if solo_nombres:
+                salida = [f"{cian}{ruta}{reset}\n"]
+            elif contar:
+                salida = [f"{cian}{ruta}{reset}:{len(coincidencias)}\n" if con_nombre else f"{len(coincidencias)}\n"]
+            elif binario:
+                salida = [f"{COLORES['gris']}Coincidencia en archivo binario {ruta}{reset}\n"]
+            else:
+                prefijo = f"{cian}{ruta}{reset}:" if con_nombre else ""
+                salida = [f"{prefijo}{verde}{n}:{reset} {linea}\n" for n, linea in coincidencias]
+            sys.stdout.write("".join(salida))
+            sys.stdout.flush()
+    except KeyboardInterrupt:
+        print(f"\n{COLORES['amarillo']}Búsqueda interrumpida.{reset}")
+    except Exception as e:
+        imprimir_error(f"Error en grep: {e}")
+
+# =========================
+# Índice de nombres de archivo (vso-index / find)
+# =========================
+VSO_DIR = os.path.join(os.path.expanduser("~"), ".vsouver")
+INDICE_DIR = os.path.join(VSO_DIR, "indices")
+INDICE_MAX_EDAD = 600      # segundos durante los que find confía en el índice
+INDICE_VERSION = 1
+FIND_LOTE_SALIDA = 256     # rutas por escritura al imprimir resultados
+_indices_en_memoria: Dict[str, tuple] = {}
+
+def _escanear_dir_indice(ruta: str):
+    try:
+        mtime = os.stat(ruta).st_mtime_ns
+        archivos, subdirs = [], []
+        with os.scandir(ruta) as it:
+            for e in it:
+                try:
+                    es_dir = e.is_dir(follow_symlinks=False)
+                except OSError:
+                    es_dir = False
+                (subdirs if es_dir else archivos).append(e.name)
+    except OSError:
+        return None, []
+    # Los nombres de cada directorio se guardan juntos en un único str compacto
+    return (mtime, "\n".join(archivos), tuple(subdirs)), [os.path.join(ruta, d) for d in subdirs]
+
+def _ruta_indice(raiz: str) -> str:
+    import hashlib
+    clave = hashlib.sha1(raiz.encode("utf-8", "surrogateescape")).hexdigest()[:16]
+    return os.path.join(INDICE_DIR, f"{clave}.idx")
+
+def construir_indice(raiz: str, anterior: Optional[dict] = None) -> dict:
+    """Crea el índice de `raiz`; con `anterior` solo reescanea los directorios cuyo mtime cambió."""
+    previos = anterior["dirs"] if anterior else {}
+
+    def procesar(ruta):
+        previo = previos.get(ruta)
+        if previo is not None:
+            try:
+                mtime = os.stat(ruta).st_mtime_ns
+            except OSError:
+                return None, []
+            if previo[0] == mtime:
+                return previo, [os.path.join(ruta, d) for d in previo[2]]
+        return _escanear_dir_indice(ruta)
+
+    dirs = {}
+    reescaneados = 0
+    for ruta, datos in recorrer_directorios(raiz, procesar):
+        if datos is not None:
+            dirs[ruta] = datos
+            if datos is not previos.get(ruta):
+                reescaneados += 1
+    return {"version": INDICE_VERSION, "raiz": raiz, "actualizado": time.time(),
+            "dirs": dirs, "reescaneados": reescaneados}
+
+def guardar_indice(indice: dict):
+    import pickle
+    import zlib
+    os.makedirs(INDICE_DIR, exist_ok=True)
+    destino = _ruta_indice(indice["raiz"])
+    temporal = f"{destino}.{os.getpid()}.tmp"
+    with open(temporal, "wb") as f:
+        f.write(zlib.compress(pickle.dumps(indice, pickle.HIGHEST_PROTOCOL), 1))
+    os.replace(temporal, destino)
+    _indices_en_memoria[destino] = (os.stat(destino).st_mtime_ns, indice)
+
+def cargar_indice(raiz: str) -> Optional[dict]:
+    import pickle
+    import zlib
+    ruta = _ruta_indice(raiz)
+    try:
+        mtime = os.stat(ruta).st_mtime_ns
+    except OSError:
+        return None
+    en_memoria = _indices_en_memoria.get(ruta)
+    if en_memoria and en_memoria[0] == mtime:
+        return en_memoria[1]
+    try:
+        with open(ruta, "rb") as f:
+            indice = pickle.loads(zlib.decompress(f.read()))
+    except Exception:
+        return None
+    if indice.get("version") != INDICE_VERSION or indice.get("raiz") != raiz:
+        return None
+    _indices_en_memoria[ruta] = (mtime, indice)
+    return indice
+
+def _indice_que_cubre(ruta: str) -> Optional[dict]:
+    """Busca un índice cuya raíz sea `ruta` o uno de sus ancestros."""
+    actual = ruta
+    while True:
+        if os.path.exists(_ruta_indice(actual)):
+            return cargar_indice(actual)
+        padre = os.path.dirname(actual)
+        if padre == actual:
+            return None
+        actual = padre
+
+def _crear_comparador(patron: str, modo: str):
+    """Predicado sobre nombres de archivo: 'sub' (subcadena, sin mayúsculas), 'glob' o 'regex'."""
+    if modo == "glob":
+        import fnmatch
+        return re.compile(fnmatch.translate(patron)).match
+    if modo == "regex":
+        return re.compile(patron).search
+    aguja = patron.lower()
+    return lambda nombre: aguja in nombre.lower()
+
+def consultar_indice(indice: dict, patron: str, modo: str = "sub", bajo: Optional[str] = None):
+    """Genera las rutas absolutas del índice cuyo nombre coincide, opcionalmente bajo un directorio."""
+    coincide = _crear_comparador(patron, modo)
+    aguja = patron.lower() if modo == "sub" else None
+    prefijo = bajo.rstrip(os.sep) + os.sep if bajo else None
+    for ruta, (_, nombres, _) in indice["dirs"].items():
+        if not nombres:
+            continue
+        if prefijo and ruta != bajo and not ruta.startswith(prefijo):
+            continue
+        # Descarte rápido de directorios enteros con una sola búsqueda en C
+        if aguja is not None and aguja not in nombres.lower():
+            continue
+        for nombre in nombres.split("\n"):
+            if coincide(nombre):
+                yield os.path.join(ruta, nombre)
+
+def _contar_archivos_indice(indice: dict) -> int:
+    return sum(n.count("\n") + 1 for _, n, _ in indice["dirs"].values() if n)
+
+def cmd_vso_index(args):
+    """Gestiona el índice de nombres de archivo usado por find"""
+    uso = "Uso: vso-index construir|actualizar|estado|borrar [ruta]"
+    if not args:
+        imprimir_error(uso)
+        return
+    accion = args[0]
+    raiz = os.path.abspath(os.path.expanduser(args[1])) if len(args) > 1 else os.getcwd()
+
+    if accion in ("construir", "actualizar"):
+        if not os.path.isdir(raiz):
+            imprimir_error(f"No es un directorio: {raiz}")
+            return
+        anterior = cargar_indice(raiz) if accion == "actualizar" else None
+        inicio = time.perf_counter()
+        try:
+            indice = construir_indice(raiz, anterior)
+            guardar_indice(indice)
+        except KeyboardInterrupt:
+            print(f"\n{COLORES['amarillo']}Indexación interrumpida.{COLORES['reset']}")
+            return
+        except Exception as e:
+            imprimir_error(f"No se pudo indexar {raiz}: {e}")
+            return
+        imprimir_exito(f"Índice de {raiz}: {len(indice['dirs'])} directorios, "
+                       f"{_contar_archivos_indice(indice)} archivos, {indice['reescaneados']} reescaneados "
+                       f"({time.perf_counter() - inicio:.2f} s)")
+    elif accion == "estado":
+        if not os.path.isdir(INDICE_DIR):
+            print("No hay índices.")
+            return
+        for nombre in sorted(os.listdir(INDICE_DIR)):
+            if not nombre.endswith(".idx"):
+                continue
+            ruta = os.path.join(INDICE_DIR, nombre)
+            try:
+                import pickle
+                import zlib
+                with open(ruta, "rb") as f:
+                    indice = pickle.loads(zlib.decompress(f.read()))
+            except Exception:
+                continue
+            edad = time.time() - indice["actualizado"]
+            color = COLORES["verde"] if edad <= INDICE_MAX_EDAD else COLORES["amarillo"]
+            print(f"{color}{indice['raiz']}{COLORES['reset']}: {len(indice['dirs'])} directorios, "
+                  f"{_contar_archivos_indice(indice)} archivos, {os.path.getsize(ruta) // 1024} KiB, "
+                  f"actualizado hace {edad:.0f} s")
+    elif accion == "borrar":
+        try:
+            os.remove(_ruta_indice(raiz))
+            imprimir_exito(f"Índice de {raiz} borrado")
+        except FileNotFoundError:
+            imprimir_error(f"No hay índice para {raiz}")
+    else:
+        imprimir_error(uso)
+
+FIND_USO = "Uso: find [-g glob | -E regex] [--vivo] <nombre>"
+
+def _parsear_find(args):
+    """Devuelve (nombre, modo, vivo); ValueError si falta el nombre."""
+    modo = "sub"
+    vivo = False
+    posicionales = []
+    for a in args:
+        if a == "-g":
+            modo = "glob"
+        elif a == "-E":
+            modo = "regex"
+        elif a == "--vivo":
+            vivo = True
+        else:
+            posicionales.append(a)
+    if not posicionales:
+        raise ValueError(FIND_USO)
+    return posicionales[0], modo, vivo
+
+def buscar_nombres(nombre: str, modo: str = "sub", vivo: bool = False):
+    """Genera las rutas relativas (./...) cuyo nombre coincide: del índice si está fresco, si no recorriendo."""
+    coincide = _crear_comparador(nombre, modo)
+    cwd = os.getcwd()
+    indice = None if vivo else _indice_que_cubre(cwd)
+    if indice and time.time() - indice["actualizado"] <= INDICE_MAX_EDAD:
+        recorte = len(cwd.rstrip(os.sep))
+        for ruta in consultar_indice(indice, nombre, modo, bajo=cwd):
+            yield "." + ruta[recorte:]
+        return
+    for root, dirs, files in os.walk("."):
+        for f in files:
+            if coincide(f):
+                yield os.path.join(root, f)
+
+def cmd_find(args):
+    try:
+        nombre, modo, vivo = _parsear_find(args)
+        rutas = buscar_nombres(nombre, modo, vivo)
+        cian, reset = COLORES["cian"], COLORES["reset"]
+        salida = []
+        for ruta in rutas:
+            salida.append(f"{cian}{ruta}{reset}\n")
+            if len(salida) >= FIND_LOTE_SALIDA:
+                sys.stdout.write("".join(salida))
+                salida.clear()
+        sys.stdout.write("".join(salida))
+    except re.error as e:
+        imprimir_error(f"Patrón inválido: {e}")
+    except ValueError as e:
+        imprimir_error(str(e))
+
+# =========================
+# Tuberías internas (cmd | cmd > archivo)
+# =========================
+TUBERIA_BUFFER = 1 << 20            # buffer de escritura al redirigir a un archivo
+TUBERIA_INTERVALO_VOLCADO = 0.05    # con salida a terminal, vaciar como mucho cada 50 ms
+_RE_ANSI_BYTES = re.compile(rb"\x1b\[[0-9;?]*[A-Za-z]")
+
+def _lineas_archivo(ruta: str):
+    with open(os.path.expanduser(ruta), "rb") as f:
+        yield from f
+
+def _etapa_cat(args, entrada):
+    if not args:
+        if entrada is None:
+            raise ValueError("Uso: cat <archivo>")
+        return entrada
+
+    def generar():
+        for archivo in args:
+            if archivo == "-" and entrada is not None:
+                yield from entrada
+                continue
+            try:
+                yield from _lineas_archivo(archivo)
+            except OSError as e:
+                imprimir_error(f"No se pudo leer {archivo}: {e}")
+    return generar()
+
+def _etapa_echo(args, _entrada):
+    return iter((" ".join(args).encode("utf-8") + b"\n",))
+
+def _etapa_grep(args, entrada):
+    regex, ignorar_mayus, recursivo, solo_nombres, contar, procesos, posicionales = _parsear_grep(args)
+    if not posicionales:
+        raise ValueError(GREP_USO)
+    patron, rutas = posicionales[0], [os.path.expanduser(r) for r in posicionales[1:]]
+    rx = _compilar_patron(patron, regex, ignorar_mayus)
+
+    if not rutas and not recursivo:
+        if entrada is None:
+            raise ValueError(GREP_USO)
+
+        # filter recorre las líneas en C: sin un frame de Python por línea
+        coincidencias = filter(rx.search, entrada)
+        if contar:
+            return (b"%d\n" % sum(1 for _ in coincidencias) for _ in range(1))
+        if solo_nombres:
+            return (b"(entrada)\n" for _ in itertools.islice(coincidencias, 1))
+        return coincidencias
+
+    con_nombre = recursivo or len(rutas) > 1
+
+    def en_archivos():
+        for ruta, binario, coincidencias, error in buscar_en_archivos(
+                patron, rutas or ["."], regex, ignorar_mayus, recursivo, procesos):
+            if error:
+                imprimir_error(f"Error en grep: {ruta}: {error}")
+                continue
+            if not coincidencias:
+                continue
+            nombre = ruta.encode("utf-8", "surrogateescape")
+            if solo_nombres:
+                yield nombre + b"\n"
+            elif contar:
+                yield (nombre + b":" if con_nombre else b"") + b"%d\n" % len(coincidencias)
+            elif binario:
+                yield b"Coincidencia en archivo binario " + nombre + b"\n"
+            else:
+                prefijo = nombre + b":" if con_nombre else b""
+                for _, linea in coincidencias:
+                    yield prefijo + linea.encode("utf-8") + b"\n"
+    return en_archivos()
+
+def _ultimos_bytes(fuente, n: int):
+    cola = bytearray()
+    for linea in fuente:
+        cola += linea
+        if len(cola) > 2 * n + TAIL_TAM_BLOQUE:
+            del cola[:-n or len(cola)]
+    yield bytes(cola[-n:]) if n else b""
+
+def _etapa_head(args, entrada):
+    uso = "Uso: head [-n N | -c BYTES] <archivo>"
+    try:
+        lineas, num_bytes, _, archivos = _parsear_opciones_lineas(args, False)
+    except (IndexError, ValueError):
+        raise ValueError(uso) from None
+    if archivos:
+        fuente = _lineas_archivo(archivos[0])
+    elif entrada is not None:
+        fuente = entrada
+    else:
+        raise ValueError(uso)
+    if num_bytes is None:
+        # islice deja de pedir líneas al llegar a N: las etapas anteriores no leen más
+        return itertools.islice(fuente, lineas)
+
+    def primeros_bytes():
+        restantes = num_bytes
+        for linea in fuente:
+            if restantes <= 0:
+                break
+            yield linea[:restantes]
+            restantes -= len(linea)
+    return primeros_bytes()
+
+def _etapa_tail(args, entrada):
+    uso = "Uso: tail [-n N | -c BYTES] <archivo>"
+    try:
+        lineas, num_bytes, seguir, archivos = _parsear_opciones_lineas(args, True)
+    except (IndexError, ValueError):
+        raise ValueError(uso) from None
+    if seguir:
+        raise ValueError("tail -f no se puede usar dentro de una tubería")
+    if archivos:
+        def desde_archivo():
+            with open(os.path.expanduser(archivos[0]), "rb") as f:
+                if num_bytes is not None:
+                    f.seek(max(0, f.seek(0, os.SEEK_END) - num_bytes))
+                else:
+                    f.seek(desplazamiento_ultimas_lineas(f, lineas))
+                yield from f
+        return desde_archivo()
+    if entrada is None:
+        raise ValueError(uso)
+    if num_bytes is not None:
+        return _ultimos_bytes(entrada, num_bytes)
+    # deque con maxlen: memoria acotada a N líneas aunque la entrada sea enorme
+    return (linea for linea in collections.deque(entrada, maxlen=lineas))
+
+def _etapa_find(args, _entrada):
+    nombre, modo, vivo = _parsear_find(args)
+    _crear_comparador(nombre, modo)  # valida el patrón antes de arrancar la tubería
+    return (ruta.encode("utf-8", "surrogateescape") + b"\n" for ruta in buscar_nombres(nombre, modo, vivo))
+
+# Comandos internos con versión de flujo: reciben el iterador de líneas (bytes) de la
+# etapa anterior, o None, y devuelven otro iterador.
+ETAPAS_TUBERIA = {
+    "cat": _etapa_cat,
+    "type": _etapa_cat,
+    "echo": _etapa_echo,
+    "grep": _etapa_grep,
+    "head": _etapa_head,
+    "tail": _etapa_tail,
+    "find": _etapa_find,
+}
+
+def _dividir_tuberia(linea: str):
+    """Separa la línea por '|' fuera de comillas y extrae un '> archivo' / '>> archivo' final.
+
+    Devuelve (etapas, redirección) o None si la línea usa algo que solo entiende
+    el shell (||, &&, ;, &, <, 2>, $(...), `...`)."""
+    etapas = []
+    actual = []
+    comilla = None
+    redireccion = None
+    i, n = 0, len(linea)
+    while i < n:
+        c = linea[i]
+        if comilla:
+            actual.append(c)
+            if c == comilla:
+                comilla = None
+            elif c == "\\" and comilla == '"' and i + 1 < n:
+                i += 1
+                actual.append(linea[i])
+        elif c == "\\":
+            actual.append(linea[i:i + 2])
+            i += 1
+        elif c in "'\"":
+            comilla = c
+            actual.append(c)
+        elif c == "|":
+            if linea[i + 1:i + 2] == "|":
+                return None
+            etapas.append("".join(actual).strip())
+            actual = []
+        elif c == ">":
+            previo = "".join(actual)[-1:]
+            if previo.isdigit() or previo == "&":
+                return None
+            modo = "a" if linea[i + 1:i + 2] == ">" else "w"
+            resto = linea[i + (2 if modo == "a" else 1):]
+            if resto[:1] in ("&", "|", ">"):
+                return None
+            try:
+                destino = shlex.split(resto)
+            except ValueError:
+                return None
+            if len(destino) != 1 or any(ch in resto for ch in "|<>&;`"):
+                return None
+            redireccion = (modo, destino[0])
+            break
+        elif c in ";&<`" or (c == "$" and linea[i + 1:i + 2] == "("):
+            return None
+        else:
+            actual.append(c)
+        i += 1
+    if comilla:
+        return None
+    etapas.append("".join(actual).strip())
+    if not all(etapas):
+        return None
+    return etapas, redireccion
+
+@functools.lru_cache(maxsize=256)
+def _analizar_tuberia(linea: str, _version: int) -> Optional[tuple]:
+    division = _dividir_tuberia(linea)
+    if division is None:
+        return None
+    textos, redireccion = division
+    if len(textos) == 1 and redireccion is None:
+        return None
+    etapas = []
+    for texto in textos:
+        palabra = texto.split(None, 1)[0]
+        if palabra not in registro.comandos:
+            etapas.append(("externo", texto, None))
+            continue
+        try:
+            tokens = tuple(shlex.split(texto))
+        except ValueError:
+            return None
+        flujo = palabra in ETAPAS_TUBERIA and registro.origen.get(palabra) == "interno"
+        etapas.append(("flujo" if flujo else "interno", texto, tokens))
+    if all(tipo == "externo" for tipo, _, _ in etapas):
+        return None  # sin comandos internos: mejor que lo resuelva el shell entero
+    return tuple(etapas), redireccion
+
+def analizar_tuberia(linea: str) -> Optional[tuple]:
+    """(etapas, redirección) si la línea es una tubería con algún comando interno; si no, None.
+
+    Cada etapa es (tipo, texto, tokens) con tipo "flujo" (interno con versión de
+    flujo), "interno" (se captura su salida) o "externo"."""
+    if "|" not in linea and ">" not in linea:
+        return None
+    return _analizar_tuberia(linea, registro.version)
+
+def _cerrar_flujo(flujo):
+    cerrar = getattr(flujo, "close", None)
+    if cerrar is not None:
+        cerrar()
+
+def _encadenar(flujo, anterior):
+    """Itera `flujo` y, al agotarse o cerrarse, cierra también la etapa anterior."""
+    try:
+        yield from flujo
+    finally:
+        _cerrar_flujo(flujo)
+        _cerrar_flujo(anterior)
+
+class Tuberia:
+    """Ejecuta una tubería ya analizada.
+
+    Las etapas internas se encadenan como generadores dentro del proceso, así que
+    `head` deja de tirar de las anteriores en cuanto tiene sus líneas. Las etapas
+    externas consecutivas van en un único `sh -c` (el shell las une con pipes del
+    sistema) y se alimentan desde un hilo si tienen una etapa interna delante."""
+
+    def __init__(self, etapas: tuple, redireccion: Optional[tuple]):
+        self.etapas = etapas
+        self.redireccion = redireccion
+        self.procesos = []
+        self.hilos: List[threading.Thread] = []
+
+    def _externo(self, comando: str, entrada, destino):
+        import subprocess
+        prefijo = getattr(_contexto_trabajo, "prefijo", None)
+        proceso = subprocess.Popen(
+            comando, shell=True,
+            stdin=subprocess.PIPE if entrada is not None else None,
+            stdout=destino,
+            # En un trabajo paralelo los errores se reenvían con su prefijo
+            stderr=subprocess.PIPE if prefijo is not None else None,
+        )
+        self.procesos.append(proceso)
+        if entrada is not None:
+            hilo = threading.Thread(target=self._alimentar, args=(proceso.stdin, entrada), daemon=True)
+            hilo.start()
+            self.hilos.append(hilo)
+        if proceso.stderr is not None:
+            hilo = threading.Thread(target=self._reenviar_errores, args=(proceso.stderr, prefijo), daemon=True)
+            hilo.start()
+            self.hilos.append(hilo)
+        if proceso.stdout is None:
+            return None
+
+        def leer():
+            try:
+                yield from proceso.stdout
+            finally:
+                proceso.stdout.close()  # si la tubería para antes, el proceso recibe SIGPIPE
+        return leer()
+
+    @staticmethod
+    def _reenviar_errores(tubo, prefijo: str):
+        _contexto_trabajo.prefijo = prefijo
+        try:
+            for linea in tubo:
+                sys.stderr.write(linea.decode("utf-8", "replace"))
+        finally:
+            tubo.close()
+            if isinstance(sys.stderr, _SalidaConPrefijo):
+                sys.stderr.terminar_hilo(prefijo)
+            _contexto_trabajo.prefijo = None
+
+    @staticmethod
+    def _alimentar(tubo, entrada):
+        try:
+            for linea in entrada:
+                tubo.write(linea)
+        except (BrokenPipeError, OSError):
+            pass  # el proceso externo dejó de leer
+        finally:
+            _cerrar_flujo(entrada)
+            try:
+                tubo.close()
+            except OSError:
+                pass
+
+    @staticmethod
+    def _capturar(nombre: str, args) -> list:
+        """Ejecuta un comando interno sin versión de flujo y devuelve su salida como líneas sin colores."""
+        import io
+        datos = io.BytesIO()
+        texto = io.TextIOWrapper(datos, encoding="utf-8", errors="replace", write_through=True)
+        if isinstance(sys.stdout, _SalidaConPrefijo):
+            # Bloque paralelo: sys.stdout es compartido, solo se desvía este hilo
+            desvio = sys.stdout.capturar(texto)
+        else:
+            desvio = contextlib.redirect_stdout(texto)
+        with desvio:
+            registro.invocar(nombre, args)
+        return _RE_ANSI_BYTES.sub(b"", datos.getvalue()).splitlines(keepends=True)
+
+    def _volcar_terminal(self, flujo):
+        if getattr(_contexto_trabajo, "prefijo", None) is not None or not hasattr(sys.stdout, "buffer"):
+            for linea in flujo:  # trabajo de un bloque paralelo: respetar su prefijo
+                sys.stdout.write(linea.decode("utf-8", "replace"))
+            return
+        sys.stdout.flush()
+        destino = sys.stdout.buffer
+        escribir = destino.write
+        reloj = time.monotonic
+        limite = reloj() + TUBERIA_INTERVALO_VOLCADO
+        for linea in flujo:
+            escribir(linea)
+            if reloj() >= limite:
+                destino.flush()
+                limite = reloj() + TUBERIA_INTERVALO_VOLCADO
+        destino.flush()
+
+    def ejecutar(self) -> int:
+        """Devuelve el estado de la última etapa (0 si fue bien)."""
+        import subprocess
+        antes = errores_impresos()
+        archivo = None
+        flujo = None
+        estado_final = None
+        try:
+            if self.redireccion:
+                modo, ruta = self.redireccion
+                archivo = open(os.path.expanduser(ruta), modo + "b", buffering=TUBERIA_BUFFER)
+            total = len(self.etapas)
+            i = 0
+            while i < total:
+                tipo, texto, tokens = self.etapas[i]
+                if tipo == "externo":
+                    j = i
+                    while j < total and self.etapas[j][0] == "externo":
+                        j += 1
+                    ultima = j == total
+                    # la última etapa escribe directamente en el archivo o en la terminal,
+                    # salvo en un trabajo paralelo, cuya salida debe pasar por su prefijo
+                    en_trabajo = getattr(_contexto_trabajo, "prefijo", None) is not None
+                    destino = archivo if ultima and (archivo is not None or not en_trabajo) else subprocess.PIPE
+                    grupo = " | ".join(t for _, t, _ in self.etapas[i:j])
+                    flujo = self._externo(grupo, flujo, destino)
+                    if ultima:
+                        estado_final = self.procesos[-1]
+                    i = j
+                    continue
+                nombre, args = tokens[0], list(tokens[1:])
+                if tipo == "flujo":
+                    flujo = _encadenar(ETAPAS_TUBERIA[nombre](args, flujo), flujo)
+                else:
+                    _cerrar_flujo(flujo)  # los comandos sin versión de flujo no leen la entrada
+                    if i == total - 1 and archivo is None:
+                        registro.invocar(nombre, args)
+                        flujo = None
+                    else:
+                        flujo = iter(self._capturar(nombre, args))
+                i += 1
+            if flujo is not None:
+                if archivo is not None:
+                    archivo.writelines(flujo)
+                else:
+                    self._volcar_terminal(flujo)
+        except re.error as e:
+            imprimir_error(f"Patrón inválido: {e}")
+        except (ValueError, IndexError) as e:
+            imprimir_error(str(e) or "Argumentos inválidos en la tubería")
+        except OSError as e:
+            imprimir_error(f"Error en la tubería: {e}")
+        finally:
+            _cerrar_flujo(flujo)
+            for proceso in self.procesos:
+                proceso.wait()
+            for hilo in self.hilos:
+                hilo.join()
+            if archivo is not None:
+                try:
+                    archivo.close()
+                except OSError as e:
+                    imprimir_error(f"No se pudo escribir {self.redireccion[1]}: {e}")
+        if estado_final is not None and estado_final.returncode:
+            return estado_final.returncode
+        return 1 if errores_impresos() != antes else 0
+
+def ejecutar_tuberia(linea: str) -> Optional[int]:
+    """Ejecuta la línea como tubería interna; None si no lo es (la resuelve el llamador)."""
+    analisis = analizar_tuberia(linea)
+    if analisis is None:
+        return None
+    with instrumentacion.medir("(tubería)"):
+        return Tuberia(*analisis).ejecutar()
+
+# =========================
+# Motor de scripts (.vso / .auto)
+# =========================
+SCRIPTS_DIR = os.path.join(VSO_DIR, "scripts")
+SCRIPT_VERSION = 5
+# Líneas externas como máximo por invocación de shell: el lote devuelve el
+# número de fallos como código de salida, que no pasa de 255
+SCRIPT_MAX_LOTE = 255
+SCRIPT_MAX_CACHE = 256  # compilaciones guardadas en SCRIPTS_DIR (se podan las más antiguas)
+# Órdenes que cambian el estado del shell o esperan la terminal: su línea nunca se
+# agrupa, así el resultado no depende de dónde se corten los lotes
+SCRIPT_NO_AGRUPABLES = {"cd", "exit", "exec", "export", "unset", "source", ".", "alias", "unalias",
+                        "set", "shopt", "umask", "ulimit", "trap", "read", "wait", "eval", "declare",
+                        "typeset", "readonly", "local", "function", "shift", "getopts", "hash",
+                        "pushd", "popd"}
+# Dentro de `paralelo { }`: cambian el estado compartido o necesitan la terminal entera
+PARALELO_PROHIBIDOS = {"cd", "paralelo", "clear", "cls", "vso-limpiar", "monitorizar", "vso-python", "fg"}
+_RE_VARIABLE = re.compile(r"\$(?:\{(\w+)\}|(\w+))")
+_RE_PARALELO = re.compile(r"paralelo(?:\s+(\d+))?\s*\{$")
+_RE_TRABAJO = re.compile(r"([A-Za-z_][\w.-]*):\s+(\S.*)$")   # "nombre: comando"
+_RE_ANSI = re.compile(r"\x1b\[[0-9;?]*[A-Za-z]")
+_COLORES_TRABAJOS = ("cian", "verde", "amarillo", "morado", "azul", "rojo")
+
+def expandir_variables(texto: str) -> str:
+    """Sustituye $VAR y ${VAR} definidas con `set`; las desconocidas quedan para el shell."""
+    if "$" not in texto:
+        return texto
+    return _RE_VARIABLE.sub(lambda m: variables_entorno.get(m.group(1) or m.group(2), m.group(0)), texto)
+
+def _firma_comandos() -> str:
+    return "\n".join(sorted(registro.comandos))
+
+def _clasificar_linea(num: int, linea: str) -> tuple:
+    palabra = linea.split(None, 1)[0]
+    if palabra in ("salir", "exit", "quit"):
+        return ("fin", num, linea)
+    if analizar_tuberia(linea) is not None:
+        return ("tuberia", num, linea)
+    if palabra in registro.comandos:
+        try:
+            tokens = tuple(shlex.split(linea)) if "$" not in linea else None
+        except ValueError as e:
+            raise ValueError(f"línea {num}: {e}") from None
+        return ("interno", num, linea, palabra, tokens)
+    agrupable = not (linea.endswith("&") or _modifica_estado_shell(linea) or _es_interactivo(linea))
+    return ("externo", num, linea, agrupable)
+
+def _modifica_estado_shell(linea: str) -> bool:
+    """True si la línea puede dejar estado en el shell (variables, funciones, opciones, cwd...)."""
+    if _RE_FUNCION_SHELL.search(linea):
+        return True
+    try:
+        ordenes = ordenes_shell(linea)
+    except ValueError:
+        return True  # sin poder analizarla, mejor ejecutarla sola
+    return any(orden is None or orden in SCRIPT_NO_AGRUPABLES for orden in ordenes)
+
+def _compilar_paralelo(num: int, cabecera: str, lineas) -> tuple:
+    """Lee las líneas de un bloque `paralelo [N] {` hasta su `}` y las convierte en trabajos."""
+    coincidencia = _RE_PARALELO.match(cabecera)
+    if not coincidencia:
+        raise ValueError(f"línea {num}: se esperaba 'paralelo [N] {{'")
+    limite = int(coincidencia.group(1) or os.cpu_count() or 1)
+    if limite < 1:
+        raise ValueError(f"línea {num}: el grado de paralelismo debe ser al menos 1")
+    trabajos = []
+    for n, linea in lineas:
+        if linea == "}":
+            return ("paralelo", num, cabecera, limite, tuple(trabajos))
+        nombrado = _RE_TRABAJO.match(linea)
+        nombre, comando = nombrado.groups() if nombrado else (None, linea)
+        instruccion = _clasificar_linea(n, comando)
+        palabra = comando.split(None, 1)[0]
+        if instruccion[0] == "fin" or palabra in PARALELO_PROHIBIDOS:
+            raise ValueError(f"línea {n}: '{palabra}' no está permitido dentro de un bloque paralelo")
+        trabajos.append((nombre or f"{palabra}#{len(trabajos) + 1}", instruccion))
+    raise ValueError(f"línea {num}: bloque paralelo sin cerrar")
+
+def compilar_script(texto: str) -> tuple:
+    """Traduce el texto a instrucciones (tipo, línea, texto, ...) con el comando ya clasificado.
+
+    - ("fin", n, texto): salir/exit/quit terminan el script
+    - ("interno", n, texto, comando, tokens|None): tokens precalculados si no hay variables
+    - ("externo", n, texto, agrupable): se ejecuta en el shell
+    - ("tuberia", n, texto): tubería con algún comando interno (ver Tuberia)
+    - ("paralelo", n, texto, limite, ((nombre, instrucción), ...)): bloque concurrente"""
+    instrucciones = []
+    lineas = ((num, linea.strip()) for num, linea in enumerate(texto.splitlines(), 1))
+    lineas = ((num, linea) for num, linea in lineas if linea and not linea.startswith("#"))
+    for num, linea in lineas:
+        if linea.split(None, 1)[0] == "paralelo":
+            instrucciones.append(_compilar_paralelo(num, linea, lineas))
+        elif linea == "}":
+            raise ValueError(f"línea {num}: '}}' sin bloque abierto")
+        else:
+            instrucciones.append(_clasificar_linea(num, linea))
+    return tuple(instrucciones)
+
+def cargar_script(ruta: str) -> tuple:
+    """Devuelve las instrucciones del script, reutilizando la compilación cacheada por hash."""
+    import hashlib
+    import marshal
+    with open(ruta, "rb") as f:
+        datos = f.read()
+    firma = hashlib.sha256(datos)
+    firma.update(_firma_comandos().encode())  # un plugin nuevo cambia la clasificación
+    cache = os.path.join(SCRIPTS_DIR, f"{firma.hexdigest()}.bin")
+    try:
+        with open(cache, "rb") as f:
+            version, instrucciones = marshal.load(f)
+        if version == SCRIPT_VERSION:
+            os.utime(cache)  # la poda conserva las usadas más recientemente
+            return instrucciones
+    except (OSError, EOFError, ValueError, TypeError):
+        pass
+    instrucciones = compilar_script(datos.decode("utf-8"))
+    try:
+        os.makedirs(SCRIPTS_DIR, exist_ok=True)
+        temporal = f"{cache}.{os.getpid()}.tmp"
+        with open(temporal, "wb") as f:
+            marshal.dump((SCRIPT_VERSION, instrucciones), f)
+        os.replace(temporal, cache)
+        _podar_cache_scripts()
+    except OSError:
+        pass  # sin caché: se recompila la próxima vez
+    return instrucciones
+
+def _podar_cache_scripts(maximo: int = SCRIPT_MAX_CACHE):
+    """Borra las compilaciones menos usadas cuando hay más de `maximo`."""
+    entradas = []
+    with os.scandir(SCRIPTS_DIR) as it:
+        for e in it:
+            if e.name.endswith(".bin"):
+                try:
+                    entradas.append((e.stat().st_mtime, e.path))
+                except OSError:
+                    pass
+    if len(entradas) <= maximo:
+        return
+    entradas.sort()
+    for _, ruta in entradas[:len(entradas) - maximo]:
+        try:
+            os.remove(ruta)
+        except OSError:
+            pass
+
+def _eco_linea(linea: str) -> str:
+    return f"{COLORES['morado']}$ {linea}{COLORES['reset']}"
+
+def ejecutar_interno(funcion, *args) -> int:
+    """Llama a un comando interno y deduce su estado (1 si imprimió un error o lanzó una excepción)."""
+    antes = errores_impresos()
+    try:
+        funcion(*args)
+    except (KeyboardInterrupt, SystemExit):
+        raise
+    except Exception as e:
+        imprimir_error(f"Error: {e}")
+        return 1
+    return 1 if errores_impresos() != antes else 0
+
+def _ejecutar_lote(lineas: List[str], salir_en_error: bool, silencioso: bool) -> int:
+    """Ejecuta varias líneas externas en un solo subshell.
+
+    Con salir_en_error devuelve el estado de la primera línea que falle; si no,
+    el número de líneas fallidas."""
+    partes = ["__vso_f=0"]
+    for linea in lineas:
+        if not silencioso:
+            partes.append(f"printf '%s\\n' {shlex.quote(_eco_linea(linea))}")
+        partes.append(f"{{ {linea}\n}} || " + ("exit $?" if salir_en_error else "__vso_f=$((__vso_f + 1))"))
+    partes.append("exit $__vso_f")
+    return ejecutar_en_shell("(\n" + "\n".join(partes) + "\n)")
+
+def _ejecutar_instruccion(instruccion: tuple, linea: str) -> int:
+    if instruccion[0] == "externo":
+        return ejecutar_en_shell(linea)
+    if instruccion[0] == "tuberia":
+        estado = ejecutar_tuberia(linea)
+        return ejecutar_en_shell(linea) if estado is None else estado
+    tokens = instruccion[4]
+    try:
+        args = list(tokens[1:]) if tokens is not None else shlex.split(linea)[1:]
+    except ValueError as e:
+        imprimir_error(f"Línea {instruccion[1]}: {e}")
+        return 1
+    return ejecutar_interno(registro.invocar, instruccion[3], args)
+
+class _BinarioDeTexto:
+    """Hace de sys.stdout.buffer para un trabajo: decodifica los bytes y los pasa a su salida de texto."""
+
+    def __init__(self, texto):
+        self.texto = texto
+        self.decodificador = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    def write(self, datos) -> int:
+        texto = self.decodificador.decode(bytes(datos))
+        if texto:
+            self.texto.write(texto)
+        return len(datos)
+
+    def flush(self):
+        pass
+
+class _SalidaConPrefijo:
+    """Sustituye a sys.stdout/sys.stderr durante un bloque paralelo.
+
+    Las escrituras del hilo de un trabajo se acumulan hasta completar una
+    línea y salen con el nombre del trabajo delante; el resto pasa tal cual.
+    Los bytes de un trabajo (sys.stdout.buffer) pasan por el mismo camino y
+    fileno() falla para él, así cat/head/tail no escriben directamente en el
+    descriptor compartido."""
+
+    def __init__(self, destino, cerrojo: threading.Lock):
+        self.destino = destino
+        self.cerrojo = cerrojo
+        self.pendiente: Dict[int, str] = {}
+        self.local = threading.local()
+
+    def write(self, texto: str) -> int:
+        captura = getattr(self.local, "captura", None)
+        if captura is not None:
+            return captura.write(texto)
+        prefijo = getattr(_contexto_trabajo, "prefijo", None)
+        if prefijo is None:
+            with self.cerrojo:
+                self.destino.write(texto)
+            return len(texto)
+        hilo = threading.get_ident()
+        *completas, resto = (self.pendiente.pop(hilo, "") + texto).split("\n")
+        if resto:
+            self.pendiente[hilo] = resto
+        if completas:
+            self._emitir(prefijo, completas)
+        return len(texto)
+
+    def _emitir(self, prefijo: str, lineas: List[str]):
+        with self.cerrojo:
+            self.destino.write("".join(f"{prefijo}{l}{COLORES['reset']}\n" for l in lineas))
+            self.destino.flush()
+
+    def terminar_hilo(self, prefijo: str):
+        resto = self.pendiente.pop(threading.get_ident(), "")
+        if _RE_ANSI.sub("", resto).strip():  # ignorar restos que solo son códigos de color
+            self._emitir(prefijo, [resto])
+
+    def flush(self):
+        if getattr(self.local, "captura", None) is None and getattr(_contexto_trabajo, "prefijo", None) is None:
+            self.destino.flush()
+
+    @contextlib.contextmanager
+    def capturar(self, destino):
+        """Desvía a `destino` solo la salida del hilo actual (redirect_stdout la desviaría en todos)."""
+        previa = getattr(self.local, "captura", None)
+        self.local.captura = destino
+        try:
+            yield destino
+        finally:
+            self.local.captura = previa
+
+    @property
+    def buffer(self):
+        captura = getattr(self.local, "captura", None)
+        if captura is not None:
+            return captura.buffer
+        if getattr(_contexto_trabajo, "prefijo", None) is None:
+            return self.destino.buffer
+        binario = getattr(self.local, "binario", None)
+        if binario is None:
+            binario = self.local.binario = _BinarioDeTexto(self)
+        return binario
+
+    def fileno(self) -> int:
+        if getattr(self.local, "captura", None) is not None or getattr(_contexto_trabajo, "prefijo", None) is not None:
+            import io
+            raise io.UnsupportedOperation("la salida de un trabajo paralelo no tiene descriptor propio")
+        return self.destino.fileno()
+
+    def isatty(self) -> bool:
+        return False
+
+    def __getattr__(self, nombre):
+        return getattr(self.destino, nombre)
+
+_contexto_trabajo = threading.local()   # nombre y prefijo del trabajo paralelo del hilo actual
+
+def _ejecutar_paralelo(instruccion: tuple, salir_en_error: bool, silencioso: bool) -> int:
+    """Ejecuta los trabajos de un bloque en un pool de hilos; devuelve cuántos fallaron."""
+    from concurrent.futures import ThreadPoolExecutor
+    _, num, _, limite, trabajos = instruccion
+    ancho = max(len(nombre) for nombre, _ in trabajos) if trabajos else 0
+    cerrojo = threading.Lock()
+    salidas = (_SalidaConPrefijo(sys.stdout, cerrojo), _SalidaConPrefijo(sys.stderr, cerrojo))
+    estados: List[tuple] = []   # (nombre, estado) en orden: los nombres pueden repetirse
+    abortar = threading.Event()
+
+    def trabajo(indice: int, nombre: str, ins: tuple) -> int:
+        if abortar.is_set():
+            return 0  # -e: un trabajo anterior falló, los pendientes no arrancan
+        color = COLORES[_COLORES_TRABAJOS[indice % len(_COLORES_TRABAJOS)]]
+        prefijo = f"{color}[{nombre:<{ancho}}]{COLORES['reset']} "
+        _contexto_trabajo.nombre, _contexto_trabajo.prefijo = nombre, prefijo
+        try:
+            linea = expandir_variables(ins[2])
+            if not silencioso:
+                print(_eco_linea(linea))
+            try:
+                estado = _ejecutar_instruccion(ins, linea)
+            except Exception as e:
+                imprimir_error(f"Error: {e}")
+                estado = 1
+            if estado and salir_en_error:
+                abortar.set()
+            return estado
+        finally:
+            for salida in salidas:
+                salida.terminar_hilo(prefijo)
+                salida.local.binario = None
+            _contexto_trabajo.nombre = _contexto_trabajo.prefijo = None
+
+    inicio = time.perf_counter()
+    sys.stdout, sys.stderr = salidas
+    try:
+        with ThreadPoolExecutor(max_workers=limite) as pool:
+            futuros = [(nombre, pool.submit(trabajo, i, nombre, ins)) for i, (nombre, ins) in enumerate(trabajos)]
+            for nombre, futuro in futuros:
+                estados.append((nombre, futuro.result()))
+    finally:
+        sys.stdout, sys.stderr = salidas[0].destino, salidas[1].destino
+
+    fallidos = [(nombre, estado) for nombre, estado in estados if estado]
+    duracion = time.perf_counter() - inicio
+    if fallidos:
+        detalle = ", ".join(f"{nombre} ({estado})" for nombre, estado in fallidos)
+        imprimir_error(f"paralelo (línea {num}): {len(fallidos)}/{len(trabajos)} trabajos fallaron en "
+                       f"{duracion:.2f} s: {detalle}")
+    elif not silencioso:
+        imprimir_exito(f"paralelo: {len(trabajos)} trabajos en {duracion:.2f} s (máx. {limite} a la vez)")
+    return len(fallidos)
+
+def ejecutar_script(instrucciones: tuple, salir_en_error: bool = False, silencioso: bool = False) -> int:
+    """Ejecuta instrucciones compiladas; devuelve el número de líneas con error."""
+    fallos = 0
+    i, total = 0, len(instrucciones)
+    while i < total:
+        instruccion = instrucciones[i]
+        tipo, num, texto = instruccion[:3]
+        if tipo == "externo" and instruccion[3]:
+            fin = i + 1
+            while (fin < total and fin - i < SCRIPT_MAX_LOTE and instrucciones[fin][0] == "externo"
+                   and instrucciones[fin][3]):
+                fin += 1
+            if fin - i > 1:
+                lineas = [expandir_variables(ins[2]) for ins in instrucciones[i:fin]]
+                estado = _ejecutar_lote(lineas, salir_en_error, silencioso)
+                if estado and salir_en_error:
+                    imprimir_error(f"Script detenido: un comando de las líneas {num}-{instrucciones[fin - 1][1]} "
+                                   f"terminó con estado {estado}")
+                    return fallos + 1
+                fallos += estado if estado >= 0 else 1
+                i = fin
+                continue
+
+        if tipo == "paralelo":
+            if not silencioso:
+                print(_eco_linea(texto))
+            fallidos = _ejecutar_paralelo(instruccion, salir_en_error, silencioso)
+            fallos += fallidos
+            if fallidos and salir_en_error:
+                imprimir_error(f"Script detenido en el bloque paralelo de la línea {num}")
+                return fallos
+            i += 1
+            continue
+
+        linea = expandir_variables(texto)
+        if not silencioso:
+            print(_eco_linea(linea))
+        if tipo == "fin":
+            break
+        estado = _ejecutar_instruccion(instruccion, linea)
+        if estado:
+            fallos += 1
+            if salir_en_error:
+                imprimir_error(f"Script detenido en la línea {num} (estado {estado})")
+                return fallos
+        i += 1
+    return fallos
+
+def _ejecutar_archivo_script(args, uso: str):
+    salir_en_error = silencioso = False
+    rutas = []
+    for a in args:
+        if a == "-e":
+            salir_en_error = True
+        elif a == "-q":
+            silencioso = True
+        else:
+            rutas.append(a)
+    if len(rutas) != 1:
+        imprimir_error(uso)
+        return
+    try:
+        instrucciones = cargar_script(rutas[0])
+    except (OSError, UnicodeDecodeError, ValueError) as e:
+        imprimir_error(f"No se pudo cargar el script: {e}")
+        return
+    fallos = ejecutar_script(instrucciones, salir_en_error, silencioso)
+    if fallos and not salir_en_error:
+        imprimir_error(f"{fallos} línea(s) terminaron con error")
+
+def cmd_set(args):
+    if not args or "=" not in args[0]:
+        imprimir_error("Uso: set <NOMBRE>=<valor>")
+        return
+    
+    nombre, valor = args[0].split("=", 1)
+    variables_entorno[nombre] = valor
+    imprimir_exito(f"Variable definida: {nombre}={valor}")
+
+def cmd_env(_args):
+    for k, v in variables_entorno.items():
+        print(f"{COLORES['cian']}{k}={v}{COLORES['reset']}")
+
+def cmd_script(args):
+    _ejecutar_archivo_script(args, "Uso: script [-e] [-q] <archivo.vso>")
+
+def cmd_plugins(_args):
+    if not plugins_cargados:
+        print("No hay plugins cargados.")
+        return
     
-    host, rango = args[0], args[1]
-    try:
-        inicio, fin = map(int, rango.split('-'))
-        print(f"{COLORES['verde']}Escaneando {host} (puertos {inicio}-{fin})...{COLORES['reset']}")
-        
-        for puerto in range(inicio, fin + 1):
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
-                sock.settimeout(0.5)
-                resultado = sock.connect_ex((host, puerto))
-                if resultado == 0:
-                    print(f"{COLORES['cian']}✔ Puerto {puerto} abierto{COLORES['reset']}")
+    print(f"{COLORES['verde']}Plugins cargados:{COLORES['reset']}")
+    for nombre, func in plugins_cargados.items():
+        print(f" - {nombre}: {func.__doc__ or 'Sin descripción'}")
+
+def cmd_modo_shell(args):
+    """Cambia el backend de ejecución de comandos externos"""
+    global MODO_SHELL
+    if not args or args[0] == "estado":
+        estado = "activo" if _shell_persistente and _shell_persistente.activo() else "sin iniciar"
+        print(f"Modo de shell: {MODO_SHELL} (coproceso {estado})")
+        return
+    modo = args[0]
+    if modo not in ("persistente", "efimero"):
+        imprimir_error("Uso: vso-shell persistente|efimero|estado")
+        return
+    if modo == "persistente" and os.name != "posix":
+        imprimir_error("El shell persistente solo está disponible en sistemas POSIX")
+        return
+    MODO_SHELL = modo
+    if modo == "efimero" and _shell_persistente:
+        _shell_persistente.cerrar()
+    imprimir_exito(f"Modo de shell: {modo}")
+
+# =========================
+# Autocompletado
+# =========================
+# Comandos cuyo primer argumento es un host: se completan con hosts del historial
+COMANDOS_CON_HOST = {"ping", "escaneo-puertos", "analisis-seguridad", "vso-ip-dominio"}
+COMPLETADO_INTERVALO_PATH = 5.0   # cada cuánto se comprueba si $PATH cambió
+
+class _NodoTrie:
+    __slots__ = ("hijos", "fin", "cache")
+
+    def __init__(self):
+        self.hijos: Dict[str, "_NodoTrie"] = {}
+        self.fin = False
+        self.cache: Optional[List[str]] = None
+
+class TriePrefijos:
+    """Trie de palabras; cada nodo guarda la lista ordenada de completados la primera vez que se pide."""
+
+    def __init__(self, palabras=()):
+        self.raiz = _NodoTrie()
+        for palabra in palabras:
+            self.insertar(palabra)
+
+    def insertar(self, palabra: str):
+        nodo = self.raiz
+        nodo.cache = None
+        for ch in palabra:
+            nodo = nodo.hijos.setdefault(ch, _NodoTrie())
+            nodo.cache = None
+        nodo.fin = True
+
+    def con_prefijo(self, prefijo: str) -> List[str]:
+        nodo = self.raiz
+        for ch in prefijo:
+            nodo = nodo.hijos.get(ch)
+            if nodo is None:
+                return []
+        if nodo.cache is None:
+            resultado = []
+            pila = [(nodo, prefijo)]
+            while pila:
+                actual, palabra = pila.pop()
+                if actual.fin:
+                    resultado.append(palabra)
+                for ch, hijo in actual.hijos.items():
+                    pila.append((hijo, palabra + ch))
+            resultado.sort()
+            nodo.cache = resultado
+        return nodo.cache
+
+class MotorCompletado:
+    """Completado de comandos (internos, plugins y $PATH), rutas y hosts del historial."""
+
+    def __init__(self):
+        self.trie = TriePrefijos()
+        self.firma_comandos = None
+        self.ejecutables: List[str] = []
+        self.firma_path = None
+        self.ultima_revision_path = 0.0
+        self.escaneando = False
+        self.cache_dirs: Dict[str, tuple] = {}
+        self.hosts: List[str] = []
+        self.firma_hosts = None
+        self.opciones: List[str] = []
+
+    # --- ejecutables de $PATH (se escanean en un hilo, nunca al pulsar Tab) ---
+    def _firma_de_path(self):
+        firma = []
+        for d in os.environ.get("PATH", "").split(os.pathsep):
+            try:
+                firma.append((d, os.stat(d).st_mtime_ns))
+            except OSError:
+                continue
+        return tuple(firma)
+
+    def _escanear_path(self):
+        try:
+            firma = self._firma_de_path()
+            if firma != self.firma_path:
+                ejecutables = set()
+                for d, _ in firma:
+                    try:
+                        with os.scandir(d) as it:
+                            for e in it:
+                                try:
+                                    if e.is_file() and os.access(e.path, os.X_OK):
+                                        ejecutables.add(e.name)
+                                except OSError:
+                                    continue
+                    except OSError:
+                        continue
+                self.ejecutables = sorted(ejecutables)
+                self.firma_path = firma
+            # Construir el trie aquí y no en la primera pulsación de Tab
+            self._actualizar_trie()
+        finally:
+            self.escaneando = False
+
+    def revisar_path(self):
+        ahora = time.monotonic()
+        if self.escaneando or ahora - self.ultima_revision_path < COMPLETADO_INTERVALO_PATH:
+            return
+        self.ultima_revision_path = ahora
+        self.escaneando = True
+        threading.Thread(target=self._escanear_path, daemon=True).start()
+
+    # --- comandos ---
+    def _actualizar_trie(self):
+        firma = (registro.version, self.firma_path)
+        if firma == self.firma_comandos:
+            return
+        self.trie = TriePrefijos(list(registro.comandos) + self.ejecutables)
+        self.firma_comandos = firma
+
+    def completar_comando(self, texto: str) -> List[str]:
+        self.revisar_path()
+        self._actualizar_trie()
+        return self.trie.con_prefijo(texto)
+
+    # --- rutas ---
+    def _listar(self, directorio: str):
+        """Listado cacheado de un directorio; se invalida cuando cambia su mtime."""
+        try:
+            mtime = os.stat(directorio).st_mtime_ns
+        except OSError:
+            return []
+        cacheado = self.cache_dirs.get(directorio)
+        if cacheado and cacheado[0] == mtime:
+            return cacheado[1]
+        entradas = []
+        try:
+            with os.scandir(directorio) as it:
+                for e in it:
+                    try:
+                        entradas.append((e.name, e.is_dir()))
+                    except OSError:
+                        entradas.append((e.name, False))
+        except OSError:
+            return []
+        entradas.sort()
+        self.cache_dirs[directorio] = (mtime, entradas)
+        return entradas
+
+    def completar_ruta(self, texto: str, solo_dirs: bool = False) -> List[str]:
+        base, prefijo = os.path.split(texto)
+        directorio = os.path.expanduser(base) if base else "."
+        resultado = []
+        for nombre, es_dir in self._listar(directorio):
+            if not nombre.startswith(prefijo) or (solo_dirs and not es_dir):
+                continue
+            if nombre.startswith(".") and not prefijo.startswith("."):
+                continue
+            resultado.append(os.path.join(base, nombre) + ("/" if es_dir else ""))
+        return resultado
+
+    # --- hosts vistos en el historial ---
+    def completar_host(self, texto: str) -> List[str]:
+        firma = (len(_historial_cache), _historial_cache[-1] if _historial_cache else None)
+        if firma != self.firma_hosts:
+            hosts = {}
+            for comando in _historial_cache:
+                partes = comando.split()
+                if len(partes) > 1 and partes[0] in COMANDOS_CON_HOST:
+                    for arg in partes[1:]:
+                        if not arg.startswith("-") and (not arg[0].isdigit() or "." in arg):
+                            hosts[arg] = None
+                            break
+            self.hosts = sorted(hosts)
+            self.firma_hosts = firma
+        return [h for h in self.hosts if h.startswith(texto)]
+
+    def opciones_para(self, linea: str, inicio: int, texto: str) -> List[str]:
+        anteriores = linea[:inicio].split()
+        if not anteriores:
+            if "/" in texto:
+                return self.completar_ruta(texto)
+            return self.completar_comando(texto)
+        comando = anteriores[0]
+        if comando in COMANDOS_CON_HOST and len(anteriores) == 1:
+            return self.completar_host(texto) or self.completar_ruta(texto)
+        return self.completar_ruta(texto, solo_dirs=comando == "cd")
+
+    def completar(self, texto: str, estado: int):
+        if estado == 0:
+            try:
+                self.opciones = self.opciones_para(readline.get_line_buffer(), readline.get_begidx(), texto)
+            except Exception:
+                self.opciones = []
+        return self.opciones[estado] if estado < len(self.opciones) else None
+
+motor_completado = MotorCompletado()
+
+def setup_autocompletado():
+    if readline:
+        motor_completado.revisar_path()
+        readline.set_completer(motor_completado.completar)
+        readline.set_completer_delims(" \t\n;|&<>")
+        readline.parse_and_bind("tab: complete")
+        readline.parse_and_bind('"\\e[A": history-search-backward')
+        readline.parse_and_bind('"\\e[B": history-search-forward')
+
+# =========================
+# Plugins (carga diferida con manifiesto)
+# =========================
+PLUGINS_MANIFIESTO = ".manifiesto.cache"  # marshal: se lee sin importar json
+PLUGINS_MANIFIESTO_VERSION = 1
+
+class _PerfilArranque:
+    """Tiempos de las fases de arranque y módulos que importa cada una (--startup-profile)."""
+
+    def __init__(self):
+        self.activo = False
+        self.fases: List[tuple] = []
+
+    @contextlib.contextmanager
+    def fase(self, nombre: str):
+        if not self.activo:
+            yield
+            return
+        antes = set(sys.modules)
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.fases.append((nombre, time.perf_counter() - inicio, sorted(set(sys.modules) - antes)))
+
+    def informe(self):
+        gris, reset = COLORES["gris"], COLORES["reset"]
+        total = time.perf_counter() - _T_ARRANQUE
+        lineas = [f"{COLORES['cian']}Perfil de arranque:{reset}",
+                  f"  {'importar terminal.py':<32} {(_T_MODULO_CARGADO - _T_ARRANQUE) * 1000:8.2f} ms"]
+        for nombre, duracion, modulos in self.fases:
+            lineas.append(f"  {nombre:<32} {duracion * 1000:8.2f} ms")
+            if modulos:
+                lineas.append(f"{gris}    + {len(modulos)} módulos: {', '.join(modulos[:8])}"
+                              f"{' ...' if len(modulos) > 8 else ''}{reset}")
+        lineas.append(f"  {'hasta el primer prompt':<32} {total * 1000:8.2f} ms")
+        lineas.append(f"{gris}  módulos cargados: {len(sys.modules)}{reset}")
+        print("\n".join(lineas))
+
+perfil_arranque = _PerfilArranque()
+
+class ComandoPluginPerezoso:
+    """Marcador de un comando de plugin: importa el módulo la primera vez que se ejecuta."""
+
+    def __init__(self, modulo: str, comando: str, doc: str):
+        self.modulo = modulo
+        self.comando = comando
+        self.__doc__ = doc or None
+
+    def __call__(self, args):
+        comandos = _importar_plugin(self.modulo)
+        if comandos is None or self.comando not in comandos:
+            imprimir_error(f"El plugin {self.modulo} ya no define '{self.comando}'")
+            plugins_cargados.pop(self.comando, None)
+            registro.quitar(self.comando)
+            return
+        return comandos[self.comando](args)
+
+def _importar_plugin(nombre: str) -> Optional[Dict[str, callable]]:
+    """Importa plugins/<nombre>.py y registra sus comandos reales (sustituyendo los marcadores)."""
+    directorio = os.path.dirname(os.path.abspath(__file__))
+    if directorio not in sys.path:
+        sys.path.insert(0, directorio)
+    try:
+        modulo = __import__(f"plugins.{nombre}", fromlist=["*"])
+        if not hasattr(modulo, "registrar_comandos"):
+            return None
+        comandos = modulo.registrar_comandos()
     except Exception as e:
-        imprimir_error(f"Error en escaneo: {e}")
+        imprimir_error(f"Error cargando plugin {nombre}: {e}")
+        return None
+    plugins_cargados.update(comandos)
+    for comando, funcion in comandos.items():
+        registro.registrar(comando, funcion)
+    return comandos
+
+def _leer_manifiesto(ruta: str) -> dict:
+    import marshal
+    try:
+        with open(ruta, "rb") as f:
+            datos = marshal.load(f)
+        if datos.get("version") == PLUGINS_MANIFIESTO_VERSION:
+            return datos.get("plugins", {})
+    except (OSError, ValueError, EOFError, TypeError, AttributeError):
+        pass
+    return {}
+
+def _guardar_manifiesto(ruta: str, plugins: dict):
+    import marshal
+    try:
+        temporal = f"{ruta}.{os.getpid()}.tmp"
+        with open(temporal, "wb") as f:
+            marshal.dump({"version": PLUGINS_MANIFIESTO_VERSION, "plugins": plugins}, f)
+        os.replace(temporal, ruta)
+    except OSError:
+        pass  # directorio de plugins de solo lectura: se reimportará en el próximo arranque
+
+def cargar_plugins():
+    plugins_dir = os.path.join(os.path.dirname(__file__), "plugins")
+    if not os.path.exists(plugins_dir):
+        os.makedirs(plugins_dir, exist_ok=True)
+        return
+
+    ruta_manifiesto = os.path.join(plugins_dir, PLUGINS_MANIFIESTO)
+    manifiesto = _leer_manifiesto(ruta_manifiesto)
+    nuevo = {}
+    for archivo in sorted(os.listdir(plugins_dir)):
+        if not archivo.endswith(".py") or archivo == "__init__.py":
+            continue
+        nombre = archivo[:-3]
+        try:
+            st = os.stat(os.path.join(plugins_dir, archivo))
+        except OSError:
+            continue
+        entrada = manifiesto.get(nombre)
+        if entrada and entrada.get("mtime_ns") == st.st_mtime_ns and entrada.get("tam") == st.st_size:
+            # Manifiesto al día: registrar marcadores sin importar el módulo
+            for comando, doc in entrada["comandos"].items():
+                plugins_cargados[comando] = ComandoPluginPerezoso(nombre, comando, doc)
+                registro.registrar(comando, plugins_cargados[comando])
+            nuevo[nombre] = entrada
+            continue
+        with perfil_arranque.fase(f"plugin {nombre}"):
+            comandos = _importar_plugin(nombre)
+        if comandos is None:
+            continue
+        imprimir_exito(f"Plugin cargado: {nombre}")
+        nuevo[nombre] = {"mtime_ns": st.st_mtime_ns, "tam": st.st_size,
+                         "comandos": {c: (f.__doc__ or "") for c, f in comandos.items()}}
+    if nuevo != manifiesto:
+        _guardar_manifiesto(ruta_manifiesto, nuevo)
+
+# =========================
+# Control de trabajos en segundo plano
+# =========================
+TRABAJOS_BUFFER_BYTES = 256 * 1024   # salida retenida por trabajo (búfer circular)
+TRABAJOS_MAX_TERMINADOS = 100        # trabajos terminados que se conservan para job-log
+TRABAJOS_INTERVALO_SONDEO = 0.5      # cada cuánto busca el hilo lector procesos terminados
+
+class Trabajo:
+    """Proceso lanzado con '&': salida en un búfer circular, estado y consumo de recursos."""
+
+    def __init__(self, id_trabajo: int, comando: str, proceso):
+        self.id = id_trabajo
+        self.comando = comando
+        self.proceso = proceso
+        self.pid = proceso.pid
+        self.inicio = time.time()
+        self.inicio_mono = time.monotonic()
+        self.duracion: Optional[float] = None
+        self.estado: Optional[int] = None
+        self.rusage = None
+        self.detenido = False
+        self.notificado = False
+        self.salida_abierta = True
+        self.salida = collections.deque()
+        self.bytes_retenidos = 0
+        self.bytes_totales = 0
+        self.cambio = threading.Condition()
+
+    def activo(self) -> bool:
+        return self.estado is None
+
+    def agregar_salida(self, datos: bytes):
+        with self.cambio:
+            self.salida.append(datos)
+            self.bytes_retenidos += len(datos)
+            self.bytes_totales += len(datos)
+            while self.bytes_retenidos > TRABAJOS_BUFFER_BYTES:
+                sobra = self.bytes_retenidos - TRABAJOS_BUFFER_BYTES
+                primero = self.salida[0]
+                if len(primero) <= sobra:
+                    self.salida.popleft()
+                    self.bytes_retenidos -= len(primero)
+                else:
+                    self.salida[0] = primero[sobra:]
+                    self.bytes_retenidos -= sobra
+            self.cambio.notify_all()
+
+    def cerrar_salida(self):
+        with self.cambio:
+            self.salida_abierta = False
+            self.cambio.notify_all()
+
+    def finalizar(self, estado: int, rusage):
+        with self.cambio:
+            self.estado = estado
+            self.rusage = rusage
+            self.detenido = False
+            self.duracion = time.monotonic() - self.inicio_mono
+            self.proceso.returncode = estado  # ya cosechado: que Popen no vuelva a esperar
+            self.cambio.notify_all()
+
+    def leer_desde(self, posicion: int) -> tuple:
+        """Devuelve la salida retenida a partir de `posicion` (en bytes desde el inicio) y la nueva posición."""
+        with self.cambio:
+            primero = self.bytes_totales - self.bytes_retenidos
+            datos = b"".join(self.salida)[max(posicion, primero) - primero:]
+            return datos, self.bytes_totales
+
+    def terminado_del_todo(self) -> bool:
+        return not self.activo() and not self.salida_abierta
+
+    def recursos(self) -> tuple:
+        """(segundos de CPU, RSS en bytes): de wait4 si terminó, de /proc mientras se ejecuta."""
+        if self.rusage is not None:
+            rss = self.rusage.ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+            return self.rusage.ru_utime + self.rusage.ru_stime, rss
+        try:
+            with open(f"/proc/{self.pid}/stat", "rb") as f:
+                campos = f.read().rsplit(b")", 1)[1].split()
+            return ((int(campos[11]) + int(campos[12])) / os.sysconf("SC_CLK_TCK"),
+                    int(campos[21]) * os.sysconf("SC_PAGE_SIZE"))
+        except (OSError, IndexError, ValueError):
+            return None, None
+
+    def descripcion_estado(self) -> str:
+        if self.detenido:
+            return "detenido"
+        if self.activo():
+            return "ejecutando"
+        if self.estado < 0:
+            try:
+                return signal.Signals(-self.estado).name
+            except ValueError:
+                return f"señal {-self.estado}"
+        return "hecho" if self.estado == 0 else f"salida {self.estado}"
+
+    def senal(self, sig: int):
+        if hasattr(os, "killpg"):
+            os.killpg(self.pid, sig)  # grupo entero: el shell y lo que haya lanzado
+        else:
+            self.proceso.send_signal(sig)
+
+class GestorTrabajos:
+    """Lanza trabajos y los vigila desde un único hilo que lee su salida y los cosecha."""
+
+    def __init__(self):
+        self.trabajos: Dict[int, Trabajo] = {}
+        self.siguiente_id = 1
+        self.cerrojo = threading.Lock()
+        self.nuevos: List[Trabajo] = []
+        self.selector = None
+        self.despertador = None
+
+    def lanzar(self, comando: str) -> Trabajo:
+        import subprocess
+        proceso = subprocess.Popen(
+            comando, shell=True, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT, env=dict(os.environ, PYTHONUNBUFFERED="1"),
+            start_new_session=True,  # Ctrl+C en la terminal no llega a los trabajos
+        )
+        with self.cerrojo:
+            trabajo = Trabajo(self.siguiente_id, comando, proceso)
+            self.siguiente_id += 1
+            self.trabajos[trabajo.id] = trabajo
+            self._podar()
+        if os.name == "posix":
+            self._arrancar_lector()
+            with self.cerrojo:
+                self.nuevos.append(trabajo)
+            os.write(self.despertador, b"\0")
+        else:
+            threading.Thread(target=self._leer_sin_selector, args=(trabajo,), daemon=True).start()
+        return trabajo
+
+    def _podar(self):
+        terminados = [t for t in self.trabajos.values() if t.terminado_del_todo() and t.notificado]
+        for trabajo in terminados[:max(0, len(terminados) - TRABAJOS_MAX_TERMINADOS)]:
+            del self.trabajos[trabajo.id]
+
+    def _arrancar_lector(self):
+        if self.selector is not None:
+            return
+        import selectors
+        self.selector = selectors.DefaultSelector()
+        lectura, self.despertador = os.pipe()
+        os.set_blocking(lectura, False)
+        self.selector.register(lectura, selectors.EVENT_READ, None)
+        threading.Thread(target=self._bucle_lector, name="vso-trabajos", daemon=True).start()
+
+    def _bucle_lector(self):
+        import selectors
+        ultimo_sondeo = time.monotonic()
+        while True:
+            hay_activos = any(t.activo() for t in list(self.trabajos.values()))
+            eventos = self.selector.select(TRABAJOS_INTERVALO_SONDEO if hay_activos else None)
+            alguno_cerrado = False
+            for clave, _ in eventos:
+                if clave.data is None:
+                    try:
+                        os.read(clave.fd, 4096)
+                    except BlockingIOError:
+                        pass
+                    with self.cerrojo:
+                        nuevos, self.nuevos = self.nuevos, []
+                    for trabajo in nuevos:
+                        self.selector.register(trabajo.proceso.stdout.fileno(), selectors.EVENT_READ, trabajo)
+                    continue
+                trabajo = clave.data
+                try:
+                    datos = os.read(clave.fd, SHELL_TAM_BLOQUE)
+                except OSError:
+                    datos = b""
+                if datos:
+                    trabajo.agregar_salida(datos)
+                else:
+                    self.selector.unregister(clave.fd)
+                    trabajo.proceso.stdout.close()
+                    trabajo.cerrar_salida()
+                    alguno_cerrado = True
+            if alguno_cerrado or time.monotonic() - ultimo_sondeo >= TRABAJOS_INTERVALO_SONDEO:
+                self._cosechar()
+                ultimo_sondeo = time.monotonic()
+
+    def _cosechar(self):
+        """Recoge los procesos terminados (sin zombis) y detecta paradas y reanudaciones."""
+        opciones = os.WNOHANG | getattr(os, "WUNTRACED", 0) | getattr(os, "WCONTINUED", 0)
+        for trabajo in list(self.trabajos.values()):
+            if not trabajo.activo():
+                continue
+            try:
+                pid, estado, rusage = os.wait4(trabajo.pid, opciones)
+            except ChildProcessError:
+                trabajo.finalizar(trabajo.proceso.returncode if trabajo.proceso.returncode is not None else -1, None)
+                continue
+            if pid == 0:
+                continue
+            if os.WIFSTOPPED(estado):
+                trabajo.detenido = True
+            elif os.WIFCONTINUED(estado):
+                trabajo.detenido = False
+            else:
+                trabajo.finalizar(os.waitstatus_to_exitcode(estado), rusage)
+
+    def _leer_sin_selector(self, trabajo: Trabajo):
+        # Windows: los selectores no aceptan tuberías, un hilo por trabajo
+        for datos in iter(lambda: trabajo.proceso.stdout.read1(SHELL_TAM_BLOQUE), b""):
+            trabajo.agregar_salida(datos)
+        trabajo.proceso.stdout.close()
+        trabajo.cerrar_salida()
+        trabajo.finalizar(trabajo.proceso.wait(), None)
+
+    def buscar(self, referencia: str) -> Optional[Trabajo]:
+        """Acepta 'n' o '%n' como id de trabajo; con '%+' o sin nada, el último."""
+        referencia = referencia.lstrip("%")
+        if referencia in ("", "+"):
+            return next(reversed(self.trabajos.values()), None)
+        try:
+            return self.trabajos.get(int(referencia))
+        except ValueError:
+            return None
+
+    def avisar_terminados(self):
+        for trabajo in list(self.trabajos.values()):
+            if not trabajo.activo() and not trabajo.notificado:
+                trabajo.notificado = True
+                color = COLORES["verde"] if trabajo.estado == 0 else COLORES["rojo"]
+                print(f"{color}[{trabajo.id}] {trabajo.descripcion_estado():<10}{COLORES['reset']} "
+                      f"{trabajo.comando}  {COLORES['gris']}({trabajo.duracion:.1f} s){COLORES['reset']}")
+        with self.cerrojo:
+            self._podar()
+
+_gestor_trabajos: Optional[GestorTrabajos] = None
+
+def obtener_gestor_trabajos() -> GestorTrabajos:
+    global _gestor_trabajos
+    if _gestor_trabajos is None:
+        _gestor_trabajos = GestorTrabajos()
+    return _gestor_trabajos
+
+def ejecutar_en_background(comando: str):
+    comando = comando.strip()
+    if not comando:
+        imprimir_error("Uso: <comando> &")
+        return
+    try:
+        trabajo = obtener_gestor_trabajos().lanzar(comando)
+    except OSError as e:
+        imprimir_error(f"No se pudo ejecutar en background: {e}")
+        return
+    print(f"{COLORES['gris']}[{trabajo.id}] {trabajo.pid}{COLORES['reset']}")
+
+def _trabajo_de_args(args, uso: str) -> Optional[Trabajo]:
+    trabajo = obtener_gestor_trabajos().buscar(args[0] if args else "")
+    if trabajo is None:
+        imprimir_error(f"No existe el trabajo {args[0]}" if args else uso)
+    return trabajo
+
+def cmd_jobs(args):
+    """Lista los trabajos en segundo plano"""
+    gestor = obtener_gestor_trabajos()
+    if not gestor.trabajos:
+        print(f"{COLORES['gris']}No hay trabajos.{COLORES['reset']}")
+        return
+    todos = "-a" in args
+    print(f"{COLORES['cian']}{'ID':>4} {'Estado':<11} {'PID':>7} {'Tiempo':>8} {'CPU':>7} {'RSS':>7} "
+          f"{'Salida':>7}  Comando{COLORES['reset']}")
+    for trabajo in list(gestor.trabajos.values()):
+        if not todos and trabajo.notificado:
+            continue
+        duracion = trabajo.duracion if trabajo.duracion is not None else time.monotonic() - trabajo.inicio_mono
+        cpu, rss = trabajo.recursos()
+        print(f"{trabajo.id:>4} {trabajo.descripcion_estado():<11} {trabajo.pid:>7} {duracion:>7.1f}s "
+              f"{'-' if cpu is None else f'{cpu:.2f}s':>7} {'-' if rss is None else tamano_legible(rss):>7} "
+              f"{tamano_legible(trabajo.bytes_totales):>7}  {trabajo.comando}")
+    gestor.avisar_terminados()
+
+def _esperar_trabajo(trabajo: Trabajo):
+    with trabajo.cambio:
+        while trabajo.activo():
+            trabajo.cambio.wait(TRABAJOS_INTERVALO_SONDEO)
+
+def cmd_wait(args):
+    """Espera a que terminen los trabajos indicados (o todos)"""
+    gestor = obtener_gestor_trabajos()
+    if args:
+        trabajos = []
+        for referencia in args:
+            trabajo = gestor.buscar(referencia)
+            if trabajo is None:
+                imprimir_error(f"No existe el trabajo {referencia}")
+                return
+            trabajos.append(trabajo)
+    else:
+        trabajos = [t for t in list(gestor.trabajos.values()) if t.activo()]
+    try:
+        for trabajo in trabajos:
+            _esperar_trabajo(trabajo)
+    except KeyboardInterrupt:
+        print(f"\n{COLORES['gris']}Espera interrumpida; los trabajos siguen en segundo plano.{COLORES['reset']}")
+        return
+    gestor.avisar_terminados()
+    fallidos = [t for t in trabajos if t.estado]
+    if fallidos:
+        imprimir_error(f"{len(fallidos)} trabajo(s) terminaron con error")
+
+def _parsear_senal(texto: str) -> int:
+    texto = texto.upper()
+    if texto.isdigit():
+        return int(texto)
+    return int(getattr(signal, texto if texto.startswith("SIG") else f"SIG{texto}"))
+
+def cmd_kill(args):
+    """Envía una señal a un trabajo (%n o n) o a un PID"""
+    uso = "Uso: kill [-SEÑAL|-s SEÑAL] <%trabajo|pid>..."
+    sig = signal.SIGTERM
+    try:
+        if args and args[0] == "-s":
+            sig, args = _parsear_senal(args[1]), args[2:]
+        elif args and args[0].startswith("-"):
+            sig, args = _parsear_senal(args[0][1:]), args[1:]
+    except (IndexError, AttributeError, ValueError):
+        imprimir_error(uso)
+        return
+    if not args:
+        imprimir_error(uso)
+        return
+    gestor = obtener_gestor_trabajos()
+    for referencia in args:
+        trabajo = gestor.buscar(referencia)
+        try:
+            if trabajo is not None:
+                if trabajo.activo():
+                    trabajo.senal(sig)
+                    if sig == getattr(signal, "SIGCONT", None):
+                        trabajo.detenido = False
+            elif referencia.isdigit():
+                os.kill(int(referencia), sig)
+            else:
+                imprimir_error(f"No existe el trabajo {referencia}")
+        except OSError as e:
+            imprimir_error(f"kill {referencia}: {e}")
+
+def cmd_bg(args):
+    """Reanuda en segundo plano un trabajo detenido"""
+    trabajo = _trabajo_de_args(args, "Uso: bg [%trabajo]")
+    if trabajo is None:
+        return
+    if not trabajo.activo():
+        imprimir_error(f"El trabajo {trabajo.id} ya terminó")
+        return
+    sigcont = getattr(signal, "SIGCONT", None)
+    if sigcont is None:
+        imprimir_error("bg no está soportado en esta plataforma (no hay SIGCONT)")
+        return
+    trabajo.senal(sigcont)
+    trabajo.detenido = False
+    print(f"[{trabajo.id}] {trabajo.comando} &")
 
-def cmd_grep(args):
-    if len(args) < 2:
-        imprimir_error("Uso: grep <patrón> <archivo>")
+def _seguir_trabajo(trabajo: Trabajo, posicion: int, esperar_fin: bool):
+    """Vuelca la salida nueva del trabajo hasta que termine (o hasta ponerse al día)."""
+    while True:
+        datos, posicion = trabajo.leer_desde(posicion)
+        if datos:
+            _escribir_bytes(datos)
+        if not esperar_fin or trabajo.terminado_del_todo():
+            return
+        with trabajo.cambio:
+            if trabajo.bytes_totales == posicion and not trabajo.terminado_del_todo():
+                trabajo.cambio.wait(TRABAJOS_INTERVALO_SONDEO)
+
+def cmd_fg(args):
+    """Sigue en primer plano la salida de un trabajo hasta que termine (Ctrl+C le envía SIGINT)"""
+    trabajo = _trabajo_de_args(args, "Uso: fg [%trabajo]")
+    if trabajo is None:
         return
-    
-    patron, archivo = args[0], args[1]
-    try:
-        with open(archivo, "r", encoding="utf-8") as f:
-            for i, linea in enumerate(f, 1):
-                if patron.lower() in linea.lower():
-                    print(f"{COLORES['verde']}{i}:{COLORES['reset']} {linea.rstrip()}")
-    except Exception as e:
-        imprimir_error(f"Error en grep: {e}")
+    print(f"{COLORES['gris']}[{trabajo.id}] {trabajo.comando}{COLORES['reset']}")
+    if trabajo.detenido and hasattr(signal, "SIGCONT"):
+        trabajo.senal(signal.SIGCONT)
+        trabajo.detenido = False
+    interrupciones = 0
+    while True:
+        try:
+            _seguir_trabajo(trabajo, 0 if interrupciones == 0 else trabajo.bytes_totales, True)
+            break
+        except KeyboardInterrupt:
+            interrupciones += 1
+            if interrupciones > 1 or not trabajo.activo():
+                print(f"\n{COLORES['gris']}[{trabajo.id}] sigue en segundo plano{COLORES['reset']}")
+                return
+            try:
+                trabajo.senal(signal.SIGINT)  # el primer Ctrl+C es para el trabajo
+            except ValueError:
+                trabajo.senal(signal.SIGTERM)  # Windows: send_signal solo admite SIGTERM
+    obtener_gestor_trabajos().avisar_terminados()
 
-def cmd_find(args):
-    if not args:
-        imprimir_error("Uso: find <nombre>")
+def cmd_job_log(args):
+    """Muestra la salida capturada de un trabajo"""
+    uso = "Uso: job-log <%trabajo> [-n líneas] [-f]"
+    seguir = "-f" in args
+    args = [a for a in args if a != "-f"]
+    lineas = None
+    if "-n" in args:
+        i = args.index("-n")
+        try:
+            lineas = int(args[i + 1])
+        except (IndexError, ValueError):
+            imprimir_error(uso)
+            return
+        del args[i:i + 2]
+    trabajo = _trabajo_de_args(args, uso)
+    if trabajo is None:
         return
-    
-    nombre = args[0]
-    for root, dirs, files in os.walk("."):
-        for f in files:
-            if nombre.lower() in f.lower():
-                print(f"{COLORES['cian']}{os.path.join(root, f)}{COLORES['reset']}")
+    datos, posicion = trabajo.leer_desde(0)
+    primero = trabajo.bytes_totales - trabajo.bytes_retenidos
+    if primero:
+        print(f"{COLORES['gris']}... {tamano_legible(primero)} anteriores descartados del búfer{COLORES['reset']}")
+    if lineas is not None:
+        datos = b"".join(datos.splitlines(keepends=True)[-lineas:]) if lineas > 0 else b""
+    _escribir_bytes(datos)
+    if seguir:
+        try:
+            _seguir_trabajo(trabajo, posicion, True)
+        except KeyboardInterrupt:
+            print()
 
-def cmd_set(args):
-    if not args or "=" not in args[0]:
-        imprimir_error("Uso: set <NOMBRE>=<valor>")
+# =========================
+# Instrumentación (vso-perf)
+# =========================
+PERF_SUBCUBETAS = 8          # cubetas por potencia de 2 en los histogramas (~9 % de resolución)
+PERF_TOP = 15
+PERF_INTERVALO_MUESTREO = 0.005
+PERF_DIR = os.path.join(VSO_DIR, "perf")
+
+class HistogramaLog:
+    """Histograma de cubetas logarítmicas: memoria constante y percentiles aproximados."""
+    __slots__ = ("cubetas", "n", "total", "maximo")
+
+    def __init__(self):
+        self.cubetas: Dict[Optional[int], int] = {}
+        self.n = 0
+        self.total = 0.0
+        self.maximo = 0.0
+
+    def agregar(self, valor: float):
+        self.n += 1
+        self.total += valor
+        if valor > self.maximo:
+            self.maximo = valor
+        cubeta = math.floor(math.log2(valor) * PERF_SUBCUBETAS) if valor > 0 else None
+        self.cubetas[cubeta] = self.cubetas.get(cubeta, 0) + 1
+
+    def percentil(self, p: float) -> float:
+        objetivo = p / 100 * self.n
+        acumulado = self.cubetas.get(None, 0)
+        if acumulado >= objetivo:
+            return 0.0
+        for cubeta in sorted(c for c in self.cubetas if c is not None):
+            acumulado += self.cubetas[cubeta]
+            if acumulado >= objetivo:
+                # límite superior de la cubeta, sin pasar del máximo observado
+                return min(2 ** ((cubeta + 1) / PERF_SUBCUBETAS), self.maximo)
+        return self.maximo
+
+class _MetricasComando:
+    __slots__ = ("pared", "cpu", "bytes_escritos", "rss_crecimiento")
+
+    def __init__(self):
+        self.pared = HistogramaLog()
+        self.cpu = HistogramaLog()
+        self.bytes_escritos = 0
+        self.rss_crecimiento = 0
+
+class _MuestreadorPilas:
+    """Toma la pila de un hilo cada `intervalo` segundos y la acumula en formato 'collapsed'."""
+
+    def __init__(self, id_hilo: int, intervalo: float):
+        self.id_hilo = id_hilo
+        self.intervalo = intervalo
+        self.pilas = collections.Counter()
+        self.parar = threading.Event()
+        self.hilo = threading.Thread(target=self._bucle, daemon=True)
+
+    def _bucle(self):
+        while not self.parar.wait(self.intervalo):
+            marco = sys._current_frames().get(self.id_hilo)
+            marcos = []
+            while marco is not None:
+                codigo = marco.f_code
+                marcos.append(f"{os.path.basename(codigo.co_filename)}:{codigo.co_name}:{codigo.co_firstlineno}")
+                marco = marco.f_back
+            if marcos:
+                self.pilas[";".join(reversed(marcos))] += 1
+
+    def __enter__(self):
+        self.hilo.start()
+        return self
+
+    def __exit__(self, *_):
+        self.parar.set()
+        self.hilo.join()
+
+class _Medicion:
+    """Contexto de una medición (clase con __slots__: más barata que un generador)."""
+    __slots__ = ("instrumentacion", "nombre", "hijos", "inicio")
+
+    def __init__(self, instrumentacion, nombre: str, hijos: bool):
+        self.instrumentacion = instrumentacion
+        self.nombre = nombre
+        self.hijos = hijos
+
+    def __enter__(self):
+        self.inicio = self.instrumentacion._muestra(self.hijos)
+
+    def __exit__(self, *_):
+        self.instrumentacion._acumular(self.nombre, self.inicio, self.instrumentacion._muestra(self.hijos))
+
+class _SinMedicion:
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *_):
+        pass
+
+_SIN_MEDICION = _SinMedicion()
+
+class Instrumentacion:
+    """Mide cada comando interno y cada comando de shell: tiempo real, CPU, bytes escritos y RSS."""
+
+    def __init__(self):
+        self.activa = True
+        self.metricas: Dict[str, _MetricasComando] = {}
+        self.cerrojo = threading.Lock()
+        self.fd_io: Optional[int] = None
+        self.armado: Optional[tuple] = None   # perfilador para el próximo comando
+        try:
+            import resource
+            self.resource = resource
+        except ImportError:  # Windows
+            self.resource = None
+
+    def _bytes_escritos(self) -> int:
+        """wchar de /proc/self/io: todo lo que el proceso ha escrito (terminal, archivos, sockets)."""
+        if self.fd_io is None:
+            try:
+                self.fd_io = os.open("/proc/self/io", os.O_RDONLY)
+            except OSError:
+                self.fd_io = -1
+        if self.fd_io < 0:
+            return 0
+        datos = os.pread(self.fd_io, 512, 0)
+        inicio = datos.index(b"wchar:") + 6
+        return int(datos[inicio:datos.index(b"\n", inicio)])
+
+    def _muestra(self, hijos: bool) -> tuple:
+        resource = self.resource
+        if resource is None:
+            return time.perf_counter(), time.process_time(), 0, 0
+        uso = resource.getrusage(resource.RUSAGE_SELF)
+        cpu = uso.ru_utime + uso.ru_stime
+        if hijos:
+            uso_hijos = resource.getrusage(resource.RUSAGE_CHILDREN)
+            cpu += uso_hijos.ru_utime + uso_hijos.ru_stime
+        rss = uso.ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+        return time.perf_counter(), cpu, self._bytes_escritos(), rss
+
+    def medir(self, nombre: str, hijos: bool = False):
+        return _Medicion(self, nombre, hijos) if self.activa else _SIN_MEDICION
+
+    def _acumular(self, nombre: str, inicio: tuple, fin: tuple):
+        with self.cerrojo:
+            metricas = self.metricas.get(nombre)
+            if metricas is None:
+                metricas = self.metricas[nombre] = _MetricasComando()
+            metricas.pared.agregar(fin[0] - inicio[0])
+            metricas.cpu.agregar(fin[1] - inicio[1])
+            metricas.bytes_escritos += fin[2] - inicio[2]
+            if fin[3] - inicio[3] > metricas.rss_crecimiento:
+                metricas.rss_crecimiento = fin[3] - inicio[3]
+
+    def registrar_pared(self, nombre: str, duracion: float):
+        """Versión ligera para fases muy cortas (análisis de la línea)."""
+        if not self.activa:
+            return
+        with self.cerrojo:
+            metricas = self.metricas.get(nombre)
+            if metricas is None:
+                metricas = self.metricas[nombre] = _MetricasComando()
+            metricas.pared.agregar(duracion)
+
+    @contextlib.contextmanager
+    def perfilar_siguiente(self):
+        """Aplica al comando actual el perfilador que dejó armado 'vso-perf perfilar|memoria|flame'."""
+        armado, self.armado = self.armado, None
+        if armado is None:
+            yield
+            return
+        tipo, ruta, intervalo = armado
+        if tipo == "cprofile":
+            import cProfile
+            perfil = cProfile.Profile()
+            perfil.enable()
+            try:
+                yield
+            finally:
+                perfil.disable()
+                self._informe_cprofile(perfil, ruta)
+        elif tipo == "tracemalloc":
+            import tracemalloc
+            tracemalloc.start(16)
+            try:
+                yield
+            finally:
+                instantanea = tracemalloc.take_snapshot()
+                actual, pico = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                self._informe_tracemalloc(instantanea, actual, pico)
+        else:
+            muestreador = _MuestreadorPilas(threading.get_ident(), intervalo)
+            try:
+                with muestreador:
+                    yield
+            finally:
+                self._guardar_pilas(muestreador.pilas, ruta)
+
+    def _informe_cprofile(self, perfil, ruta: Optional[str]):
+        import io
+        import pstats
+        if ruta:
+            perfil.dump_stats(ruta)
+            imprimir_exito(f"Perfil guardado en {ruta} (abrir con pstats o snakeviz)")
+        texto = io.StringIO()
+        pstats.Stats(perfil, stream=texto).sort_stats("cumulative").print_stats(PERF_TOP)
+        print(f"{COLORES['gris']}{texto.getvalue().strip()}{COLORES['reset']}")
+
+    def _informe_tracemalloc(self, instantanea, actual: int, pico: int):
+        print(f"{COLORES['cian']}Memoria reservada por el comando: {tamano_legible(actual)} "
+              f"(pico {tamano_legible(pico)}){COLORES['reset']}")
+        for estadistica in instantanea.statistics("lineno")[:10]:
+            marco = estadistica.traceback[0]
+            print(f"  {tamano_legible(estadistica.size):>8} {estadistica.count:>7} bloques  "
+                  f"{os.path.basename(marco.filename)}:{marco.lineno}")
+
+    def _guardar_pilas(self, pilas: collections.Counter, ruta: Optional[str]):
+        if not pilas:
+            imprimir_error("El comando terminó antes de tomar ninguna muestra")
+            return
+        if not ruta:
+            os.makedirs(PERF_DIR, exist_ok=True)
+            ruta = os.path.join(PERF_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}.folded")
+        with open(ruta, "w", encoding="utf-8") as f:
+            f.writelines(f"{pila} {n}\n" for pila, n in pilas.most_common())
+        imprimir_exito(f"{sum(pilas.values())} muestras en {ruta} (flamegraph.pl o speedscope)")
+
+instrumentacion = Instrumentacion()
+
+def _formatear_duracion(segundos: float) -> str:
+    if segundos >= 1:
+        return f"{segundos:.2f}s"
+    if segundos >= 1e-3:
+        return f"{segundos * 1e3:.1f}ms"
+    return f"{segundos * 1e6:.0f}µs"
+
+def cmd_vso_perf(args):
+    """Histogramas de rendimiento por comando y perfiladores para el próximo comando"""
+    uso = ("Uso: vso-perf [top N] [--orden p95|total|llamadas|cpu] | reset | on | off\n"
+           "     vso-perf perfilar [archivo.prof] | memoria | flame [archivo.folded] [-i ms]")
+    accion = args[0] if args else "top"
+    if accion in ("on", "off"):
+        instrumentacion.activa = accion == "on"
+        imprimir_exito(f"Instrumentación {'activada' if instrumentacion.activa else 'desactivada'}")
+        return
+    if accion == "reset":
+        with instrumentacion.cerrojo:
+            instrumentacion.metricas.clear()
+        imprimir_exito("Métricas reiniciadas")
+        return
+    if accion in ("perfilar", "memoria", "flame"):
+        ruta, intervalo = None, PERF_INTERVALO_MUESTREO
+        resto = list(args[1:])
+        try:
+            if "-i" in resto:
+                i = resto.index("-i")
+                intervalo = max(0.0005, float(resto[i + 1]) / 1000)
+                del resto[i:i + 2]
+        except (IndexError, ValueError):
+            imprimir_error(uso)
+            return
+        if resto:
+            ruta = os.path.abspath(os.path.expanduser(resto[0]))
+        tipo = {"perfilar": "cprofile", "memoria": "tracemalloc", "flame": "muestreo"}[accion]
+        instrumentacion.armado = (tipo, ruta, intervalo)
+        imprimir_exito(f"{accion}: se aplicará al próximo comando")
         return
-    
-    nombre, valor = args[0].split("=", 1)
-    variables_entorno[nombre] = valor
-    imprimir_exito(f"Variable definida: {nombre}={valor}")
 
-def cmd_env(_args):
-    for k, v in variables_entorno.items():
-        print(f"{COLORES['cian']}{k}={v}{COLORES['reset']}")
+    top, orden = PERF_TOP, "p95"
+    try:
+        resto = list(args[1:] if accion == "top" else args)
+        if "--orden" in resto:
+            i = resto.index("--orden")
+            orden = resto[i + 1]
+            del resto[i:i + 2]
+        if resto:
+            top = int(resto[0])
+        if orden not in ("p95", "total", "llamadas", "cpu"):
+            raise ValueError(orden)
+    except (IndexError, ValueError):
+        imprimir_error(uso)
+        return
+    with instrumentacion.cerrojo:
+        filas = list(instrumentacion.metricas.items())
+    if not filas:
+        print(f"{COLORES['gris']}Sin datos todavía.{COLORES['reset']}")
+        return
+    clave = {"p95": lambda m: m.pared.percentil(95), "total": lambda m: m.pared.total,
+             "llamadas": lambda m: m.pared.n, "cpu": lambda m: m.cpu.total}[orden]
+    filas.sort(key=lambda fila: clave(fila[1]), reverse=True)
+    print(f"{COLORES['cian']}{'Comando':<22} {'N':>6} {'p50':>8} {'p95':>8} {'p99':>8} {'máx':>8} "
+          f"{'CPU/llam.':>9} {'Escrito':>8} {'RSS+':>7}{COLORES['reset']}")
+    for nombre, m in filas[:top]:
+        pared = m.pared
+        cpu = _formatear_duracion(m.cpu.total / m.cpu.n) if m.cpu.n else "-"
+        print(f"{nombre[:22]:<22} {pared.n:>6} {_formatear_duracion(pared.percentil(50)):>8} "
+              f"{_formatear_duracion(pared.percentil(95)):>8} {_formatear_duracion(pared.percentil(99)):>8} "
+              f"{_formatear_duracion(pared.maximo):>8} {cpu:>9} {tamano_legible(m.bytes_escritos):>8} "
+              f"{tamano_legible(m.rss_crecimiento):>7}")
+    if not instrumentacion.activa:
+        print(f"{COLORES['gris']}(instrumentación desactivada: 'vso-perf on'){COLORES['reset']}")
 
-def cmd_script(args):
+# =========================
+# Motor del prompt
+# =========================
+PROMPT_ARCHIVO = os.path.join(VSO_DIR, "prompt")
+PROMPT_SEGMENTOS = ("usuario", "host", "cwd", "git", "trabajos", "estado", "duracion", "hora")
+PROMPT_SEGMENTOS_DEFECTO = ("usuario", "host", "cwd", "git", "estado", "duracion")
+PROMPT_UMBRAL_DURACION = 1.0     # segundos a partir de los que se muestra la duración
+PROMPT_ESPERA_GIT = 0.03         # lo máximo que el prompt espera al estado de git
+PROMPT_TIMEOUT_GIT = 2.0         # git status más lento que esto se abandona
+PROMPT_REINTENTO_GIT = 30.0      # tras un timeout, no volver a intentarlo en ese repo durante...
+
+class MotorPrompt:
+    """Compone el prompt con valores cacheados.
+
+    Usuario y equipo se leen una vez; el directorio solo tras un cd y la rama
+    de git desde .git/HEAD. Saber si el repositorio tiene cambios requiere
+    `git status`, que se lanza en un hilo: el prompt espera como mucho
+    PROMPT_ESPERA_GIT y, si no hay respuesta, usa el último valor conocido."""
+
+    def __init__(self):
+        self.segmentos: List[str] = list(PROMPT_SEGMENTOS_DEFECTO)
+        self.usuario = usuario_actual()
+        self.host = nombre_equipo().split(".")[0]
+        self.inicio_usuario = os.path.expanduser("~")
+        self.cwd = ""
+        self.cwd_mostrado = ""
+        self.raiz_git: Optional[str] = None
+        self.dir_git: Optional[str] = None
+        self.ultimo_estado = 0
+        self.ultima_duracion = 0.0
+        self.cerrojo = threading.Lock()
+        self.git_sucio: Dict[str, Optional[bool]] = {}   # raíz → True/False/None (desconocido)
+        self.git_obsoleto: Dict[str, bool] = {}
+        self.git_en_curso: Dict[str, threading.Event] = {}
+        self.git_bloqueado_hasta: Dict[str, float] = {}
+        self.git_disponible = True
+        # readline solo interviene (y solo entiende \001/\002) si la entrada es un terminal
+        self.marcas_readline = readline is not None and sys.stdin.isatty()
+        self.marcar_cwd()
+
+    # --- configuración ---
+    def cargar(self):
+        try:
+            with open(PROMPT_ARCHIVO, "r", encoding="utf-8") as f:
+                segmentos = [s for s in f.read().split() if s in PROMPT_SEGMENTOS]
+            if segmentos:
+                self.segmentos = segmentos
+        except OSError:
+            pass
+
+    def guardar(self):
+        os.makedirs(VSO_DIR, exist_ok=True)
+        with open(PROMPT_ARCHIVO, "w", encoding="utf-8") as f:
+            f.write(" ".join(self.segmentos) + "\n")
+
+    # --- estado ---
+    def marcar_cwd(self):
+        """Llamar tras cambiar de directorio: recalcula la ruta mostrada y el repositorio git."""
+        try:
+            cwd = os.getcwd()
+        except OSError:
+            return
+        if cwd == self.cwd:
+            return
+        self.cwd = cwd
+        if cwd == self.inicio_usuario or cwd.startswith(self.inicio_usuario + os.sep):
+            self.cwd_mostrado = "~" + cwd[len(self.inicio_usuario):]
+        else:
+            self.cwd_mostrado = cwd
+        self.raiz_git, self.dir_git = self._buscar_git(cwd)
+
+    def registrar_resultado(self, estado: int, duracion: float):
+        self.ultimo_estado = estado
+        self.ultima_duracion = duracion
+        if self.raiz_git:
+            self.git_obsoleto[self.raiz_git] = True  # el comando pudo tocar archivos
+
+    # --- git ---
+    @staticmethod
+    def _buscar_git(ruta: str) -> tuple:
+        while True:
+            candidato = os.path.join(ruta, ".git")
+            if os.path.isdir(candidato):
+                return ruta, candidato
+            if os.path.isfile(candidato):  # worktree o submódulo: "gitdir: <ruta>"
+                try:
+                    with open(candidato, "r", encoding="utf-8") as f:
+                        contenido = f.read().strip()
+                    if contenido.startswith("gitdir:"):
+                        return ruta, os.path.join(ruta, contenido[7:].strip())
+                except OSError:
+                    pass
+            padre = os.path.dirname(ruta)
+            if padre == ruta:
+                return None, None
+            ruta = padre
+
+    def _rama(self) -> Optional[str]:
+        try:
+            with open(os.path.join(self.dir_git, "HEAD"), "r", encoding="utf-8") as f:
+                cabeza = f.read().strip()
+        except OSError:
+            return None
+        if cabeza.startswith("ref: "):
+            return cabeza[5:].rsplit("refs/heads/", 1)[-1]
+        return cabeza[:7]  # HEAD separado: hash abreviado
+
+    def _calcular_git_sucio(self, raiz: str, listo: threading.Event):
+        import subprocess
+        try:
+            resultado = subprocess.run(
+                ["git", "-C", raiz, "status", "--porcelain", "--untracked-files=no", "--ignore-submodules"],
+                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, stdin=subprocess.DEVNULL,
+                timeout=PROMPT_TIMEOUT_GIT, env=dict(os.environ, GIT_OPTIONAL_LOCKS="0"),
+            )
+            sucio = bool(resultado.stdout.strip()) if resultado.returncode == 0 else None
+        except subprocess.TimeoutExpired:
+            sucio = None
+            self.git_bloqueado_hasta[raiz] = time.monotonic() + PROMPT_REINTENTO_GIT
+        except OSError:
+            sucio = None
+            self.git_disponible = False
+        with self.cerrojo:
+            self.git_sucio[raiz] = sucio
+            self.git_en_curso.pop(raiz, None)
+        listo.set()
+
+    def _estado_git(self, raiz: str) -> Optional[bool]:
+        with self.cerrojo:
+            en_curso = self.git_en_curso.get(raiz)
+            lanzar = (en_curso is None and self.git_disponible
+                      and (raiz not in self.git_sucio or self.git_obsoleto.get(raiz))
+                      and time.monotonic() >= self.git_bloqueado_hasta.get(raiz, 0))
+            if lanzar:
+                en_curso = self.git_en_curso[raiz] = threading.Event()
+                self.git_obsoleto[raiz] = False
+                threading.Thread(target=self._calcular_git_sucio, args=(raiz, en_curso), daemon=True).start()
+        if en_curso is not None:
+            en_curso.wait(PROMPT_ESPERA_GIT)
+        return self.git_sucio.get(raiz)
+
+    # --- composición ---
+    def _color(self, texto: str, color: str) -> str:
+        # \001 y \002 delimitan lo que readline no debe contar como ancho visible
+        if self.marcas_readline:
+            return f"\001{color}\002{texto}\001{tema_actual['prompt']}\002"
+        return f"{color}{texto}{tema_actual['prompt']}"
+
+    def _segmento(self, nombre: str) -> str:
+        if nombre == "usuario":
+            return self.usuario
+        if nombre == "host":
+            return self.host
+        if nombre == "cwd":
+            return self.cwd_mostrado
+        if nombre == "git":
+            if not self.raiz_git:
+                return ""
+            rama = self._rama()
+            if rama is None:
+                return ""
+            sucio = self._estado_git(self.raiz_git)
+            marca = "*" if sucio else "?" if sucio is None and self.git_disponible else ""
+            return self._color(f"({rama}{marca})", COLORES["amarillo"] if sucio else COLORES["morado"])
+        if nombre == "trabajos":
+            activos = sum(1 for t in _gestor_trabajos.trabajos.values() if t.activo()) if _gestor_trabajos else 0
+            return self._color(f"⚙{activos}", COLORES["cian"]) if activos else ""
+        if nombre == "estado":
+            return self._color(f"✘{self.ultimo_estado}", COLORES["rojo"]) if self.ultimo_estado else ""
+        if nombre == "duracion":
+            if self.ultima_duracion < PROMPT_UMBRAL_DURACION:
+                return ""
+            return self._color(f"⏱{_formatear_duracion(self.ultima_duracion)}", COLORES["gris"])
+        if nombre == "hora":
+            return time.strftime("%H:%M:%S")
+        return ""
+
+    def componer(self) -> str:
+        color = tema_actual["prompt"]
+        inicio = f"\001{color}\002" if self.marcas_readline else color
+        fin = f"\001{COLORES['reset']}\002" if self.marcas_readline else COLORES["reset"]
+        # "usuario host cwd" conserva el aspecto clásico usuario@host:cwd
+        texto = ""
+        anterior = None
+        for nombre in self.segmentos:
+            valor = self._segmento(nombre)
+            if not valor:
+                continue
+            if anterior is None:
+                separador = ""
+            elif anterior == "usuario" and nombre == "host":
+                separador = "@"
+            elif anterior in ("usuario", "host") and nombre == "cwd":
+                separador = ":"
+            else:
+                separador = " "
+            texto += separador + valor
+            anterior = nombre
+        return f"{inicio}{texto} ⛮ $ {fin}"
+
+motor_prompt: Optional[MotorPrompt] = None
+
+def obtener_motor_prompt() -> MotorPrompt:
+    global motor_prompt
+    if motor_prompt is None:
+        motor_prompt = MotorPrompt()
+    return motor_prompt
+
+def cmd_vso_prompt(args):
+    """Configura los segmentos del prompt"""
+    motor = obtener_motor_prompt()
+    uso = (f"Uso: vso-prompt [segmentos s1,s2,...|restablecer]\n"
+           f"     segmentos disponibles: {', '.join(PROMPT_SEGMENTOS)}")
     if not args:
-        imprimir_error("Uso: script <archivo.vso>")
+        print(f"{COLORES['cian']}Segmentos:{COLORES['reset']} {', '.join(motor.segmentos)}")
+        print(f"{COLORES['gris']}Disponibles: {', '.join(PROMPT_SEGMENTOS)}{COLORES['reset']}")
+        return
+    if args[0] == "restablecer":
+        motor.segmentos = list(PROMPT_SEGMENTOS_DEFECTO)
+    elif args[0] == "segmentos" and len(args) > 1:
+        segmentos = [s for parte in args[1:] for s in parte.split(",") if s]
+        desconocidos = [s for s in segmentos if s not in PROMPT_SEGMENTOS]
+        if desconocidos:
+            imprimir_error(f"Segmentos desconocidos: {', '.join(desconocidos)}\n{uso}")
+            return
+        motor.segmentos = segmentos
+    else:
+        imprimir_error(uso)
         return
-    
-    archivo = args[0]
     try:
-        with open(archivo, "r", encoding="utf-8") as f:
-            for linea in f:
-                linea = linea.strip()
-                if linea and not linea.startswith("#"):
-                    print(f"{COLORES['morado']}$ {linea}{COLORES['reset']}")
-                    ejecutar_comando_interno(linea) or ejecutar_en_shell(linea)
-    except Exception as e:
-        imprimir_error(f"Error ejecutando script: {e}")
-
-def cmd_plugins(_args):
-    if not plugins_cargados:
-        print("No hay plugins cargados.")
+        motor.guardar()
+    except OSError as e:
+        imprimir_error(f"No se pudo guardar la configuración: {e}")
         return
-    
-    print(f"{COLORES['verde']}Plugins cargados:{COLORES['reset']}")
-    for nombre, func in plugins_cargados.items():
-        print(f" - {nombre}: {func.__doc__ or 'Sin descripción'}")
+    imprimir_exito(f"Prompt: {', '.join(motor.segmentos)}")
 
-def setup_autocompletado():
-    if readline:
-        def completar(texto, estado):
-            comandos = list(tabla_comandos.keys()) + ["salir", "exit", "vso-ayuda"]
-            opciones = [cmd for cmd in comandos if cmd.startswith(texto)]
-            return opciones[estado] if estado < len(opciones) else None
-        
-        readline.set_completer(completar)
-        readline.parse_and_bind("tab: complete")
-        readline.parse_and_bind('"\e[A": history-search-backward')
-        readline.parse_and_bind('"\e[B": history-search-forward')
+# =========================
+# Comandos de sesión (vso-*) y alias
+# =========================
+ALIAS_ARCHIVO = os.path.join(VSO_DIR, "alias")
 
-def cargar_plugins():
-    plugins_dir = os.path.join(os.path.dirname(__file__), "plugins")
-    if not os.path.exists(plugins_dir):
-        os.makedirs(plugins_dir, exist_ok=True)
+def cmd_salir(_args):
+    raise SystemExit
+
+def cmd_vso_ayuda(_args):
+    mostrar_ayuda()
+
+def cmd_vso_info(_args):
+    mostrar_info()
+
+def cmd_vso_hora(_args):
+    mostrar_hora()
+
+def cmd_vso_tema(args):
+    if args:
+        cambiar_tema(args[0])
+    else:
+        imprimir_error("Uso: vso-tema claro|oscuro")
+
+_alias_en_curso = set()   # corta los ciclos entre alias (a → b → a)
+
+def _ejecutar_alias(nombre: str, args):
+    linea = " ".join([registro.alias[nombre]] + [shlex.quote(a) for a in args])
+    partes = tokenizar_comando(linea)
+    if not partes:
         return
-    
-    for archivo in os.listdir(plugins_dir):
-        if archivo.endswith(".py") and archivo != "__init__.py":
-            nombre = archivo[:-3]
-            try:
-                modulo = __import__(f"plugins.{nombre}", fromlist=["*"])
-                if hasattr(modulo, "registrar_comandos"):
-                    plugins_cargados.update(modulo.registrar_comandos())
-                    imprimir_exito(f"Plugin cargado: {nombre}")
-            except Exception as e:
-                imprimir_error(f"Error cargando plugin {nombre}: {e}")
+    if partes[0] == nombre or nombre in _alias_en_curso:
+        # alias ls='ls -a': usar el comando que el alias tapa, o el del sistema
+        sombreado = registro.sombreados.get(partes[0])
+        if sombreado is not None:
+            return sombreado(list(partes[1:]))
+        return ejecutar_en_shell(linea)
+    _alias_en_curso.add(nombre)
+    try:
+        if not ejecutar_comando_interno(linea):
+            return ejecutar_en_shell(linea)
+    finally:
+        _alias_en_curso.discard(nombre)
 
-def ejecutar_en_background(comando: str):
+def cargar_alias():
     try:
-        pid = os.fork()
-        if pid == 0:
-            os.system(comando)
-            os._exit(0)
-    except Exception as e:
-        imprimir_error(f"No se pudo ejecutar en background: {e}")
+        with open(ALIAS_ARCHIVO, "r", encoding="utf-8") as f:
+            for linea in f:
+                nombre, _, expansion = linea.rstrip("\n").partition("=")
+                if nombre and expansion:
+                    registro.definir_alias(nombre, expansion)
+    except OSError:
+        pass
+
+def _guardar_alias():
+    try:
+        os.makedirs(VSO_DIR, exist_ok=True)
+        temporal = f"{ALIAS_ARCHIVO}.{os.getpid()}.tmp"
+        with open(temporal, "w", encoding="utf-8") as f:
+            f.writelines(f"{nombre}={expansion}\n" for nombre, expansion in sorted(registro.alias.items()))
+        os.replace(temporal, ALIAS_ARCHIVO)
+    except OSError as e:
+        imprimir_error(f"No se pudieron guardar los alias: {e}")
+
+def cmd_alias(args):
+    """Define o lista alias: alias nombre='comando args'"""
+    if not args:
+        for nombre, expansion in sorted(registro.alias.items()):
+            print(f"{COLORES['cian']}{nombre}{COLORES['reset']}={shlex.quote(expansion)}")
+        return
+    for definicion in args:
+        nombre, igual, expansion = definicion.partition("=")
+        if not igual:
+            if nombre in registro.alias:
+                print(f"{nombre}={shlex.quote(registro.alias[nombre])}")
+            else:
+                imprimir_error(f"alias: {nombre}: no definido")
+            continue
+        if not re.fullmatch(r"[\w.+-]+", nombre) or not expansion.strip():
+            imprimir_error("Uso: alias nombre='comando args'")
+            return
+        registro.definir_alias(nombre, expansion.strip())
+    _guardar_alias()
+
+def cmd_unalias(args):
+    if not args:
+        imprimir_error("Uso: unalias <nombre>...")
+        return
+    for nombre in args:
+        if not registro.quitar_alias(nombre):
+            imprimir_error(f"unalias: {nombre}: no definido")
+    _guardar_alias()
+
+def cmd_vso_stats(args):
+    """Llamadas y latencia acumulada por comando interno"""
+    if args and args[0] == "-r":
+        registro.llamadas.clear()
+        registro.tiempo.clear()
+        imprimir_exito("Estadísticas reiniciadas")
+        return
+    if not registro.llamadas:
+        print(f"{COLORES['gris']}Todavía no se ha ejecutado ningún comando interno.{COLORES['reset']}")
+        return
+    print(f"{COLORES['cian']}{'Comando':<22} {'Origen':<8} {'Llamadas':>9} {'Total':>10} {'Media':>10}{COLORES['reset']}")
+    for nombre, total in sorted(registro.tiempo.items(), key=operator.itemgetter(1), reverse=True):
+        llamadas = registro.llamadas[nombre]
+        print(f"{nombre:<22} {registro.origen.get(nombre, '-'):<8} {llamadas:>9} {total * 1000:>8.1f}ms "
+              f"{total / llamadas * 1e6:>8.1f}µs")
 
 # =========================
 # Tabla de comandos completa
 # =========================
 tabla_comandos = {
+    # Sesión
+    "salir": cmd_salir,
+    "exit": cmd_salir,
+    "quit": cmd_salir,
+    "vso-ayuda": cmd_vso_ayuda,
+    "vso-info": cmd_vso_info,
+    "vso-limpiar": cmd_clear,
+    "vso-hora": cmd_vso_hora,
+    "vso-historial": mostrar_historial,
+    "vso-tema": cmd_vso_tema,
+    "vso-stats": cmd_vso_stats,
+    "vso-perf": cmd_vso_perf,
+    "vso-prompt": cmd_vso_prompt,
+    "alias": cmd_alias,
+    "unalias": cmd_unalias,
+
     # Comandos originales
     "cd": cmd_cd,
     "pwd": cmd_pwd,
@@ -669,6 +6682,7 @@ tabla_comandos = {
     "vso-ip-publica": cmd_ip_publica,
     "vso-ip-local": cmd_ip_local,
     "vso-ip-dominio": cmd_ip_dominio,
+    "vso-dns": cmd_vso_dns,
     
     # Nuevos comandos
     "vso-python": cmd_python_repl,
@@ -680,123 +6694,538 @@ tabla_comandos = {
     "env": cmd_env,
     "script": cmd_script,
     "vso-plugins": cmd_plugins,
+    "vso-shell": cmd_modo_shell,
+    "vso-index": cmd_vso_index,
+    "du": cmd_du,
     
     # Comandos de automatización y análisis
     "automatizar": cmd_automatizar,
     "analisis-seguridad": cmd_analisis_seguridad,
     "monitorizar": cmd_monitorizar,
     "benchmark": cmd_benchmark,
+
+    # Control de trabajos
+    "jobs": cmd_jobs,
+    "wait": cmd_wait,
+    "kill": cmd_kill,
+    "fg": cmd_fg,
+    "bg": cmd_bg,
+    "job-log": cmd_job_log,
 }
 
 # =========================
 # Despachador de comandos
 # =========================
-def ejecutar_comando_interno(comando: str) -> bool:
-    if not comando:
-        return True
+DESPACHO_CACHE = 1024   # líneas tokenizadas que se recuerdan
 
-    if comando in ["salir", "exit", "quit"]:
-        raise SystemExit
+class RegistroComandos:
+    """Tabla única nombre → manejador (internos, vso-*, alias y plugins) con estadísticas de uso.
 
-    if comando == "vso-ayuda":
-        mostrar_ayuda()
-        return True
+    Los alias tapan al comando del mismo nombre (que se guarda en `sombreados`);
+    un plugin nunca tapa a un comando interno."""
 
-    if comando == "vso-info":
-        mostrar_info()
-        return True
+    def __init__(self, internos: Dict[str, callable]):
+        self.comandos: Dict[str, callable] = dict(internos)
+        self.origen: Dict[str, str] = dict.fromkeys(internos, "interno")
+        self.alias: Dict[str, str] = {}
+        self.sombreados: Dict[str, callable] = {}
+        self.llamadas = collections.Counter()
+        self.tiempo: Dict[str, float] = collections.defaultdict(float)
+        self.version = 0   # cambia con cada alta o baja (lo usa el autocompletado)
 
-    if comando == "vso-limpiar":
-        limpiar()
-        return True
+    def registrar(self, nombre: str, funcion, origen: str = "plugin"):
+        if origen == "plugin" and self.origen.get(nombre) == "interno":
+            return
+        if nombre in self.alias:
+            self.sombreados[nombre] = funcion
+        else:
+            self.comandos[nombre] = funcion
+            self.origen[nombre] = origen
+        self.version += 1
 
-    if comando == "vso-hora":
-        mostrar_hora()
-        return True
+    def quitar(self, nombre: str):
+        if nombre in self.alias:
+            self.sombreados.pop(nombre, None)
+        elif self.comandos.pop(nombre, None) is not None:
+            self.origen.pop(nombre, None)
+        self.version += 1
 
-    if comando == "vso-historial":
-        mostrar_historial()
-        return True
+    def definir_alias(self, nombre: str, expansion: str):
+        if nombre not in self.alias and nombre in self.comandos:
+            self.sombreados[nombre] = self.comandos[nombre]
+        self.alias[nombre] = expansion
+        self.comandos[nombre] = functools.partial(_ejecutar_alias, nombre)
+        self.origen[nombre] = "alias"
+        self.version += 1
 
-    if comando.startswith("vso-tema"):
-        _, *args = comando.split()
-        if args:
-            cambiar_tema(args[0])
+    def quitar_alias(self, nombre: str) -> bool:
+        if self.alias.pop(nombre, None) is None:
+            return False
+        sombreado = self.sombreados.pop(nombre, None)
+        if sombreado is not None:
+            self.comandos[nombre] = sombreado
+            self.origen[nombre] = "plugin" if nombre in plugins_cargados else "interno"
         else:
-            imprimir_error("Uso: vso-tema claro|oscuro")
+            del self.comandos[nombre]
+            del self.origen[nombre]
+        self.version += 1
         return True
 
-    partes = shlex.split(comando)
-    if not partes:
-        return True
-    cmd, *args = partes
+    def invocar(self, nombre: str, args):
+        funcion = self.comandos[nombre]
+        inicio = time.perf_counter()
+        try:
+            with instrumentacion.medir(nombre):
+                return funcion(args)
+        finally:
+            self.llamadas[nombre] += 1
+            self.tiempo[nombre] += time.perf_counter() - inicio
+
+registro = RegistroComandos(tabla_comandos)
 
-    # Buscar en comandos principales
-    if cmd in tabla_comandos:
-        tabla_comandos[cmd](args)
+@functools.lru_cache(maxsize=DESPACHO_CACHE)
+def tokenizar_comando(comando: str) -> tuple:
+    """shlex.split con caché: las líneas repetidas (scripts, bucles) no se vuelven a analizar."""
+    return tuple(shlex.split(comando))
+
+def ejecutar_comando_interno(comando: str) -> bool:
+    if not comando:
         return True
-    
-    # Buscar en plugins
-    if cmd in plugins_cargados:
-        plugins_cargados[cmd](args)
+    inicio = time.perf_counter()
+    try:
+        partes = tokenizar_comando(comando)
+    except ValueError as e:
+        imprimir_error(f"Error de sintaxis: {e}")
         return True
-
-    return False
+    instrumentacion.registrar_pared("(análisis)", time.perf_counter() - inicio)
+    if not partes:
+        return True
+    if ("|" in comando or ">" in comando) and ejecutar_tuberia(comando) is not None:
+        return True
+    if partes[0] not in registro.comandos:
+        return False
+    registro.invocar(partes[0], list(partes[1:]))
+    return True
 
 # =========================
 # Ejecución en shell real
 # =========================
-def ejecutar_en_shell(comando: str):
+SHELL_TAM_BLOQUE = 64 * 1024
+# Órdenes que pueden cambiar el entorno exportado del coproceso
+SHELL_ORDENES_ENTORNO = {"export", "unset", "set", "declare", "typeset", "source", ".", "eval"}
+SHELL_SEPARADORES = {";", "&&", "||", "|", "&", "(", ")", "{", "}"}
+SHELL_PALABRAS = {"if", "then", "else", "elif", "fi", "do", "done", "while", "until", "!", "time"}
+_RE_FUNCION_SHELL = re.compile(r"(?:^|[;&|{(]\s*)(?:function\s+[\w.:-]+|[\w.:-]+\s*\(\s*\))")
+# Programas que necesitan una TTY real (se ejecutan con passthrough PTY)
+PROGRAMAS_INTERACTIVOS = {
+    "vim", "vi", "nvim", "nano", "emacs", "less", "more", "man", "top", "htop",
+    "ssh", "sudo", "su", "passwd", "tmux", "screen", "watch", "ftp", "telnet",
+}
+# Solo interactivos cuando se invocan sin argumentos
+REPLS_INTERACTIVOS = {
+    "python", "python3", "ipython", "bash", "sh", "zsh", "fish", "node",
+    "mysql", "psql", "sqlite3", "irb",
+}
+
+def ordenes_shell(comando: str) -> List[Optional[str]]:
+    """Primera palabra de cada orden simple de la línea, respetando comillas.
+
+    Se saltan las palabras reservadas y las asignaciones VAR=valor iniciales;
+    una orden formada solo por asignaciones da None. Lanza ValueError si hay
+    comillas sin cerrar."""
+    lexer = shlex.shlex(comando.replace("\n", " ; "), posix=True, punctuation_chars=True)
+    lexer.whitespace_split = True
+    ordenes = []
+    al_inicio, asigna = True, False
+    for token in lexer:
+        if token in SHELL_SEPARADORES:
+            if al_inicio and asigna:
+                ordenes.append(None)
+            al_inicio, asigna = True, False
+        elif al_inicio and token in SHELL_PALABRAS:
+            continue
+        elif al_inicio and "=" in token and token.partition("=")[0].isidentifier():
+            asigna = True
+        elif al_inicio:
+            ordenes.append(token)
+            al_inicio = False
+    if al_inicio and asigna:
+        ordenes.append(None)
+    return ordenes
+
+class _SalidaColoreada:
+    """Decodifica bloques de bytes de forma incremental y los escribe coloreados."""
+
+    def __init__(self, destino, color: str):
+        self.destino = destino
+        self.color = color
+        self.decodificador = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    def escribir(self, datos: bytes, final: bool = False):
+        texto = self.decodificador.decode(datos, final)
+        if texto:
+            self.destino.write(f"{self.color}{texto}{COLORES['reset']}")
+            self.destino.flush()
+
+def _es_interactivo(comando: str) -> bool:
+    try:
+        partes = shlex.split(comando)
+    except ValueError:
+        return False
+    # Saltar asignaciones tipo VAR=valor al inicio
+    while partes and "=" in partes[0] and not partes[0].startswith("="):
+        partes = partes[1:]
+    if not partes:
+        return False
+    programa = os.path.basename(partes[0])
+    if programa in PROGRAMAS_INTERACTIVOS:
+        return True
+    return programa in REPLS_INTERACTIVOS and len(partes) == 1
+
+def _ejecutar_con_pty(comando: str) -> int:
+    import pty
+    sys.stdout.flush()
+    estado = pty.spawn(["/bin/sh", "-c", comando])
+    return os.waitstatus_to_exitcode(estado)
+
+def _bombear_con_selector(salidas: Dict[int, "_SalidaColoreada"]):
+    import selectors
+    selector = selectors.DefaultSelector()
+    for fd in salidas:
+        selector.register(fd, selectors.EVENT_READ)
+    try:
+        while selector.get_map():
+            for clave, _ in selector.select():
+                datos = os.read(clave.fd, SHELL_TAM_BLOQUE)
+                if datos:
+                    salidas[clave.fd].escribir(datos)
+                else:
+                    selector.unregister(clave.fd)
+                    salidas[clave.fd].escribir(b"", final=True)
+    finally:
+        selector.close()
+
+def _bombear_con_hilos(salidas: Dict[int, "_SalidaColoreada"]):
+    # En Windows los selectores no aceptan tuberías: un hilo por flujo
+    def bombear(fd, salida):
+        while True:
+            datos = os.read(fd, SHELL_TAM_BLOQUE)
+            if not datos:
+                break
+            salida.escribir(datos)
+        salida.escribir(b"", final=True)
+
+    hilos = [threading.Thread(target=bombear, args=item, daemon=True) for item in salidas.items()]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+def _ejecutar_en_streaming(comando: str) -> int:
+    import subprocess
+    entorno = dict(os.environ, PYTHONUNBUFFERED="1")
+    proceso = subprocess.Popen(
+        comando,
+        shell=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        env=entorno,
+    )
+    salidas = {
+        proceso.stdout.fileno(): _SalidaColoreada(sys.stdout, tema_actual["output"]),
+        proceso.stderr.fileno(): _SalidaColoreada(sys.stderr, tema_actual["error"]),
+    }
     try:
-        resultado = subprocess.run(
-            comando,
-            shell=True,
-            capture_output=True,
-            text=True
+        if os.name == "posix":
+            _bombear_con_selector(salidas)
+        else:
+            _bombear_con_hilos(salidas)
+        return proceso.wait()
+    except KeyboardInterrupt:
+        if proceso.poll() is None:
+            proceso.terminate()
+        proceso.wait()
+        raise
+    finally:
+        proceso.stdout.close()
+        proceso.stderr.close()
+
+# =========================
+# Shell persistente (coproceso)
+# =========================
+class ShellPersistente:
+    """Coproceso /bin/sh de larga vida que recibe los comandos por una tubería.
+
+    El final de cada comando se marca con un centinela único en stdout y stderr
+    que incluye el código de salida y el $PWD del shell. Los centinelas salen por
+    copias de los descriptores 1 y 2 (8 y 9) que el comando no ve, así que un
+    'exec 2>/dev/null' del usuario no deja la espera colgada."""
+
+    def __init__(self, programa: str = "/bin/sh"):
+        self.programa = programa
+        self.proceso = None
+        self.cwd_shell = None
+        self.entorno_shell: Dict[str, str] = {}
+
+    def activo(self) -> bool:
+        return self.proceso is not None and self.proceso.poll() is None
+
+    def _iniciar(self):
+        import subprocess
+        self.cerrar()
+        self.entorno_shell = dict(os.environ)
+        self.cwd_shell = os.getcwd()
+        self.proceso = subprocess.Popen(
+            [self.programa],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            env=dict(self.entorno_shell, PYTHONUNBUFFERED="1"),
+            start_new_session=True,  # Ctrl+C no debe matar el coproceso
+        )
+        self.proceso.stdin.write(b"exec 8>&1 9>&2\n")
+
+    def cerrar(self):
+        if self.proceso is None:
+            return
+        if self.proceso.poll() is None:
+            try:
+                os.killpg(self.proceso.pid, signal.SIGKILL)
+            except OSError:
+                pass
+        self.proceso.wait()
+        for tubo in (self.proceso.stdin, self.proceso.stdout, self.proceso.stderr):
+            tubo.close()
+        self.proceso = None
+
+    def _preambulo(self) -> str:
+        """Envía al shell los cambios de cwd y entorno hechos en VsoUver."""
+        lineas = []
+        cwd = os.getcwd()
+        if cwd != self.cwd_shell:
+            lineas.append(f"cd -- {shlex.quote(cwd)}")
+            self.cwd_shell = cwd
+        actual = dict(os.environ)
+        if actual != self.entorno_shell:
+            for k, v in actual.items():
+                if self.entorno_shell.get(k) != v:
+                    lineas.append(f"export {k}={shlex.quote(v)}")
+            for k in self.entorno_shell.keys() - actual.keys():
+                lineas.append(f"unset {k}")
+            self.entorno_shell = actual
+        return "".join(l + "\n" for l in lineas)
+
+    def _intercambiar(self, comando: str, al_stdout, al_stderr) -> int:
+        import selectors
+        import uuid
+        if not self.activo():
+            self._iniciar()
+        marca = f"__VSO_FIN_{uuid.uuid4().hex}__".encode()
+        guion = (
+            f"{self._preambulo()}{{ {comando}\n}} </dev/null 8>&- 9>&-\n"
+            f"__vso_estado=$?\n"
+            f"printf '%s %d %s\\n' '{marca.decode()}' \"$__vso_estado\" \"$PWD\" >&8\n"
+            f"printf '%s' '{marca.decode()}' >&9\n"
         )
-        if resultado.stdout:
-            print(f"{tema_actual['output']}{resultado.stdout}{COLORES['reset']}", end="")
-        if resultado.stderr:
-            imprimir_error(resultado.stderr.rstrip("\n"))
+        self.proceso.stdin.write(guion.encode())
+        self.proceso.stdin.flush()
+
+        pendientes = {self.proceso.stdout.fileno(): b"", self.proceso.stderr.fileno(): b""}
+        destinos = {self.proceso.stdout.fileno(): al_stdout, self.proceso.stderr.fileno(): al_stderr}
+        terminados = {}
+        selector = selectors.DefaultSelector()
+        for fd in pendientes:
+            selector.register(fd, selectors.EVENT_READ)
+        try:
+            while len(terminados) < 2:
+                eventos = selector.select()
+                for clave, _ in eventos:
+                    fd = clave.fd
+                    datos = os.read(fd, SHELL_TAM_BLOQUE)
+                    if not datos:
+                        # El shell terminó (p. ej. 'exit'): se reinicia en el próximo comando
+                        destinos[fd](pendientes[fd])
+                        estado = self.proceso.wait()
+                        self.cerrar()
+                        return estado
+                    buf = pendientes[fd] + datos
+                    idx = buf.find(marca)
+                    if idx < 0:
+                        corte = max(0, len(buf) - len(marca) + 1)
+                        destinos[fd](buf[:corte])
+                        pendientes[fd] = buf[corte:]
+                        continue
+                    destinos[fd](buf[:idx])
+                    resto = buf[idx + len(marca):]
+                    if fd == self.proceso.stderr.fileno():
+                        terminados[fd] = b""
+                        selector.unregister(fd)
+                    elif b"\n" in resto:
+                        terminados[fd] = resto.split(b"\n", 1)[0]
+                        selector.unregister(fd)
+                    else:
+                        # Falta el resto de la línea del centinela
+                        pendientes[fd] = buf[idx:]
+        except KeyboardInterrupt:
+            self.cerrar()
+            raise
+        finally:
+            selector.close()
+
+        estado_txt, _, pwd = terminados[self.proceso.stdout.fileno()].decode(errors="replace").strip().partition(" ")
+        if pwd and pwd != self.cwd_shell:
+            self.cwd_shell = pwd
+            try:
+                os.chdir(pwd)
+                if motor_prompt is not None:
+                    motor_prompt.marcar_cwd()
+            except OSError:
+                pass
+        return int(estado_txt)
+
+    @staticmethod
+    def _toca_entorno(comando: str) -> bool:
+        """True si alguna orden puede cambiar el entorno exportado (VAR=valor suelto incluido)."""
+        try:
+            ordenes = ordenes_shell(comando)
+        except ValueError:
+            return False  # comillas sin cerrar: el shell ya habrá dado error
+        return any(orden is None or orden in SHELL_ORDENES_ENTORNO for orden in ordenes)
+
+    def _sincronizar_entorno(self):
+        """Trae al proceso VsoUver las variables exportadas en el shell."""
+        datos = []
+        if self._intercambiar("env -0", datos.append, lambda _b: None) != 0 or not datos:
+            return  # sin 'env -0' o con la salida redirigida no hay de dónde fiarse
+        nuevo = {}
+        for entrada in b"".join(datos).split(b"\0"):
+            k, sep, v = entrada.decode(errors="replace").partition("=")
+            if sep and k.isidentifier():
+                nuevo[k] = v
+        if not nuevo:
+            return
+        nuevo.pop("PYTHONUNBUFFERED", None)
+        nuevo.pop("__vso_estado", None)
+        # Solo se borran las variables que el shell tenía y ya no tiene
+        for k in self.entorno_shell.keys() - nuevo.keys():
+            if k in os.environ and k != "PYTHONUNBUFFERED":
+                del os.environ[k]
+        os.environ.update(nuevo)
+        self.entorno_shell = dict(os.environ)
+
+    def ejecutar(self, comando: str, al_stdout=None, al_stderr=None) -> int:
+        if al_stdout is None:
+            salida = _SalidaColoreada(sys.stdout, tema_actual["output"])
+            al_stdout = salida.escribir
+        if al_stderr is None:
+            error = _SalidaColoreada(sys.stderr, tema_actual["error"])
+            al_stderr = error.escribir
+        estado = self._intercambiar(comando, al_stdout, al_stderr)
+        if self.activo() and self._toca_entorno(comando):
+            self._sincronizar_entorno()
+        return estado
+
+_shell_persistente: Optional[ShellPersistente] = None
+
+def obtener_shell_persistente() -> ShellPersistente:
+    global _shell_persistente
+    if _shell_persistente is None:
+        _shell_persistente = ShellPersistente()
+        atexit.register(_shell_persistente.cerrar)
+    return _shell_persistente
+
+def _nombre_metrica_shell(comando: str) -> str:
+    primera = comando.split(None, 1)[0] if comando.strip() else ""
+    if primera.startswith("("):
+        return "sh:(lote)"
+    return f"sh:{os.path.basename(primera)}"
+
+def ejecutar_en_shell(comando: str) -> int:
+    """Ejecuta un comando externo mostrando su salida a medida que llega.
+
+    Devuelve el código de salida (-1 si no se pudo lanzar)."""
+    with instrumentacion.medir(_nombre_metrica_shell(comando), hijos=True):
+        return _ejecutar_en_shell(comando)
+
+def _ejecutar_en_shell(comando: str) -> int:
+    en_trabajo = getattr(_contexto_trabajo, "nombre", None) is not None
+    try:
+        if os.name == "posix" and sys.stdin.isatty() and not en_trabajo and _es_interactivo(comando):
+            return _ejecutar_con_pty(comando)
+        # El coproceso atiende un comando a la vez: los trabajos paralelos usan un shell propio
+        if MODO_SHELL == "persistente" and os.name == "posix" and not en_trabajo:
+            return obtener_shell_persistente().ejecutar(comando)
+        return _ejecutar_en_streaming(comando)
+    except KeyboardInterrupt:
+        raise
     except Exception as e:
         imprimir_error(f"Error ejecutando comando externo: {e}")
+        return -1
 
 # =========================
 # Loop principal mejorado
 # =========================
-def iniciar_terminal():
-    cargar_historial()
-    cargar_plugins()
-    setup_autocompletado()
-    
-    limpiar()
-    print(logo)
-    print(f"{COLORES['amarillo']}🌟 VsoUver Terminal v2.0 {COLORES['reset']}")
-    print(f"{COLORES['gris']}Escribe 'vso-ayuda' para ver comandos.{COLORES['reset']}\n")
+def iniciar_terminal(perfilar_arranque: bool = False):
+    perfil_arranque.activo = perfilar_arranque
+    with perfil_arranque.fase("cargar_historial"):
+        cargar_historial()
+    with perfil_arranque.fase("cargar_plugins"):
+        cargar_plugins()
+    with perfil_arranque.fase("cargar_alias"):
+        cargar_alias()
+    with perfil_arranque.fase("prompt"):
+        motor = obtener_motor_prompt()
+        motor.cargar()
+    with perfil_arranque.fase("setup_autocompletado"):
+        setup_autocompletado()
+
+    with perfil_arranque.fase("banner"):
+        limpiar()
+        print(logo)
+        print(f"{COLORES['amarillo']}🌟 VsoUver Terminal v2.0 {COLORES['reset']}")
+        print(f"{COLORES['gris']}Escribe 'vso-ayuda' para ver comandos.{COLORES['reset']}\n")
+    if perfilar_arranque:
+        perfil_arranque.informe()
 
     while True:
         try:
             # Prompt inteligente con información contextual
-            cwd = os.getcwd()
-            user = os.getlogin() if platform.system() != "Windows" else os.environ.get("USERNAME", "?")
-            host = platform.node()
-            prompt = f"{tema_actual['prompt']}{user}@{host}:{cwd} ⛮ $ {COLORES['reset']}"
+            if _gestor_trabajos is not None:
+                _gestor_trabajos.avisar_terminados()
+            with instrumentacion.medir("(prompt)"):
+                prompt = motor.componer()
             
             comando = input(prompt).strip()
             if not comando:
                 continue
                 
-            guardar_en_historial(comando)
-            
-            # Procesamiento especial para comandos en background
-            if comando.endswith("&"):
-                ejecutar_en_background(comando[:-1])
-                continue
-                
-            # Ejecución normal
-            manejado = ejecutar_comando_interno(comando)
-            if not manejado:
-                ejecutar_en_shell(comando)
+            estado = 0
+            errores_previos = errores_impresos()
+            inicio = time.perf_counter()
+            try:
+                # Procesamiento especial para comandos en background
+                if comando.endswith("&"):
+                    ejecutar_en_background(comando[:-1])
+                    continue
+
+                # Ejecución normal
+                with instrumentacion.perfilar_siguiente():
+                    manejado = ejecutar_comando_interno(comando)
+                    if not manejado:
+                        estado = ejecutar_en_shell(comando)
+                    elif errores_impresos() != errores_previos:
+                        estado = 1
+            except KeyboardInterrupt:
+                estado = 130
+                raise
+            except SystemExit:
+                raise
+            except Exception:
+                estado = 1
+                raise
+            finally:
+                guardar_en_historial(comando, estado)
+                motor.registrar_resultado(estado, time.perf_counter() - inicio)
 
         except SystemExit:
             print(f"{COLORES['rojo']}⛔ Cerrando terminal...{COLORES['reset']}")
@@ -812,5 +7241,7 @@ def iniciar_terminal():
 # =========================
 # Main
 # =========================
+_T_MODULO_CARGADO = time.perf_counter()
+
 if __name__ == "__main__":
-    iniciar_terminal()
\ No newline at end of file
+    iniciar_terminal(perfilar_arranque="--startup-profile" in sys.argv[1:])
\ No newline at end of file